@@ -1,56 +1,44 @@
 
-import mysql.connector
+import argparse
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
 
-# Conexión a la base de datos
-conn = mysql.connector.connect(
-    host='localhost',
-    user='root',
-    password='Emanuel10*',
-    database='mediciones_db'
-)
+from repositorio_floccam import conectar, leer_mediciones
+from calculo_floccam import agrupar_curvas, curva, calcular_t63, detectar_df
 
-# Obtener todas las mediciones distintas
-df_all = pd.read_sql("SELECT * FROM mediciones", conn)
-mediciones = df_all['nombre_medicion'].unique()
+parser = argparse.ArgumentParser(description="Gráficos y T63 de todas las mediciones cargadas.")
+parser.add_argument("--password", default=None, help="Contraseña MySQL local (o MYSQL_PASSWORD)")
+args = parser.parse_args()
 
-resultados = []
+# Conexión a la base de datos (secrets.toml, SQLite o localhost, ver repositorio_floccam.conectar)
+conn = conectar(args.password)
+
+# Todas las curvas como arrays planos + offsets (ver calculo_floccam.py)
+df_all = leer_mediciones(conn)
+curvas = agrupar_curvas(df_all['nombre_medicion'], df_all['unix_time'], df_all['diameter'])
 
 # Crear carpeta para gráficos si no existe
 os.makedirs("graficos_mediciones", exist_ok=True)
 
-for medicion in mediciones:
-    df = df_all[df_all['nombre_medicion'] == medicion].copy()
-    df = df.sort_values(by='unix_time')
-    df['tiempo'] = df['unix_time'] - df['unix_time'].iloc[0]
-
-    # Di: primer valor
-    Di = df['diameter'].iloc[0]
+# Df automático: máximo de la curva suavizada (meseta o pico antes de la rotura)
+deteccion = detectar_df(curvas)
+Df = deteccion['df']
+for medicion in np.asarray(curvas['nombres'], dtype=object)[~deteccion['estable']]:
+    print(f"⚠️ {medicion} no llegó a una meseta; Df = máximo alcanzado, conviene revisarla.")
 
-    # Opción A (simple): Df como el valor donde los 2 siguientes sean menores
-    Df = None
-    for i in range(len(df) - 2):
-        if df['diameter'].iloc[i+1] < df['diameter'].iloc[i] and df['diameter'].iloc[i+2] < df['diameter'].iloc[i]:
-            Df = df['diameter'].iloc[i]
-            break
+# Di, ΔD, D(T) = Di + 0.632·ΔD y T_63 de todas las mediciones en una sola pasada
+calculo = calcular_t63(curvas, Df, fraccion=0.632)
 
-    if Df is None:
-        print(f"No se encontró Df para {medicion}, se omite.")
-        continue
-
-    delta_D = Df - Di
-    D_T = Di + 0.632 * delta_D
-
-    # Buscar T_63
-    df['diferencia'] = abs(df['diameter'] - D_T)
-    idx_T63 = df['diferencia'].idxmin()
-    T_63 = df.loc[idx_T63, 'tiempo']
+resultados = []
+for i, medicion in enumerate(curvas['nombres']):
+    tiempo, diam = curva(curvas, i)
+    D_T, T_63 = calculo['objetivo'][i], calculo['t63'][i]
 
     # Guardar gráfico
     plt.figure(figsize=(10, 6))
-    plt.scatter(df['tiempo'], df['diameter'], label=medicion, color='blue', s=15)
+    plt.scatter(tiempo, diam, label=medicion, color='blue', s=15)
     plt.axhline(D_T, color='red', linestyle='--', label=f'D(T) = {D_T:.3f}')
     plt.axvline(T_63, color='green', linestyle='--', label=f'T = {T_63:.1f} s')
     plt.title(f'Dispersión Tiempo vs Diámetro - {medicion}')
@@ -65,9 +53,9 @@ for medicion in mediciones:
     # Guardar resultado
     resultados.append({
         'nombre_medicion': medicion,
-        'Di': round(Di, 4),
-        'Df': round(Df, 4),
-        'delta_D': round(delta_D, 4),
+        'Di': round(calculo['di'][i], 4),
+        'Df': round(Df[i], 4),
+        'delta_D': round(calculo['delta_d'][i], 4),
         'D_T': round(D_T, 4),
         'T_63 (s)': round(T_63, 2)
     })
@@ -1,43 +1,35 @@
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
-import mysql.connector
-from getpass import getpass
 import os
 
-# Conexión a MySQL
-conexion = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password=getpass("🔐 Ingresa la contraseña de MySQL: "),
-    database="mediciones_db"
-)
-cursor = conexion.cursor()
+from repositorio_floccam import conectar, listar_mediciones, cargar_arrays_medicion
+
+parser = argparse.ArgumentParser(description="Análisis de las mediciones cargadas con Df ingresado a mano.")
+parser.add_argument("--password", default=None, help="Contraseña MySQL local (o MYSQL_PASSWORD)")
+args = parser.parse_args()
+
+# Conexión a la base de datos (secrets.toml, SQLite o localhost, ver repositorio_floccam.conectar)
+conexion = conectar(args.password)
 
 # Crear carpeta de gráficos si no existe
 os.makedirs("graficos_mediciones", exist_ok=True)
 
 # Obtener nombres únicos de las mediciones
-cursor.execute("SELECT DISTINCT nombre_medicion FROM mediciones")
-mediciones = [row[0] for row in cursor.fetchall()]
+mediciones = listar_mediciones(conexion)
 
 # Preparar resultados
 resultados = []
 
 # Procesar cada medición
 for nombre in mediciones:
-    cursor.execute("""
-        SELECT unix_time, diameter 
-        FROM mediciones 
-        WHERE nombre_medicion = %s 
-        ORDER BY unix_time ASC
-    """, (nombre,))
-    datos = cursor.fetchall()
-    
-    if not datos:
+    datos = cargar_arrays_medicion(conexion, nombre)
+
+    if not len(datos["unix_time"]):
         continue
 
     # Crear DataFrame y calcular tiempo relativo
-    df = pd.DataFrame(datos, columns=["unix_time", "diameter"])
+    df = pd.DataFrame(datos)
     df["tiempo"] = df["unix_time"] - df["unix_time"].iloc[0]
 
     # Di: primer valor de diámetro
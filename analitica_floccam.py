@@ -0,0 +1,183 @@
+"""
+Analítica de Floccam Analyzer: espejos Parquet + DuckDB embebido.
+
+`historico` (con las dosis de `ensayo`) y las curvas archivadas se copian a Parquet en
+CARPETA_ANALITICA; las agregaciones entre plantas y años (T63 por dosis, mes o planta)
+se calculan con DuckDB sobre esos archivos, sin cargar la BD transaccional.
+
+Uso (p. ej. programado cada noche; la app también refresca al guardar un proyecto):
+    py analitica_floccam.py --exportar
+    py analitica_floccam.py --exportar --password ****
+
+Las curvas se archivan al guardar un proyecto (antes de que se borren de `mediciones`);
+`--exportar` además archiva las mediciones compartidas que sigan en la BD.
+"""
+import argparse
+import glob
+import os
+import re
+
+import pandas as pd
+
+from repositorio_floccam import (
+    conectar, historico_por_dosis, listar_mediciones, cargar_arrays_medicion, ensayo_de_medicion,
+)
+from ingesta_floccam import columnas_mediciones
+
+try:
+    import duckdb  # motor analítico embebido, opcional (solo para las consultas)
+except ImportError:
+    duckdb = None
+
+CARPETA_ANALITICA = os.environ.get("FLOCCAM_ANALITICA", "analitica")
+
+
+def _archivo_curva(nombre, ensayo_id=None, planta=None, fecha=None):
+    """
+    Nombre del Parquet de una curva. Con `ensayo` es ensayo<id>_<medicion>: no cambia al
+    guardar el proyecto, así exportar y guardar reescriben el mismo archivo. Sin ensayo
+    (BD anteriores a la tabla) queda el nombre por planta/fecha.
+    """
+    if ensayo_id is not None:
+        partes = [f"ensayo{ensayo_id}", nombre]
+    else:
+        partes = [planta or "sin_planta", fecha.strftime("%Y%m%d") if pd.notna(fecha) else "", nombre]
+    return re.sub(r"\W+", "_", "_".join(p for p in partes if p)).strip("_") + ".parquet"
+
+
+def _escribir_parquet(df, ruta):
+    """Escritura atómica: nunca queda un Parquet a medias si el proceso se corta."""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f"{ruta}.tmp"
+    df.to_parquet(temporal, index=False)
+    os.replace(temporal, ruta)
+
+
+def exportar_historico(conn, carpeta=CARPETA_ANALITICA):
+    """Reescribe historico.parquet (todo `historico` + dosis). Devuelve las filas exportadas."""
+    df = historico_por_dosis(conn)
+    df["fecha"] = pd.to_datetime(df["fecha"])
+    _escribir_parquet(df, os.path.join(carpeta, "historico.parquet"))
+    return len(df)
+
+
+def archivar_curvas(conn, nombres, planta=None, fecha=None, sesion_id=None, incluir_compartidas=True,
+                    carpeta=CARPETA_ANALITICA):
+    """
+    Copia a curvas/ las curvas completas de `nombres` (todas las columnas de `mediciones`),
+    una por archivo (ver _archivo_curva). Planta y fecha salen de su `ensayo` si no se dan.
+    Reescribe el archivo si la medición ya estaba (y borra el de nombre viejo por planta/fecha).
+    Devuelve cuántas curvas se archivaron.
+    """
+    variables = columnas_mediciones[1:]
+    archivadas = 0
+    for nombre in nombres:
+        arrays = cargar_arrays_medicion(conn, nombre, variables, sesion_id, incluir_compartidas)
+        if arrays["unix_time"].size == 0:
+            continue
+        ensayo_id, planta_ensayo, fecha_ensayo = (
+            ensayo_de_medicion(conn, nombre, sesion_id, incluir_compartidas) or (None, None, None)
+        )
+        planta_curva = planta or planta_ensayo
+        fecha_curva = pd.Timestamp(fecha or fecha_ensayo) if (fecha or fecha_ensayo) else pd.NaT
+        df = pd.DataFrame(arrays)
+        df.insert(0, "nombre_medicion", nombre)
+        df.insert(1, "planta", planta_curva)
+        df.insert(2, "fecha", fecha_curva)
+        df["tiempo"] = df["unix_time"] - df["unix_time"].iloc[0]
+        archivo = _archivo_curva(nombre, ensayo_id, planta_curva, fecha_curva)
+        _escribir_parquet(df, os.path.join(carpeta, "curvas", archivo))
+        for viejo in {_archivo_curva(nombre), _archivo_curva(nombre, None, planta_curva, fecha_curva)} - {archivo}:
+            if os.path.exists(os.path.join(carpeta, "curvas", viejo)):
+                os.remove(os.path.join(carpeta, "curvas", viejo))
+        archivadas += 1
+    return archivadas
+
+
+def conectar_analitica(carpeta=CARPETA_ANALITICA):
+    """
+    Conexión DuckDB en memoria con las vistas `historico` y `curvas` sobre los Parquet.
+    (Las vistas que no tienen archivos todavía no se crean.)
+    """
+    if duckdb is None:
+        raise RuntimeError("El modo analítico requiere duckdb (pip install duckdb).")
+    con = duckdb.connect()
+    ruta_historico = os.path.join(carpeta, "historico.parquet")
+    if os.path.exists(ruta_historico):
+        con.execute(f"CREATE VIEW historico AS SELECT * FROM read_parquet('{ruta_historico}')")
+    ruta_curvas = os.path.join(carpeta, "curvas", "*.parquet")
+    if glob.glob(ruta_curvas):
+        con.execute(f"CREATE VIEW curvas AS SELECT * FROM read_parquet('{ruta_curvas}', union_by_name = true)")
+    return con
+
+
+def consultar(sql, params=None, carpeta=CARPETA_ANALITICA):
+    """Ejecuta `sql` (DuckDB, parámetros ?) sobre los espejos y devuelve un DataFrame."""
+    con = conectar_analitica(carpeta)
+    try:
+        return con.execute(sql, params or []).df()
+    finally:
+        con.close()
+
+
+def _filtro_planta(planta):
+    return ("WHERE planta = ?", [planta]) if planta else ("", [])
+
+
+def t63_por_dosis(planta=None, carpeta=CARPETA_ANALITICA):
+    """T63 (n, media, mediana, mín., máx.) por par de dosis, de todas las plantas o de una."""
+    where, params = _filtro_planta(planta)
+    return consultar(
+        f"""
+        SELECT dosis_coagulante, dosis_floculante, COUNT(*) AS n,
+               AVG(t63) AS t63_media, MEDIAN(t63) AS t63_mediana, MIN(t63) AS t63_min, MAX(t63) AS t63_max
+        FROM historico {where}
+        GROUP BY ALL
+        ORDER BY dosis_coagulante, dosis_floculante
+        """, params, carpeta)
+
+
+def t63_por_mes(planta=None, carpeta=CARPETA_ANALITICA):
+    """T63 mensual por planta (serie multi-año)."""
+    where, params = _filtro_planta(planta)
+    return consultar(
+        f"""
+        SELECT date_trunc('month', fecha) AS mes, planta, COUNT(*) AS n,
+               AVG(t63) AS t63_media, MEDIAN(t63) AS t63_mediana
+        FROM historico {where}
+        GROUP BY ALL
+        ORDER BY mes, planta
+        """, params, carpeta)
+
+
+def t63_por_planta(carpeta=CARPETA_ANALITICA):
+    """Resumen de T63 y ΔD por planta, con el rango de fechas cubierto."""
+    return consultar(
+        """
+        SELECT planta, COUNT(*) AS n, MIN(fecha) AS desde, MAX(fecha) AS hasta,
+               AVG(t63) AS t63_media, MEDIAN(t63) AS t63_mediana, AVG(delta_d) AS delta_d_media
+        FROM historico
+        GROUP BY planta
+        ORDER BY planta
+        """, carpeta=carpeta)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Espejos Parquet y consultas DuckDB de Floccam.")
+    parser.add_argument("--exportar", action="store_true", help="Refrescar historico.parquet y archivar curvas compartidas")
+    parser.add_argument("--password", default=None, help="Contraseña MySQL local (o MYSQL_PASSWORD)")
+    parser.add_argument("--carpeta", default=CARPETA_ANALITICA, help=f"Carpeta de los Parquet (por defecto {CARPETA_ANALITICA})")
+    args = parser.parse_args()
+
+    if args.exportar:
+        conn = conectar(args.password)
+        filas = exportar_historico(conn, args.carpeta)
+        curvas = archivar_curvas(conn, listar_mediciones(conn), carpeta=args.carpeta)
+        conn.close()
+        print(f"✅ historico.parquet: {filas} filas; {curvas} curvas archivadas en {args.carpeta}")
+    if duckdb is None:
+        print("ℹ️ Instala duckdb (pip install duckdb) para consultar los espejos.")
+    elif not os.path.exists(os.path.join(args.carpeta, "historico.parquet")):
+        print(f"ℹ️ No hay historico.parquet en {args.carpeta}: ejecuta primero con --exportar.")
+    else:
+        print(t63_por_planta(args.carpeta).to_string(index=False))
@@ -1,15 +1,19 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import mysql.connector
-import io
 import os
-import re
 import datetime
 from pathlib import Path
 from PIL import Image
 
+from ingesta_floccam import parsear_csv, insertar_medicion_bulk, borrar_mediciones, columnas_dosis
+from migraciones_floccam import migrar
+from calculo_floccam import agrupar_curvas, curva, calcular_t63, detectar_df, resumen_t63
+from repositorio_floccam import (
+    conectar, leer_mediciones, listar_mediciones, cargar_arrays_medicion, listar_plantas, listar_fechas,
+    leer_historico, guardar_historico, borrar_historico,
+)
+
 # Definir carpeta donde están las imágenes de las plantas
 CARPETA_PLANTAS = "imagenes_plantas"
 
@@ -112,20 +116,6 @@ os.makedirs(output_folder, exist_ok=True)
 if "procesado" not in st.session_state:
     st.session_state["procesado"] = False
 
-# Columnas esperadas
-columnas_medicion_temp = [
-    'ascii_time', 'excel_time', 'unix_time', 'diameter', 'number',
-    'mass_fraction', 'skew1', 'skew2', 'skew3', 'fractal_dimension',
-    'sphericity', 'clarity', 'brightness', 'sizea', 'sizev',
-    'size01', 'size02', 'size03', 'dividersize',
-    'aveaspectv', 'avewidthv', 'avelengthv', 'largestfloc'
-]
-columnas_mediciones = [
-    'nombre_medicion', 'unix_time', 'diameter', 'number',
-    'mass_fraction', 'skew1', 'skew2', 'skew3', 'fractal_dimension',
-    'sphericity', 'clarity', 'largestfloc'
-]
-
 # Tabs principales
 tab_ingreso, tab_procesamiento, tab_comparativos, tab_graficos, tab_guardar, tab_historicos = st.tabs([
     "📝 Ingreso de información",
@@ -136,14 +126,6 @@ tab_ingreso, tab_procesamiento, tab_comparativos, tab_graficos, tab_guardar, tab
     "📂 Históricos"
 ])
 
-def extraer_dosis(nombre_medicion):
-    partes = nombre_medicion.strip().split("_")
-    try:
-        dosis_c = float(partes[-2])
-        dosis_f = float(partes[-1])
-        return dosis_c, dosis_f
-    except (IndexError, ValueError):
-        return None, None
 
 
 
@@ -182,64 +164,28 @@ with tab_procesamiento:
         notas = st.session_state["notas"]
         accion = st.session_state["accion"]
 
-        conn = mysql.connector.connect(
-            host="localhost", user="root",
-            password=mysql_password,
-            database="mediciones_db"
-        )
-        cursor = conn.cursor()
+        conn = conectar(mysql_password)
+        migrar(conn)
 
         df_manual_dict = {}
         resumen = []
 
         if accion == "Eliminar todo antes de cargar":
-            cursor.execute("DELETE FROM mediciones")
-            conn.commit()
+            borrar_mediciones(conn)
 
         for archivo in archivos:
-            nombre_medicion = Path(archivo.name).stem
-            try:
-                df = pd.read_csv(io.StringIO(archivo.getvalue().decode("utf-8")))
-                if df.empty or df.shape[1] == 0:
-                    st.error(f"❌ El archivo `{archivo.name}` no contiene datos válidos.")
-                    continue
-            except Exception as e:
-                st.error(f"❌ No se pudo leer el archivo `{archivo.name}`: {e}")
+            nombre_medicion, df, error = parsear_csv(archivo.name, archivo.getvalue())
+            if error:
+                st.error(f"❌ {error}")
                 continue
-
-            
-            df.columns = [re.sub(r'\W+', '_', col.strip().lower()) for col in df.columns]
-
-            cursor.execute("DELETE FROM medicion_temp")
-            conn.commit()
-
-            columnas_str = ', '.join(columnas_medicion_temp)
-            placeholders = ', '.join(['%s'] * len(columnas_medicion_temp))
-            insert_temp_sql = f"INSERT INTO medicion_temp ({columnas_str}) VALUES ({placeholders})"
-            valores = df[columnas_medicion_temp].values.tolist()
-            cursor.executemany(insert_temp_sql, valores)
-            conn.commit()
-
-            insert_mediciones_sql = f"""INSERT INTO mediciones (nombre_medicion, unix_time, diameter, number,
-                    mass_fraction, skew1, skew2, skew3, fractal_dimension,
-                    sphericity, clarity, largestfloc)
-                    SELECT %s, unix_time, diameter, number, mass_fraction, skew1, skew2, skew3,
-                    fractal_dimension, sphericity, clarity, largestfloc FROM medicion_temp"""
-            cursor.execute(insert_mediciones_sql, (nombre_medicion,))
-            conn.commit()
-            cursor.execute("DELETE FROM medicion_temp")
-            conn.commit()
-
-        cursor.execute("SELECT * FROM mediciones")
-        df_total = pd.DataFrame(cursor.fetchall(), columns=[col[0] for col in cursor.description])
-        for nombre, grupo in df_total.groupby("nombre_medicion"):
-            grupo = grupo.sort_values("unix_time")
-            grupo["tiempo"] = grupo["unix_time"] - grupo["unix_time"].min()
-            tiempo = grupo["tiempo"].to_numpy()
-            diam = grupo["diameter"].to_numpy()
-            if len(diam) == 0:
-                continue
-            di = diam[0]
+            insertar_medicion_bulk(conn, nombre_medicion, df,
+                                   ensayo={"planta": planta, "fecha": fecha_analisis, "notas": notas})
+
+        df_total = leer_mediciones(conn)
+        curvas = agrupar_curvas(df_total["nombre_medicion"], df_total["unix_time"], df_total["diameter"])
+        deteccion = detectar_df(curvas)  # Df automático, valor inicial de cada campo
+        for i, nombre in enumerate(curvas["nombres"]):
+            tiempo, diam = curva(curvas, i)
             fig, ax = plt.subplots()
             ax.plot(tiempo, diam, marker="o", color="#009739", linewidth=2, label=nombre)
 
@@ -251,42 +197,25 @@ with tab_procesamiento:
                 ylabel="Diámetro (mm)"
             )
             st.pyplot(fig)
-            df_input = st.number_input(f"📍 Ingresa Df para '{nombre}'", min_value=0.0, step=0.1, format="%.3f", key=nombre)
-            df_manual_dict[nombre] = {"df_manual": df_input, "grupo": grupo}
+            df_manual_dict[nombre] = st.number_input(f"📍 Df para '{nombre}'", min_value=0.0, value=float(np.nan_to_num(deteccion["df"][i])), step=0.1, format="%.3f", key=nombre)
 
         if st.button("⚙️ Procesar mediciones"):
-            for nombre, datos in df_manual_dict.items():
-                grupo = datos["grupo"]
-                df_manual = datos["df_manual"]
-                tiempo = grupo["tiempo"].to_numpy()
-                diam = grupo["diameter"].to_numpy()
-                di = diam[0]
-                delta_d = df_manual - di
-                objetivo = di + 0.63 * delta_d
-                idx_t63 = np.abs(diam - objetivo).argmin()
-                t_63 = tiempo[idx_t63] if len(tiempo) > idx_t63 else np.nan
-                d_t = diam.max()
-
-                resumen.append({
-                    "nombre_medicion": nombre,
-                    "Di (mm)": di,
-                    "Df (mm)": df_manual,
-                    "ΔD (mm)": delta_d,
-                    "D(T) (mm)": d_t,
-                    "T_63 (s)": t_63
-                })
+            calculo = calcular_t63(curvas, [df_manual_dict[nombre] for nombre in curvas["nombres"]])
+            df_resumen = resumen_t63(curvas, calculo=calculo)
+            resumen = df_resumen.to_dict("records")
 
+            for i, nombre in enumerate(curvas["nombres"]):
+                tiempo, diam = curva(curvas, i)
                 fig2, ax2 = plt.subplots()
                 ax2.plot(tiempo, diam, marker="o", color="#009739", linewidth=2, label="Diámetro")
-                ax2.axhline(objetivo, color="#D85400", linestyle="--", linewidth=2, label="63% ΔD")
-                ax2.axvline(t_63, color="#007a2f", linestyle="--", linewidth=2, label="T₆₃")
+                ax2.axhline(calculo["objetivo"][i], color="#D85400", linestyle="--", linewidth=2, label="63% ΔD")
+                ax2.axvline(calculo["t63"][i], color="#007a2f", linestyle="--", linewidth=2, label="T₆₃")
 
                 fig2 = estilizar_grafico(fig2, ax2, f"🎯 Curva y puntos clave - {nombre}", ylabel="Diámetro (mm)")
                 st.pyplot(fig2)
 
 
 
-            df_resumen = pd.DataFrame(resumen)
             df_resumen.to_csv(f"{output_folder}/resumen_mediciones_{fecha_analisis}_{planta}.csv", index=False)
             st.markdown("### 🧾 Resumen de mediciones procesadas")
 
@@ -327,27 +256,11 @@ with tab_procesamiento:
             })
 
             # 💾 Guardar resumen en la tabla `historico`
-            cursor = conn.cursor()
-            for _, fila in df_resumen.iterrows():
-                cursor.execute("""
-                    INSERT INTO historico (nombre_medicion, fecha, planta, di, df, delta_d, dt, t63)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    fila["nombre_medicion"],
-                    fecha_analisis,
-                    planta,
-                    fila["di"],
-                    fila["df"],
-                    fila["delta_d"],
-                    fila["dt"],
-                    fila["t63"]
-                ))
-            conn.commit()
+            guardar_historico(conn, planta, fecha_analisis, df_resumen)
 
             st.success("📦 Resumen guardado en la base de datos (tabla `historico`).")
 
 
-            cursor.close()
             conn.close()
 
 # 📈 COMPARATIVOS
@@ -359,18 +272,7 @@ with tab_comparativos:
        
 
         # Asegurarse de que las columnas de dosis estén presentes
-        def extraer_dosis(nombre):
-            partes = nombre.strip().split("_")
-            try:
-                coagulante = float(partes[-2])
-                floculante = float(partes[-1])
-                return coagulante, floculante
-            except (IndexError, ValueError):
-                return None, None
-
-        df_resumen[['dosis_coagulante', 'dosis_floculante']] = df_resumen['nombre_medicion'].apply(
-            lambda x: pd.Series(extraer_dosis(x))
-        )
+        df_resumen[['dosis_coagulante', 'dosis_floculante']] = columnas_dosis(df_resumen['nombre_medicion'])
 
         df_resumen = df_resumen.dropna(subset=['dosis_coagulante', 'dosis_floculante', 'T_63 (s)'])
 
@@ -470,57 +372,52 @@ with tab_graficos:
     st.subheader("📉 Visualización por variable")
 
     mysql_password = st.session_state.get("mysql_password", "")
-    if mysql_password:
-        conn = mysql.connector.connect(
-            host="localhost", user="root", password=mysql_password, database="mediciones_db"
-        )
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM mediciones")
-        df_total = pd.DataFrame(cursor.fetchall(), columns=[col[0] for col in cursor.description])
-
-        mediciones = df_total["nombre_medicion"].unique().tolist()
-        medicion_sel = st.selectbox("Medición", mediciones)
-        variable_sel = st.selectbox("Variable", ["largestfloc", "mass_fraction", "clarity", "fractal_dimension"])
-
-        grupo = df_total[df_total["nombre_medicion"] == medicion_sel].sort_values("unix_time")
-        grupo["tiempo"] = grupo["unix_time"] - grupo["unix_time"].min()
-        y = grupo[variable_sel].to_numpy()
-        tiempo = grupo["tiempo"].to_numpy()
-
-        valor_maximo = np.round(y.max(), 4)
-        
-        # 🟢 Título con nombre de la medición
-        st.markdown(f"#### 📌 Medición seleccionada: `{medicion_sel}`")
-
-        # 🔢 KPI
-        col1, col2 = st.columns(2)
-        with col1:
-            tarjeta_kpi("Variable", variable_sel)
-        with col2:
-            tarjeta_kpi("Valor máx.", valor_maximo)
-
-        # 📈 Gráfico estilizado
-        fig, ax = plt.subplots()
-        ax.plot(tiempo, y, marker="o", color="#009739", label=variable_sel)
-        ax.legend()
-
-        fig = estilizar_grafico(
-            fig, ax,
-            f"{variable_sel} en el tiempo - {medicion_sel}",
-            ylabel=variable_sel
-        )
-        st.pyplot(fig)
+    if not mysql_password:
+        st.warning("🔑 Ingresa tu contraseña en la pestaña 'Ingreso de información' para acceder a esta sección.")
+    else:
+        conn = conectar(mysql_password)
+        mediciones = listar_mediciones(conn)
+        if not mediciones:
+            st.info("No hay mediciones cargadas para graficar.")
+            conn.close()
+        else:
+            medicion_sel = st.selectbox("Medición", mediciones)
+            variable_sel = st.selectbox("Variable", ["largestfloc", "mass_fraction", "clarity", "fractal_dimension"])
 
-        # Guardado del gráfico
-        nombre_archivo = f"otros_{medicion_sel}_{variable_sel}.png"
-        fig.savefig(f"{output_folder}/{nombre_archivo}")
+            # Solo unix_time + la variable elegida de la medición elegida
+            arrays = cargar_arrays_medicion(conn, medicion_sel, [variable_sel])
+            y = arrays[variable_sel]
+            tiempo = arrays["unix_time"] - arrays["unix_time"].min()
 
-        cursor.close()
-        conn.close()
+            valor_maximo = np.round(y.max(), 4)
 
-    else:
-        st.warning("🔑 Ingresa tu contraseña en la pestaña 'Ingreso de información' para acceder a esta sección.")
+            # 🟢 Título con nombre de la medición
+            st.markdown(f"#### 📌 Medición seleccionada: `{medicion_sel}`")
 
+            # 🔢 KPI
+            col1, col2 = st.columns(2)
+            with col1:
+                tarjeta_kpi("Variable", variable_sel)
+            with col2:
+                tarjeta_kpi("Valor máx.", valor_maximo)
+
+            # 📈 Gráfico estilizado
+            fig, ax = plt.subplots()
+            ax.plot(tiempo, y, marker="o", color="#009739", label=variable_sel)
+            ax.legend()
+
+            fig = estilizar_grafico(
+                fig, ax,
+                f"{variable_sel} en el tiempo - {medicion_sel}",
+                ylabel=variable_sel
+            )
+            st.pyplot(fig)
+
+            # Guardado del gráfico
+            nombre_archivo = f"otros_{medicion_sel}_{variable_sel}.png"
+            fig.savefig(f"{output_folder}/{nombre_archivo}")
+
+            conn.close()
 
 # 💾 GUARDAR INFORMACIÓN
 with tab_guardar:
@@ -592,15 +489,10 @@ with tab_historicos:
 
     mysql_password = st.session_state.get("mysql_password", "")
     if mysql_password:
-        conn = mysql.connector.connect(
-            host="localhost", user="root", password=mysql_password, database="mediciones_db"
-        )
-        cursor = conn.cursor()
+        conn = conectar(mysql_password)
 
-        
         # 🔍 Selección de planta (sincronizado con los botones visuales)
-        cursor.execute("SELECT DISTINCT planta FROM historico ORDER BY planta")
-        plantas_disponibles = [row[0] for row in cursor.fetchall()]
+        plantas_disponibles = listar_plantas(conn)
 
         # Si ya se seleccionó una planta con imagen, la usamos
         planta_default = st.session_state.get("planta_filtrada", None)
@@ -615,16 +507,11 @@ with tab_historicos:
 
 
         # 🔍 Selección de fecha
-        cursor.execute("SELECT DISTINCT fecha FROM historico WHERE planta = %s ORDER BY fecha DESC", (planta_sel,))
-        fechas_disponibles = [row[0] for row in cursor.fetchall()]
+        fechas_disponibles = listar_fechas(conn, planta_sel)
         fecha_sel = st.selectbox("📅 Selecciona la fecha", fechas_disponibles)
 
         # 📥 Consulta de datos históricos
-        cursor.execute("""
-            SELECT * FROM historico
-            WHERE fecha = %s AND planta = %s
-        """, (fecha_sel, planta_sel))
-        historico_df = pd.DataFrame(cursor.fetchall(), columns=[col[0] for col in cursor.description])
+        historico_df = leer_historico(conn, planta_sel, fecha_sel)
 
         # 🧾 KPI resumen
         st.markdown("### 📊 Resumen general")
@@ -654,10 +541,8 @@ with tab_historicos:
                     seleccionados.append(nombre)
 
             if seleccionados and st.button("❌ Eliminar seleccionados"):
+                borrar_historico(conn, nombres=seleccionados)
                 for nombre in seleccionados:
-                    cursor.execute("DELETE FROM historico WHERE nombre_medicion = %s", (nombre,))
-                    conn.commit()
-
                     # Eliminar gráficos asociados
                     patrones = [
                         f"{nombre}_grafico.png",
@@ -701,7 +586,6 @@ with tab_historicos:
                         with st.expander(f"📌 {img_path.name}"):
                             st.image(str(img_path), caption=f"Otro gráfico - {img_path.name}")
 
-        cursor.close()
         conn.close()
     else:
         st.warning("🔑 Ingresa tu contraseña en la pestaña 'Ingreso de información' para ver históricos.")
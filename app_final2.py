@@ -1,4 +1,4 @@
-import os, io, re, base64
+import os, io, re, base64, uuid, time, threading, socket
 from pathlib import Path  # <- Si no lo usas más abajo, puedes borrarlo luego.
 import datetime           # <- Si no lo usas más abajo, puedes borrarlo luego.
 
@@ -9,9 +9,25 @@ from PIL import Image
 
 import streamlit as st
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, errorcode, pooling
 import streamlit.components.v1 as components
 
+from ingesta_floccam import (
+    borrar_mediciones,
+    iterar_entradas, contar_entradas, ingerir_entradas,
+    insertar_incremento_en_vivo, leer_incremento_csv, columnas_faltantes, validar_medicion, columnas_dosis,
+)
+from migraciones_floccam import migrar
+from sqlite_floccam import conectar_sqlite, ruta_sqlite
+from instrumentacion_floccam import instrumentar, etiquetar, ultimas_consultas
+from calculo_floccam import agrupar_curvas, curva, calcular_t63, detectar_df, resumen_t63
+from analitica_floccam import archivar_curvas, exportar_historico, t63_por_dosis, t63_por_mes, t63_por_planta, duckdb
+from repositorio_floccam import (
+    leer_mediciones, listar_mediciones, cargar_arrays_medicion, listar_plantas, listar_fechas,
+    leer_historico, existe_historico, guardar_historico, borrar_historico, guardar_graficos, listar_graficos,
+    leer_blobs_graficos, graficos_de_medicion,
+)
+
 # ===== DB Bootstrap & Helpers (auto-added) =====
 
 # === Favicon limpio a partir del logo (cuadra y centra con transparencia) ===
@@ -102,217 +118,289 @@ def local_css(path: str):
 local_css("style_epm.css")
 
 
-def get_db_connection(mysql_password=None):
+# Pool de conexiones (opcionales en st.secrets['mysql']: pool_size, connect_timeout, pool_timeout)
+POOL_SIZE_DEFECTO = 5
+CONNECT_TIMEOUT_DEFECTO = 10   # s para abrir una conexión nueva
+POOL_TIMEOUT_DEFECTO = 5       # s de espera si todas las conexiones del pool están en uso
+
+
+@st.cache_resource(show_spinner=False)
+def _pool_mysql(host, user, password, database, port, pool_size, connect_timeout):
     """
-    Devuelve una conexión mysql.connector.connect.
+    Pool creado UNA vez por proceso y por configuración, compartido entre sesiones.
+    Al sacar una conexión, pooling la valida (ping) y la reconecta si se cayó; al
+    devolverla (conn.close()) se resetea la sesión MySQL.
+    """
+    return pooling.MySQLConnectionPool(
+        pool_name="floccam",
+        pool_size=pool_size,
+        pool_reset_session=True,
+        host=host, user=user, password=password, database=database, port=port,
+        connect_timeout=connect_timeout,
+    )
+
+
+def _tomar_del_pool(params, opciones):
+    pool = _pool_mysql(
+        **params,
+        pool_size=int(opciones.get("pool_size") or POOL_SIZE_DEFECTO),
+        connect_timeout=int(opciones.get("connect_timeout") or CONNECT_TIMEOUT_DEFECTO),
+    )
+    limite = time.monotonic() + float(opciones.get("pool_timeout") or POOL_TIMEOUT_DEFECTO)
+    while True:
+        try:
+            return pool.get_connection()
+        except pooling.PoolError:
+            if time.monotonic() >= limite:
+                break
+            time.sleep(0.05)
+    # Pool agotado (p. ej. conexiones sin cerrar tras un error): conexión directa, no se bloquea la app
+    return mysql.connector.connect(
+        **params, connect_timeout=int(opciones.get("connect_timeout") or CONNECT_TIMEOUT_DEFECTO)
+    )
+
+
+def _parametros_bd(mysql_password=None):
+    """
+    Configuración de BD vigente: ("sqlite", ruta, {}) o ("mysql", params, opciones).
+    - Si hay SQLite configurado (FLOCCAM_SQLITE o st.secrets['sqlite']), ese archivo.
     - Si st.secrets['mysql'] existe (Streamlit Cloud / .streamlit/secrets.toml), lo usa.
-    - Si no, hace fallback a localhost usando mysql_password (uso local).
+    - Si no, localhost con mysql_password (uso local).
     """
     try:
-        cfg = st.secrets["mysql"]
-        host = cfg.get("host"); user = cfg.get("user")
-        password = cfg.get("password"); database = cfg.get("database")
-        port = int(cfg.get("port")) if cfg.get("port") else 3306
-        return mysql.connector.connect(
-            host=host, user=user, password=password, database=database, port=port
-        )
+        secrets = {k: dict(st.secrets[k]) for k in ("sqlite", "mysql") if k in st.secrets}
     except Exception:
-        return mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password=mysql_password or "Emanuel10*",
-            database="mediciones_db",
-            port=3306,
+        secrets = {}
+    ruta = ruta_sqlite(secrets.get("sqlite"))
+    if ruta:
+        return "sqlite", ruta, {}
+    cfg = secrets.get("mysql")
+    if cfg:
+        params = dict(
+            host=cfg.get("host"), user=cfg.get("user"),
+            password=cfg.get("password"), database=cfg.get("database"),
+            port=int(cfg.get("port")) if cfg.get("port") else 3306,
         )
+        return "mysql", params, cfg
+    params = dict(
+        host="localhost",
+        user="root",
+        password=mysql_password or os.environ.get("MYSQL_PASSWORD", ""),
+        database="mediciones_db",
+        port=3306,
+    )
+    return "mysql", params, {}
+
+
+# Monitor de salud de la BD: un hilo por destino (archivo SQLite o host:puerto MySQL) verifica
+# cada INTERVALO_SALUD_S, con un timeout corto y sin credenciales, que el servidor responde, y
+# deja el resultado en memoria. Si el último chequeo falló, get_db_connection falla de inmediato
+# (cortocircuito) en vez de que cada pestaña espere su propio timeout. Los errores de
+# credenciales son de cada sesión: no tocan el estado compartido.
+INTERVALO_SALUD_S = 15
+TIMEOUT_SALUD_S = 2
+
+# Errores de MySQL por usuario/contraseña o permisos (no significan que la BD esté caída)
+ERRORES_CREDENCIALES = (errorcode.ER_ACCESS_DENIED_ERROR, errorcode.ER_DBACCESS_DENIED_ERROR)
+
+
+class BDNoDisponible(ConnectionError):
+    """La BD falló el último chequeo de salud; se reintenta sola en segundo plano."""
+
 
-def bootstrap_graficos_table():
-    ddl = """
-    CREATE TABLE IF NOT EXISTS graficos (
-      id INT AUTO_INCREMENT PRIMARY KEY,
-      planta VARCHAR(100) NOT NULL,
-      fecha DATE NOT NULL,
-      nombre_medicion VARCHAR(255) NOT NULL,
-      tipo VARCHAR(80) DEFAULT NULL,
-      nombre_archivo VARCHAR(255) NOT NULL,
-      formato VARCHAR(10) DEFAULT 'PNG',
-      imagen_blob LONGBLOB NOT NULL,
-      ancho INT DEFAULT NULL,
-      alto INT DEFAULT NULL,
-      creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
+def _destino_bd(motor, params):
+    """Destino de la BD, sin credenciales: ("sqlite", ruta) o ("mysql", host, puerto)."""
+    if motor == "sqlite":
+        return motor, params
+    return motor, params.get("host"), params.get("port")
+
+
+def _chequear_bd(destino):
     """
-    try:
-        mysql_pwd = st.session_state.get("mysql_password", None)
-        conn = get_db_connection(mysql_pwd)
-        if not conn:
-            return
-        cur = conn.cursor()
-        cur.execute(ddl)
-        conn.commit()
-        cur.close(); conn.close()
-    except Exception as e:
-        st.warning(f"No pude crear/verificar la tabla graficos: {e}")
+    SQLite: abre el archivo y hace SELECT 1. MySQL: abre el socket y espera el saludo inicial
+    del servidor (sin autenticarse). Devuelve la latencia (s).
+    """
+    inicio = time.monotonic()
+    if destino[0] == "sqlite":
+        conn = conectar_sqlite(destino[1])
+        try:
+            conn.cursor().execute("SELECT 1")
+        finally:
+            conn.close()
+    else:
+        with socket.create_connection(destino[1:], timeout=TIMEOUT_SALUD_S) as s:
+            if not s.recv(4):
+                raise ConnectionError(f"{destino[1]}:{destino[2]} cerró la conexión sin responder")
+    return time.monotonic() - inicio
+
+
+@st.cache_resource(show_spinner=False)
+def _monitor_bd(destino):
+    """
+    Estado de salud compartido por las sesiones del proceso, uno (con su hilo) por destino:
+    ok (None = aún sin verificar), latencia_s, error y verificado_en.
+    """
+    estado = {"ok": None, "latencia_s": None, "error": None, "verificado_en": None}
+
+    def _bucle():
+        while True:
+            try:
+                estado.update(ok=True, latencia_s=_chequear_bd(destino), error=None)
+            except Exception as e:
+                estado.update(ok=False, latencia_s=None, error=str(e))
+            estado["verificado_en"] = time.time()
+            time.sleep(INTERVALO_SALUD_S)
+
+    threading.Thread(target=_bucle, name="floccam-salud-bd", daemon=True).start()
+    return estado
+
 
+def estado_bd(mysql_password=None):
+    """Estado del monitor del destino configurado (la contraseña no cambia el destino)."""
+    motor, params, _ = _parametros_bd(mysql_password or None)
+    return _monitor_bd(_destino_bd(motor, params))
 
-def bootstrap_graficos_indexes():
-    """Crea índices útiles si no existen (idempotente)."""
+
+def get_db_connection(mysql_password=None):
+    """
+    Devuelve una conexión del pool del proceso; conn.close() la devuelve al pool
+    (SQLite: conexión directa, sin pool). Ver _parametros_bd para la configuración.
+    Lanza BDNoDisponible sin intentar conectar si el monitor de salud marcó la BD caída.
+    """
+    estado = estado_bd(mysql_password)
+    if estado["ok"] is False:
+        raise BDNoDisponible(
+            f"Base de datos no disponible ({estado['error']}). Se reintenta sola cada {INTERVALO_SALUD_S} s."
+        )
+    motor, params, opciones = _parametros_bd(mysql_password)
     try:
-        mysql_pwd = st.session_state.get("mysql_password", None)
-        conn = get_db_connection(mysql_pwd)
-        if not conn:
-            return
-        cur = conn.cursor()
-
-        def _ensure_index(index_name: str, cols: str):
-            cur.execute(
-                """
-                SELECT COUNT(1)
-                FROM information_schema.statistics
-                WHERE table_schema = DATABASE()
-                  AND table_name = 'graficos'
-                  AND index_name = %s
-                """, (index_name,))
-            exists = cur.fetchone()[0] > 0
-            if not exists:
-                cur.execute(f"CREATE INDEX {index_name} ON graficos ({cols})")
-
-        _ensure_index("idx_graficos_pftm", "planta, fecha, tipo, nombre_medicion")
-        _ensure_index("idx_graficos_pfta", "planta, fecha, tipo, nombre_archivo")
-
-        conn.commit()
-        cur.close(); conn.close()
+        if motor == "sqlite":
+            return instrumentar(conectar_sqlite(params))
+        return instrumentar(_tomar_del_pool(params, opciones))
     except Exception as e:
-        st.warning(f"No pude crear/verificar índices en 'graficos': {e}")
+        # Credenciales mal escritas: el error es solo de esta sesión
+        if getattr(e, "errno", None) in ERRORES_CREDENCIALES:
+            raise
+        # Abre el cortocircuito ya: el resto de esta ejecución (y de otras sesiones) falla rápido
+        estado.update(ok=False, latencia_s=None, error=str(e), verificado_en=time.time())
+        raise
+
+@st.cache_resource(show_spinner=False)
+def esquema_al_dia(mysql_password=None):
+    """
+    Aplica las migraciones pendientes (migraciones_floccam) UNA vez por proceso.
+    Las sesiones siguientes no hacen ninguna consulta de metadatos.
+    """
+    conn = get_db_connection(mysql_password)
+    try:
+        return migrar(conn)
+    finally:
+        conn.close()
+
+
+def alcance_sesion():
+    """
+    (sesion_id, incluir_compartidas) de esta sesión: ve sus propias cargas y, en modo
+    'Conservar', también las compartidas (cargadas por script o antes del aislamiento).
+    """
+    incluir = st.session_state.get("accion", "Conservar") == "Conservar"
+    return st.session_state["sesion_id"], incluir
+
+# ===== Caché de consultas =====
+# Resultados de lectura en memoria del proceso (compartidos entre sesiones). La clave incluye
+# la versión de cada tabla leída: las escrituras de esta app la suben con invalidar_tablas(),
+# así que un rerun nunca ve datos viejos de lo que escribió la app. El TTL acota lo que
+# escriben otros procesos (vigilar_carpeta.py, scripts de carga).
+CACHE_TTL_S = 300
+CACHE_MAX_ENTRADAS = 64
+
+
+@st.cache_resource(show_spinner=False)
+def _versiones_tablas():
+    """{tabla: versión} y su lock, UNA vez por proceso."""
+    return {}, threading.Lock()
 
-def bootstrap_historico_indexes():
-    """Crea índices para acelerar consultas en la pestaña Históricos."""
+
+def version_tablas(*tablas):
+    versiones, _ = _versiones_tablas()
+    return tuple(versiones.get(t, 0) for t in tablas)
+
+
+def invalidar_tablas(*tablas):
+    """Llamar después de cada escritura en `tablas` (ingesta, guardado, borrado)."""
+    versiones, lock = _versiones_tablas()
+    with lock:
+        for t in tablas:
+            versiones[t] = versiones.get(t, 0) + 1
+
+
+def _con_conexion(mysql_password, funcion, *args):
+    conn = get_db_connection(mysql_password)
     try:
-        mysql_pwd = st.session_state.get("mysql_password", None)
-        conn = get_db_connection(mysql_pwd)
-        if not conn:
-            return
-        cur = conn.cursor()
-
-        def _ensure_index(index_name: str, cols: str):
-            cur.execute(
-                """
-                SELECT COUNT(1)
-                FROM information_schema.statistics
-                WHERE table_schema = DATABASE()
-                  AND table_name = 'historico'
-                  AND index_name = %s
-                """,
-                (index_name,),
-            )
-            exists = cur.fetchone()[0] > 0
-            if not exists:
-                cur.execute(f"CREATE INDEX {index_name} ON historico ({cols})")
+        return funcion(conn, *args)
+    finally:
+        conn.close()
 
-        # Para SELECT DISTINCT planta / fecha y filtros por planta+fecha
-        _ensure_index("idx_hist_pf", "planta, fecha")
-        # Para filtros + agrupaciones por nombre_medicion en esa misma combinación
-        _ensure_index("idx_hist_pf_nom", "planta, fecha, nombre_medicion")
 
-        conn.commit()
-        cur.close(); conn.close()
-    except Exception as e:
-        st.warning(f"No pude crear/verificar índices en 'historico': {e}")
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=CACHE_MAX_ENTRADAS, show_spinner=False)
+def listar_mediciones_cache(mysql_password, sesion_id, incluir_compartidas, version):
+    return _con_conexion(mysql_password, listar_mediciones, sesion_id, incluir_compartidas)
 
 
-def cargar_graficos_db(planta, fecha, tipo=None, nombre_medicion=None, mysql_password=None):
-    """Lectura de imágenes desde BD, tolerante para TVD por patrón de filename."""
-    
-    # Resolver password de forma explícita y SIEMPRE usar get_db_connection
-    mysql_pwd = mysql_password if mysql_password is not None else st.session_state.get("mysql_password", None)
-    conn = get_db_connection(mysql_pwd)
-    if not conn:
-        return []
-    cur = conn.cursor()
-
-    def _safe(s: str) -> str:
-        return re.sub(r"\W+", "_", (s or "").lower()).strip("_")
-
-    # Caso especial: TVD con nombre, tolerante al tipo
-    if tipo == 'tiempo_vs_diametro' and nombre_medicion is not None:
-        base = (nombre_medicion or "").lower()
-        nombre_safe = _safe(base)
-        q = """
-            SELECT nombre_archivo, formato, imagen_blob, nombre_medicion, tipo
-            FROM graficos
-            WHERE planta = %s AND fecha = %s
-              AND (
-                    (tipo = 'tiempo_vs_diametro' AND (
-                         nombre_medicion = %s
-                      OR LOWER(nombre_medicion) = %s
-                      OR nombre_archivo LIKE %s
-                    ))
-                 OR (nombre_archivo LIKE %s AND nombre_archivo NOT LIKE 'grafico_%%')
-              )
-            ORDER BY id
-        """
-        params = [planta, fecha, nombre_medicion, base, f"{nombre_safe}_grafico_%", f"{nombre_safe}_grafico_%"]
-        cur.execute(q, tuple(params))
-        rows = cur.fetchall()
-        cur.close(); conn.close()
-        return rows
-
-    # Resto de casos
-    q = """
-        SELECT nombre_archivo, formato, imagen_blob, nombre_medicion, tipo
-        FROM graficos
-        WHERE planta = %s AND fecha = %s
-    """
-    params = [planta, fecha]
-    if tipo:
-        q += " AND tipo = %s"
-        params.append(tipo)
-    if nombre_medicion is not None:
-        base = (nombre_medicion or "").lower()
-        nombre_safe = _safe(base)
-        q += """
-            AND (
-                 nombre_medicion = %s
-              OR LOWER(nombre_medicion) = %s
-              OR nombre_archivo LIKE %s
-            )
-        """
-        params += [nombre_medicion, base, f"{nombre_safe}_grafico_%"]
-    q += " ORDER BY id"
-    cur.execute(q, tuple(params))
-    rows = cur.fetchall()
-    cur.close(); conn.close()
-    return rows
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=CACHE_MAX_ENTRADAS, show_spinner=False)
+def leer_mediciones_cache(mysql_password, sesion_id, incluir_compartidas, version):
+    return _con_conexion(mysql_password, leer_mediciones, sesion_id, incluir_compartidas)
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=CACHE_MAX_ENTRADAS, show_spinner=False)
+def arrays_medicion_cache(mysql_password, nombre_medicion, columnas, sesion_id, incluir_compartidas, version):
+    return _con_conexion(mysql_password, cargar_arrays_medicion, nombre_medicion, list(columnas),
+                         sesion_id, incluir_compartidas)
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=CACHE_MAX_ENTRADAS, show_spinner=False)
+def listar_plantas_cache(mysql_password, version):
+    return _con_conexion(mysql_password, listar_plantas)
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=CACHE_MAX_ENTRADAS, show_spinner=False)
+def listar_fechas_cache(mysql_password, planta, version):
+    return _con_conexion(mysql_password, listar_fechas, planta)
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=CACHE_MAX_ENTRADAS, show_spinner=False)
+def leer_historico_cache(mysql_password, planta, fecha, version):
+    return _con_conexion(mysql_password, leer_historico, planta, fecha)
+
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=CACHE_MAX_ENTRADAS, show_spinner=False)
+def listar_graficos_cache(mysql_password, planta, fecha, version):
+    return _con_conexion(mysql_password, listar_graficos, planta, fecha)
+
 
 def precompute_otros_desde_db(mysql_password=None):
     """Genera 'Otros' (largestfloc, mass_fraction, clarity, fractal_dimension) en modo headless."""
+    variables = ["largestfloc", "mass_fraction", "clarity", "fractal_dimension"]
     try:
         mysql_pwd = mysql_password if mysql_password is not None else st.session_state.get("mysql_password", None)
-        conn = get_db_connection(mysql_pwd)
-        if not conn:
-            return
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM mediciones")
-        df_total = pd.DataFrame(cur.fetchall(), columns=[c[0] for c in cur.description])
-        cur.close(); conn.close()
+        mediciones = listar_mediciones_cache(mysql_pwd, *alcance_sesion(), version_tablas("mediciones"))
     except Exception as e:
         st.warning(f"No pude leer 'mediciones' para precalcular 'Otros': {e}")
         return
-    if df_total.empty:
-        return
 
-    variables = ["largestfloc", "mass_fraction", "clarity", "fractal_dimension"]
-    for medicion_sel, grupo in df_total.groupby("nombre_medicion"):
-        grupo = grupo.sort_values("unix_time").copy()
-        if "unix_time" not in grupo.columns:
+    for medicion_sel in mediciones:
+        # Una medición a la vez y solo unix_time + las 4 variables: nunca la tabla completa en memoria
+        try:
+            arrays = arrays_medicion_cache(mysql_pwd, medicion_sel, tuple(variables), *alcance_sesion(),
+                                           version_tablas("mediciones"))
+        except Exception as e:
+            st.warning(f"No pude leer '{medicion_sel}' para precalcular 'Otros': {e}")
+            continue
+        if arrays["unix_time"].size == 0:
             continue
-        grupo["tiempo"] = grupo["unix_time"] - grupo["unix_time"].min()
+        t = arrays["unix_time"] - arrays["unix_time"].min()
         for variable_sel in variables:
-            if variable_sel not in grupo.columns:
-                continue
-            y = grupo[variable_sel].to_numpy()
-            t = grupo["tiempo"].to_numpy()
-            if y.size == 0:
-                continue
+            y = arrays[variable_sel]
             fig, ax = plt.subplots()
             ax.plot(t, y, marker="o", label=variable_sel)
             ax.legend()
@@ -324,15 +412,27 @@ def precompute_otros_desde_db(mysql_password=None):
             store_fig_in_memory(fig, nombre_archivo)
             plt.close(fig)
 
-# --- Bootstrap de BD (una vez por sesión) ---
+# Identificador de esta sesión: aísla sus cargas en `mediciones` de las de otros usuarios.
+# Va también en la URL (?sesion=...) para que una recarga o reconexión del navegador siga
+# siendo la misma sesión y retome sus cargas a medias (checkpoint_ingesta).
+if "sesion_id" not in st.session_state:
+    sesion_url = st.query_params.get("sesion", "")
+    st.session_state["sesion_id"] = sesion_url if re.fullmatch(r"[0-9a-f]{32}", sesion_url) else uuid.uuid4().hex
+if st.query_params.get("sesion") != st.session_state["sesion_id"]:
+    st.query_params["sesion"] = st.session_state["sesion_id"]
+
+# Etiqueta de las consultas SQL de esta ejecución (panel de desarrollador, ?dev=1)
+st.session_state["rerun_n"] = st.session_state.get("rerun_n", 0) + 1
+ETIQUETA_RERUN = f"{st.session_state['sesion_id'][:8]}:{st.session_state['rerun_n']}"
+etiquetar(ETIQUETA_RERUN)
+
+# --- Esquema de BD: migraciones pendientes, una vez por proceso (ver migraciones_floccam.py) ---
 if "schema_ready" not in st.session_state:
     try:
-        bootstrap_graficos_table()
-        bootstrap_graficos_indexes()
-        bootstrap_historico_indexes()
+        esquema_al_dia(st.session_state.get("mysql_password", None))
         st.session_state["schema_ready"] = True
     except Exception as _e:
-        st.warning(f"Bootstrap de BD falló: {_e}")
+        st.warning(f"No pude crear/verificar el esquema de BD: {_e}")
 
 
 
@@ -372,9 +472,7 @@ def persist_saved_project(output_folder, fecha_analisis, planta, mysql_password)
 
     # 2) Guardar imágenes en BD (tabla graficos) UNA SOLA VEZ
     try:
-        conn_g = get_db_connection(mysql_password)
-        cur_g = conn_g.cursor()
-
+        graficos = []
         for fname, b in st.session_state.get("graficos_temp", {}).items():
             # Derivar tipo / nombre_medicion desde el nombre del archivo
             # Convenciones actuales:
@@ -398,16 +496,10 @@ def persist_saved_project(output_folder, fecha_analisis, planta, mysql_password)
                 tipo = 'comparativo'
                 # nombre_medicion se queda ''
 
-            cur_g.execute(
-                """
-                INSERT INTO graficos(planta, fecha, nombre_medicion, tipo, nombre_archivo, formato, imagen_blob)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """,
-                (planta, fecha_analisis, nombre_medicion, tipo, fname, 'PNG', b)
-            )
+            graficos.append((nombre_medicion, tipo, fname, 'PNG', b))
 
-        conn_g.commit()
-        cur_g.close(); conn_g.close()
+        _con_conexion(mysql_password, guardar_graficos, planta, fecha_analisis, graficos)
+        invalidar_tablas("graficos")
     except Exception as e:
         st.warning(f"No pude insertar imágenes en 'graficos': {e}")
 
@@ -416,34 +508,23 @@ def persist_saved_project(output_folder, fecha_analisis, planta, mysql_password)
     if df_db is not None and not df_db.empty:
         mysql_password_hist = st.session_state.get("mysql_password", None)
         conn = get_db_connection(mysql_password_hist)
-        cursor = conn.cursor()
-        for _, fila in df_db.iterrows():
-            cursor.execute("""
-                INSERT INTO historico (nombre_medicion, fecha, planta, di, df, delta_d, dt, t63)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                fila["nombre_medicion"],
-                fecha_analisis,
-                planta,
-                fila["di"],
-                fila["df"],
-                fila["delta_d"],
-                fila["dt"],
-                fila["t63"]
-            ))
-        conn.commit()
-
-        # 4) Eliminar mediciones de la tabla `mediciones` para esos nombres (limpieza)
-        nombres = tuple(df_db["nombre_medicion"].unique().tolist())
-        if len(nombres) == 1:
-            cursor.execute("DELETE FROM mediciones WHERE nombre_medicion = %s", (nombres[0],))
-        elif len(nombres) > 1:
-            placeholders = ",".join(["%s"] * len(nombres))
-            cursor.execute(f"DELETE FROM mediciones WHERE nombre_medicion IN ({placeholders})", nombres)
-        conn.commit()
-
-        cursor.close()
-        conn.close()
+        try:
+            guardar_historico(conn, planta, fecha_analisis, df_db)
+
+            # Espejo analítico (Parquet): las curvas se archivan antes de borrarlas de `mediciones`
+            try:
+                nombres = df_db["nombre_medicion"].unique().tolist()
+                archivar_curvas(conn, nombres, planta, fecha_analisis, *alcance_sesion())
+                exportar_historico(conn)
+            except Exception as e:
+                st.warning(f"No pude actualizar el espejo analítico (Parquet): {e}")
+
+            # 4) Eliminar mediciones de la tabla `mediciones` para esos nombres (limpieza),
+            #    junto con su registro en el manifiesto para permitir recargarlas
+            borrar_mediciones(conn, df_db["nombre_medicion"].unique().tolist(), *alcance_sesion())
+        finally:
+            conn.close()
+        invalidar_tablas("historico", "mediciones")
 
     # 5) Limpiar temporales de sesión
     st.session_state.pop("graficos_temp", None)
@@ -545,20 +626,6 @@ os.makedirs(output_folder, exist_ok=True)
 if "procesado" not in st.session_state:
     st.session_state["procesado"] = False
 
-# Columnas esperadas
-columnas_medicion_temp = [
-    'ascii_time', 'excel_time', 'unix_time', 'diameter', 'number',
-    'mass_fraction', 'skew1', 'skew2', 'skew3', 'fractal_dimension',
-    'sphericity', 'clarity', 'brightness', 'sizea', 'sizev',
-    'size01', 'size02', 'size03', 'dividersize',
-    'aveaspectv', 'avewidthv', 'avelengthv', 'largestfloc'
-]
-columnas_mediciones = [
-    'nombre_medicion', 'unix_time', 'diameter', 'number',
-    'mass_fraction', 'skew1', 'skew2', 'skew3', 'fractal_dimension',
-    'sphericity', 'clarity', 'largestfloc'
-]
-
 # --- Barra lateral: Estado del sistema + Acciones rápidas + Consejos ---
 with st.sidebar:
     # ==== Proyecto actual (resumen) ====
@@ -586,24 +653,20 @@ with st.sidebar:
             f"<span class='pill' style='background:{bg}; color:{fg};'>{text}</span>",
             unsafe_allow_html=True,
         )
-    ok_db = False
-    try:
-        _pwd = st.session_state.get("mysql_password", None)
-        _conn = get_db_connection(_pwd)
-        if _conn:
-            _cur = _conn.cursor()
-            _cur.execute("SELECT 1")
-            _cur.fetchone()
-            ok_db = True
-            _cur.close(); _conn.close()
-    except Exception:
-        ok_db = False
+    # Resultado en caché del monitor de salud: dibujar el estado no abre ninguna conexión
+    salud = dict(estado_bd(st.session_state.get("mysql_password", None)))
 
     st.markdown("### Estado")
-    if ok_db:
-        _pill("BD conectada")
+    if salud["ok"]:
+        _pill(f"BD conectada · {salud['latencia_s'] * 1000:.0f} ms")
+    elif salud["ok"] is None:
+        _pill("Verificando BD…", bg="#F1F3F4", fg="#5F6368")
     else:
         _pill("BD desconectada", bg="#FDECEC", fg="#B3261E")
+        st.caption(f"Se reintenta cada {INTERVALO_SALUD_S} s · {salud['error']}")
+
+    # ==== Panel de desarrollador (?dev=1): se llena al final del script ====
+    panel_consultas = st.empty() if st.query_params.get("dev") == "1" else None
 
     # ==== Progreso del flujo ====
     st.markdown("### Progreso")
@@ -668,15 +731,73 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-def extraer_dosis(nombre_medicion):
-    partes = nombre_medicion.strip().split("_")
+# Segundos entre lecturas del CSV en modo en vivo
+INTERVALO_VIVO_S = 5
+
+def panel_en_vivo(ruta):
+    """
+    Modo en vivo: ingiere solo las filas nuevas del CSV que el Floccam está escribiendo
+    (lectura por offset de bytes) y redibuja Tiempo vs Diámetro con un T₆₃ provisional.
+    """
+    estado = st.session_state.setdefault("vivo_estado", {})
     try:
-        dosis_c = float(partes[-2])
-        dosis_f = float(partes[-1])
-        return dosis_c, dosis_f
-    except (IndexError, ValueError):
-        return None, None
+        nuevas = leer_incremento_csv(ruta, estado)
+    except Exception as e:
+        st.error(f"❌ No se pudo leer `{ruta}`: {e}")
+        return
 
+    if not nuevas.empty:
+        faltantes = columnas_faltantes(nuevas)
+        if faltantes:
+            st.error(f"❌ El archivo no contiene las columnas: {', '.join(faltantes)}")
+            return
+        # Validación contra el último unix_time del incremento anterior (duplicados / retrocesos en el corte)
+        unix_previo = estado["unix_time"][-1] if estado.get("unix_time") else None
+        nuevas, cuarentena, _ = validar_medicion(nuevas, unix_previo)
+        try:
+            ensayo = {k: st.session_state.get(k) for k in ("planta", "notas")}
+            ensayo["fecha"] = st.session_state.get("fecha_analisis")
+            conn = get_db_connection(st.session_state.get("mysql_password", None))
+            try:
+                # Queda en el manifiesto como medición en vivo: subir luego el CSV terminado solo agrega lo que falte
+                insertar_incremento_en_vivo(conn, Path(ruta).stem, nuevas, sesion_id=st.session_state["sesion_id"],
+                                            cuarentena=cuarentena, ensayo=ensayo)
+            finally:
+                conn.close()
+            invalidar_tablas("mediciones")
+        except Exception as e:
+            st.error(f"❌ No se pudieron insertar las filas nuevas: {e}")
+            return
+        estado.setdefault("unix_time", []).extend(nuevas["unix_time"].tolist())
+        estado.setdefault("diameter", []).extend(nuevas["diameter"].tolist())
+
+    if not estado.get("unix_time"):
+        st.info("⏳ Esperando datos del Floccam...")
+        return
+
+    curvas = agrupar_curvas([Path(ruta).stem] * len(estado["unix_time"]), estado["unix_time"], estado["diameter"])
+    tiempo, diam = curva(curvas, 0)
+
+    # T₆₃ provisional con el Df automático (el mismo detector de la pestaña Procesamiento)
+    df_prov = detectar_df(curvas)["df"][0]
+    calculo = calcular_t63(curvas, df_prov)
+    objetivo, t_63 = calculo["objetivo"][0], calculo["t63"][0]
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        tarjeta_kpi("Muestras", len(diam))
+    with col2:
+        tarjeta_kpi("Df provisional", round(float(df_prov), 3), "mm")
+    with col3:
+        tarjeta_kpi("T₆₃ provisional", round(float(t_63), 1), "s")
+
+    fig, ax = plt.subplots()
+    ax.plot(tiempo, diam, marker="o", color="#009739", linewidth=2, label=Path(ruta).stem)
+    ax.axhline(objetivo, color="#D85400", linestyle="--", linewidth=2, label="63% ΔD")
+    ax.axvline(t_63, color="#007a2f", linestyle="--", linewidth=2, label="T₆₃")
+    fig = estilizar_grafico(fig, ax, f"📡 Tiempo vs Diámetro (en vivo) - {Path(ruta).stem}", ylabel="Diámetro (mm)")
+    st.pyplot(fig)
+    plt.close(fig)
 
 
 # 📥 INGRESO DE INFORMACIÓN
@@ -699,7 +820,7 @@ with tab_ingreso:
     planta = st.text_input("🏭 Nombre de la planta")
     fecha_analisis = st.date_input("📅 Fecha del análisis", value=datetime.date.today())
     notas = st.text_area("📝 Comentarios del ensayo")
-    archivos = st.file_uploader("📁 Subir archivo(s) CSV", type="csv", accept_multiple_files=True)
+    archivos = st.file_uploader("📁 Subir archivo(s) CSV o ZIP", type=["csv", "zip"], accept_multiple_files=True)
     accion = st.radio("¿Qué hacer con los datos anteriores?", ["Conservar", "Eliminar todo antes de cargar"])
 
     # Permitir iniciar procesamiento si se ingresó contraseña local o si hay st.secrets en producción
@@ -715,6 +836,7 @@ with tab_ingreso:
         st.session_state["fecha_analisis"] = fecha_analisis
         st.session_state["notas"] = notas
         st.session_state["accion"] = accion
+        st.session_state.pop("borrado_previo_hecho", None)
     nav_buttons(None, "🔬 Procesamiento") 
 
     
@@ -722,6 +844,23 @@ with tab_ingreso:
 
 # 🔍 PROCESAMIENTO
 with tab_procesamiento:
+    with st.expander("📡 Modo en vivo (ensayo en curso)"):
+        ruta_vivo = st.text_input("📄 Ruta local del CSV que está escribiendo el Floccam", key="vivo_ruta")
+        st.caption("Las filas nuevas se cargan a la BD a medida que aparecen. "
+                   "Si al terminar subes el CSV completo, solo se agregan las filas que falten.")
+        col_ini, col_fin = st.columns(2)
+        with col_ini:
+            if st.button("▶️ Iniciar", key="vivo_iniciar", use_container_width=True) and ruta_vivo:
+                st.session_state["vivo_estado"] = {}
+                st.session_state["vivo_activo"] = True
+        with col_fin:
+            if st.button("⏹️ Detener", key="vivo_detener", use_container_width=True):
+                st.session_state["vivo_activo"] = False
+
+        if st.session_state.get("vivo_activo") and ruta_vivo:
+            # Solo este fragmento se re-ejecuta cada INTERVALO_VIVO_S, no toda la página
+            st.fragment(run_every=INTERVALO_VIVO_S)(panel_en_vivo)(ruta_vivo)
+
     if st.session_state["procesado"]:
         mysql_password = st.session_state["mysql_password"]
         archivos = st.session_state["archivos"]
@@ -730,62 +869,66 @@ with tab_procesamiento:
         notas = st.session_state["notas"]
         accion = st.session_state["accion"]
 
-        conn = get_db_connection(mysql_password)
-        cursor = conn.cursor()
-
-        df_manual_dict = {}
         resumen = []
 
-        if accion == "Eliminar todo antes de cargar":
-            cursor.execute("DELETE FROM mediciones")
-            conn.commit()
-
-        for archivo in archivos:
-            nombre_medicion = Path(archivo.name).stem
-            try:
-                df = pd.read_csv(io.StringIO(archivo.getvalue().decode("utf-8")))
-                if df.empty or df.shape[1] == 0:
-                    st.error(f"❌ El archivo `{archivo.name}` no contiene datos válidos.")
-                    continue
-            except Exception as e:
-                st.error(f"❌ No se pudo leer el archivo `{archivo.name}`: {e}")
-                continue
-
-            
-            df.columns = [re.sub(r'\W+', '_', col.strip().lower()) for col in df.columns]
-
-            cursor.execute("DELETE FROM medicion_temp")
-            conn.commit()
-
-            columnas_str = ', '.join(columnas_medicion_temp)
-            placeholders = ', '.join(['%s'] * len(columnas_medicion_temp))
-            insert_temp_sql = f"INSERT INTO medicion_temp ({columnas_str}) VALUES ({placeholders})"
-            valores = df[columnas_medicion_temp].values.tolist()
-            cursor.executemany(insert_temp_sql, valores)
-            conn.commit()
-
-            insert_mediciones_sql = f"""INSERT INTO mediciones (nombre_medicion, unix_time, diameter, number,
-                    mass_fraction, skew1, skew2, skew3, fractal_dimension,
-                    sphericity, clarity, largestfloc)
-                    SELECT %s, unix_time, diameter, number, mass_fraction, skew1, skew2, skew3,
-                    fractal_dimension, sphericity, clarity, largestfloc FROM medicion_temp"""
-            cursor.execute(insert_mediciones_sql, (nombre_medicion,))
-            conn.commit()
-            cursor.execute("DELETE FROM medicion_temp")
-            conn.commit()
-
-        cursor.execute("SELECT * FROM mediciones")
-        df_total = pd.DataFrame(cursor.fetchall(), columns=[col[0] for col in cursor.description])
-        for nombre, grupo in df_total.groupby("nombre_medicion"):
-            grupo = grupo.sort_values("unix_time")
-            grupo["tiempo"] = grupo["unix_time"] - grupo["unix_time"].min()
-            tiempo = grupo["tiempo"].to_numpy()
-            diam = grupo["diameter"].to_numpy()
-            if len(diam) == 0:
-                continue
-            di = diam[0]
+        # La conexión solo se usa para borrar e ingerir; las lecturas van por la caché
+        sesion_id, incluir_compartidas = alcance_sesion()
+        conn = get_db_connection(mysql_password)
+        try:
+            # "Eliminar todo" solo borra lo cargado por ESTA sesión; nunca datos de otros usuarios
+            if accion == "Eliminar todo antes de cargar" and not st.session_state.get("borrado_previo_hecho"):
+                borrar_mediciones(conn, sesion_id=sesion_id, incluir_compartidas=False)
+                invalidar_tablas("mediciones")
+                st.session_state["borrado_previo_hecho"] = True
+
+            # CSV sueltos o ZIP, de a una ventana de archivos: manifiesto por hash (omite lo ya
+            # cargado), parseo en paralelo y escritura en BD en serie, una transacción por archivo
+            barra = st.progress(0.0, text="Leyendo archivos...")
+            total = max(contar_entradas(archivos), 1)
+            omitidos = []
+            reporte_calidad = []
+            ensayo = {"planta": planta, "fecha": fecha_analisis, "notas": notas}
+            eventos = ingerir_entradas(conn, iterar_entradas(archivos), sesion_id, incluir_compartidas, ensayo=ensayo)
+            for i, (nombre_archivo, estado, detalle) in enumerate(eventos, start=1):
+                barra.progress(min(i / total, 1.0), text=f"{i}/{total} · {nombre_archivo}")
+                if estado == "cargado":
+                    reporte_calidad.append({"Archivo": nombre_archivo, **detalle})
+                elif estado == "omitido":
+                    omitidos.append(nombre_archivo)
+                elif estado == "error":
+                    st.error(f"❌ {detalle}")
+            barra.empty()
+        finally:
+            conn.close()
+        if reporte_calidad:
+            invalidar_tablas("mediciones")
+        if omitidos:
+            st.caption(f"ℹ️ Ya cargados anteriormente (se omiten): {', '.join(omitidos)}")
+
+        # 🧪 Reporte de calidad por archivo (las filas descartadas quedan en `cuarentena_mediciones`)
+        if reporte_calidad:
+            df_calidad = pd.DataFrame(reporte_calidad).rename(columns={
+                "filas": "Filas válidas",
+                "filas_cuarentena": "Filas en cuarentena",
+                "ratio_nan": "Proporción NaN",
+                "intervalo_s": "Intervalo mediano (s)",
+                "duracion_s": "Duración (s)",
+            })
+            with st.expander("🧪 Calidad de los archivos cargados", expanded=bool(df_calidad["Filas en cuarentena"].any())):
+                st.dataframe(df_calidad, use_container_width=True, hide_index=True)
+
+        df_total = leer_mediciones_cache(mysql_password, sesion_id, incluir_compartidas, version_tablas("mediciones"))
+        # Todas las curvas como arrays planos + offsets (ver calculo_floccam.py)
+        curvas = agrupar_curvas(df_total["nombre_medicion"], df_total["unix_time"], df_total["diameter"])
+        fecha_str = fecha_analisis.strftime("%Y%m%d") if hasattr(fecha_analisis, "strftime") else str(fecha_analisis)
+        planta_safe = re.sub(r'\W+', '_', planta)
+        # Df automático (meseta) de todas las curvas en una pasada; se puede corregir a mano abajo
+        deteccion = detectar_df(curvas)
+        for i, nombre in enumerate(curvas["nombres"]):
+            tiempo, diam = curva(curvas, i)
             fig, ax = plt.subplots()
             ax.plot(tiempo, diam, marker="o", color="#009739", linewidth=2, label=nombre)
+            ax.axhline(deteccion["df"][i], color="#7A7A7A", linestyle=":", linewidth=2, label="Df automático")
 
             ax.legend()
 
@@ -796,47 +939,50 @@ with tab_procesamiento:
             )
             st.pyplot(fig)
             # Guardar figura Tiempo vs Diámetro en memoria (para guardado final)
-            fecha_str = fecha_analisis.strftime("%Y%m%d") if hasattr(fecha_analisis, "strftime") else str(fecha_analisis)
-            planta_safe = re.sub(r'\W+', '_', planta)
             nombre_safe = re.sub(r'\W+', '_', nombre)
             store_fig_in_memory(fig, f"{nombre_safe}_grafico_{planta_safe}_{fecha_str}.png")
 
-            df_input = st.number_input(f"📍 Ingresa Df para '{nombre}'", min_value=0.0, step=0.1, format="%.3f", key=nombre)
-            df_manual_dict[nombre] = {"df_manual": df_input, "grupo": grupo}
-
-        if st.button("⚙️ Procesar mediciones"):
-            for nombre, datos in df_manual_dict.items():
-                grupo = datos["grupo"]
-                df_manual = datos["df_manual"]
-                tiempo = grupo["tiempo"].to_numpy()
-                diam = grupo["diameter"].to_numpy()
-                di = diam[0]
-                delta_d = df_manual - di
-                objetivo = di + 0.63 * delta_d
-                idx_t63 = np.abs(diam - objetivo).argmin()
-                t_63 = tiempo[idx_t63] if len(tiempo) > idx_t63 else np.nan
-                d_t = diam.max()
-
-                resumen.append({
-                    "nombre_medicion": nombre,
-                    "Di (mm)": di,
-                    "Df (mm)": df_manual,
-                    "ΔD (mm)": delta_d,
-                    "D(T) (mm)": d_t,
-                    "T_63 (s)": t_63
-                })
+        # Df manual opcional: una sola tabla dentro de un formulario (editarla no re-ejecuta la pestaña)
+        with st.form("form_df"):
+            st.markdown("#### 📍 Df por medición")
+            st.caption("Vacío = Df automático. ⚠️ = la curva no llegó a una meseta; conviene revisarla.")
+            tabla_df = st.data_editor(
+                pd.DataFrame({
+                    "nombre_medicion": curvas["nombres"],
+                    "Meseta": np.where(deteccion["estable"], "✅", "⚠️"),
+                    "Df automático (mm)": deteccion["df"],
+                    "Df manual (mm)": np.full(len(curvas["nombres"]), np.nan),
+                }),
+                column_config={
+                    "Df automático (mm)": st.column_config.NumberColumn(format="%.3f"),
+                    "Df manual (mm)": st.column_config.NumberColumn(min_value=0.0, step=0.001, format="%.3f"),
+                },
+                disabled=["nombre_medicion", "Meseta", "Df automático (mm)"],
+                hide_index=True,
+                use_container_width=True,
+                key="editor_df",
+            )
+            procesar = st.form_submit_button("⚙️ Procesar mediciones")
+
+        if procesar:
+            # Di, Df, ΔD, D(T) y T₆₃ de todas las mediciones en una sola pasada
+            df_manual = pd.to_numeric(tabla_df["Df manual (mm)"], errors="coerce").to_numpy(dtype=float)
+            calculo = calcular_t63(curvas, np.where(np.isnan(df_manual), deteccion["df"], df_manual))
+            df_resumen = resumen_t63(curvas, calculo=calculo)
+            resumen = df_resumen.to_dict("records")
 
+            for i, nombre in enumerate(curvas["nombres"]):
+                tiempo, diam = curva(curvas, i)
                 fig2, ax2 = plt.subplots()
                 ax2.plot(tiempo, diam, marker="o", color="#009739", linewidth=2, label="Diámetro")
-                ax2.axhline(objetivo, color="#D85400", linestyle="--", linewidth=2, label="63% ΔD")
-                ax2.axvline(t_63, color="#007a2f", linestyle="--", linewidth=2, label="T₆₃")
+                ax2.axhline(calculo["objetivo"][i], color="#D85400", linestyle="--", linewidth=2, label="63% ΔD")
+                ax2.axvline(calculo["t63"][i], color="#007a2f", linestyle="--", linewidth=2, label="T₆₃")
 
                 fig2 = estilizar_grafico(fig2, ax2, f"🎯 Curva y puntos clave - {nombre}", ylabel="Diámetro (mm)")
                 st.pyplot(fig2)
+                nombre_safe = re.sub(r'\W+', '_', nombre)
                 store_fig_in_memory(fig2, f"{nombre_safe}_curva_y_puntos_{planta_safe}_{fecha_str}.png")
 
-
-            df_resumen = pd.DataFrame(resumen)
             
             st.markdown("### 🧾 Resumen de mediciones procesadas")
 
@@ -883,11 +1029,6 @@ with tab_procesamiento:
             store_csv_in_memory(df_resumen_db, csv_name)
 
             st.info("📁 Resumen guardado temporalmente en memoria. Usa la pestaña '💾 Guardar información' para persistir el proyecto.")
-        
-
-
-            cursor.close()
-            conn.close()
     nav_buttons("📝 Ingreso de información", "📈 Comparativos")
 
 # 📈 COMPARATIVOS
@@ -899,18 +1040,7 @@ with tab_comparativos:
        
 
         # Asegurarse de que las columnas de dosis estén presentes
-        def extraer_dosis(nombre):
-            partes = nombre.strip().split("_")
-            try:
-                coagulante = float(partes[-2])
-                floculante = float(partes[-1])
-                return coagulante, floculante
-            except (IndexError, ValueError):
-                return None, None
-
-        df_resumen[['dosis_coagulante', 'dosis_floculante']] = df_resumen['nombre_medicion'].apply(
-            lambda x: pd.Series(extraer_dosis(x))
-        )
+        df_resumen[['dosis_coagulante', 'dosis_floculante']] = columnas_dosis(df_resumen['nombre_medicion'])
 
         df_resumen = df_resumen.dropna(subset=['dosis_coagulante', 'dosis_floculante', 'T_63 (s)'])
 
@@ -1017,41 +1147,24 @@ with tab_graficos:
     except Exception:
         secrets_present = False
 
-    if secrets_present:
-        conn = mysql.connector.connect(
-            host=st.secrets["mysql"]["host"],
-            user=st.secrets["mysql"]["user"],
-            password=st.secrets["mysql"]["password"],
-            database=st.secrets["mysql"]["database"],
-            port=st.secrets["mysql"]["port"]
-        )
-    else:
-        mysql_password = st.session_state.get("mysql_password", "")
-        if mysql_password:
-            conn = mysql.connector.connect(
-                host="localhost",
-                user="root",
-                password=mysql_password,
-                database="mediciones_db",
-                port=3306
-            )
-        else:
-            st.warning("🔑 Ingresa tu contraseña en la pestaña 'Ingreso de información' para acceder a esta sección.")
-            conn = None
+    # Las lecturas van por la caché (cada una toma y devuelve su conexión del pool)
+    conectado = secrets_present or bool(st.session_state.get("mysql_password", ""))
+    if not conectado:
+        st.warning("🔑 Ingresa tu contraseña en la pestaña 'Ingreso de información' para acceder a esta sección.")
 
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM mediciones")
-        df_total = pd.DataFrame(cursor.fetchall(), columns=[col[0] for col in cursor.description])
-
-        mediciones = df_total["nombre_medicion"].unique().tolist()
+    mysql_password = st.session_state.get("mysql_password", None)
+    mediciones = listar_mediciones_cache(mysql_password, *alcance_sesion(), version_tablas("mediciones")) if conectado else []
+    if conectado and not mediciones:
+        st.info("No hay mediciones cargadas para graficar.")
+    elif conectado:
         medicion_sel = st.selectbox("Medición", mediciones)
         variable_sel = st.selectbox("Variable", ["largestfloc", "mass_fraction", "clarity", "fractal_dimension"])
 
-        grupo = df_total[df_total["nombre_medicion"] == medicion_sel].sort_values("unix_time")
-        grupo["tiempo"] = grupo["unix_time"] - grupo["unix_time"].min()
-        y = grupo[variable_sel].to_numpy()
-        tiempo = grupo["tiempo"].to_numpy()
+        # Solo unix_time + la variable elegida de la medición elegida
+        arrays = arrays_medicion_cache(mysql_password, medicion_sel, (variable_sel,), *alcance_sesion(),
+                                       version_tablas("mediciones"))
+        y = arrays[variable_sel]
+        tiempo = arrays["unix_time"] - arrays["unix_time"].min()
 
         valor_maximo = np.round(y.max(), 4)
 
@@ -1080,9 +1193,6 @@ with tab_graficos:
         # Guardado del gráfico
         nombre_archivo = f"otros_{medicion_sel}_{variable_sel}.png"
         store_fig_in_memory(fig, nombre_archivo)
-
-        cursor.close()
-        conn.close()
     nav_buttons("📈 Comparativos", "💾 Guardar información")
 
 # 💾 GUARDAR INFORMACIÓN
@@ -1120,20 +1230,8 @@ with tab_guardar:
                     fecha_analisis = st.session_state.get("fecha_analisis", "")
                     mysql_pwd = st.session_state.get("mysql_password", None)
 
-                    # Conexión flexible
-                    conn = get_db_connection(mysql_pwd)
-                    if not conn:
-                        st.error("No se pudo establecer la conexión. Ingresa la contraseña local o configura `st.secrets` en producción.")
-                        st.stop()
-
                     # ¿Ya existe histórico de esa planta y fecha?
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        SELECT COUNT(*) FROM historico
-                        WHERE planta = %s AND fecha = %s
-                    """, (planta, fecha_analisis))
-                    existe = cursor.fetchone()[0] > 0
-                    cursor.close(); conn.close()
+                    existe = _con_conexion(mysql_pwd, existe_historico, planta, fecha_analisis)
 
                     if existe:
                         opcion = st.radio(
@@ -1142,23 +1240,9 @@ with tab_guardar:
                         )
 
                         if opcion == "Sobrescribir el anterior":
-                            # Limpieza de registros previos
-                            conn = get_db_connection(mysql_pwd)
-                            cursor = conn.cursor()
-                            cursor.execute("""
-                                DELETE FROM historico
-                                WHERE planta = %s AND fecha = %s
-                            """, (planta, fecha_analisis))
-                            # (opcional y recomendado) también limpiar BLOBs previos:
-                            try:
-                                cursor.execute("""
-                                    DELETE FROM graficos
-                                    WHERE planta = %s AND fecha = %s
-                                """, (planta, fecha_analisis))
-                            except Exception:
-                                pass
-                            conn.commit()
-                            cursor.close(); conn.close()
+                            # Limpieza de registros previos (histórico + BLOBs de esa planta y fecha)
+                            _con_conexion(mysql_pwd, borrar_historico, planta, fecha_analisis, None, True)
+                            invalidar_tablas("historico", "graficos")
 
                             # Eliminar archivos locales asociados (si existen)
                             try:
@@ -1228,154 +1312,147 @@ with tab_historicos:
     st.markdown("## 🌿 Consulta de históricos")
 
     # 🔄 Conexión flexible (local o producción)
+    # Sin conexión propia de la pestaña: lecturas por la caché y cada escritura con _con_conexion
     mysql_password_hist = st.session_state.get("mysql_password", None)
-    conn = get_db_connection(mysql_password_hist)
-
-    if conn:
-        cursor = conn.cursor()
 
+    if estado_bd(mysql_password_hist)["ok"] is not False:
         # 🔍 Selección de planta
-        cursor.execute("SELECT DISTINCT planta FROM historico ORDER BY planta")
-        plantas_disponibles = [row[0] for row in cursor.fetchall()]
+        plantas_disponibles = listar_plantas_cache(mysql_password_hist, version_tablas("historico"))
 
         if not plantas_disponibles:
             st.info("ℹ️ Aún no hay plantas registradas en el histórico.")
-            cursor.close(); conn.close()
-            st.stop()
-
-        planta_sel = st.selectbox("🏭 Selecciona la planta", plantas_disponibles, key="select_planta_hist")
-
-        # 🔍 Selección de fecha
-        cursor.execute("SELECT DISTINCT fecha FROM historico WHERE planta = %s ORDER BY fecha DESC", (planta_sel,))
-        fechas_disponibles = [row[0] for row in cursor.fetchall()]
-
-        if not fechas_disponibles:
-            st.info(f"ℹ️ No hay registros para la planta '{planta_sel}'.")
-            cursor.close(); conn.close()
-            st.stop()
-
-        fecha_sel = st.selectbox("📅 Selecciona la fecha", fechas_disponibles, key="select_fecha_hist")
-
-        # 📥 Consulta de datos históricos
-        cursor.execute("""
-            SELECT * FROM historico
-            WHERE fecha = %s AND planta = %s
-        """, (fecha_sel, planta_sel))
-        historico_df = pd.DataFrame(cursor.fetchall(), columns=[col[0] for col in cursor.description])
-
-        # 🧾 KPI resumen
-        st.markdown("### 📊 Resumen general")
-        tarjeta_kpi("Mediciones guardadas", len(historico_df))
-
-        # 📄 Tabla resumen dentro de expander
-        with st.expander("🧾 Ver tabla de mediciones guardadas"):
-            st.markdown(
-                historico_df.style
-                .set_table_attributes("style='border-collapse:collapse; width:100%'")
-                .set_properties(**{
-                    "text-align": "center",
-                    "border": "1px solid #ddd",
-                    "padding": "8px"
-                })
-                .hide(axis="index")
-                .to_html(),
-                unsafe_allow_html=True
-            )
-
-        # 🗑️ Eliminación de mediciones
-        with st.expander("🗑️ Eliminar mediciones"):
-            st.markdown("### Selecciona las mediciones que deseas eliminar:")
-            seleccionados = []
-            for nombre in historico_df["nombre_medicion"].unique():
-                if st.checkbox(f"Eliminar: {nombre}"):
-                    seleccionados.append(nombre)
-
-            if seleccionados and st.button("❌ Eliminar seleccionados"):
-                for nombre in seleccionados:
-                    # Borra solo en el contexto actual (planta + fecha)
-                    cursor.execute(
-                        "DELETE FROM historico WHERE nombre_medicion = %s AND planta = %s AND fecha = %s",
-                        (nombre, planta_sel, fecha_sel)
+        else:
+            planta_sel = st.selectbox("🏭 Selecciona la planta", plantas_disponibles, key="select_planta_hist")
+
+            # 🔍 Selección de fecha
+            fechas_disponibles = listar_fechas_cache(mysql_password_hist, planta_sel, version_tablas("historico"))
+
+            if not fechas_disponibles:
+                st.info(f"ℹ️ No hay registros para la planta '{planta_sel}'.")
+            else:
+                fecha_sel = st.selectbox("📅 Selecciona la fecha", fechas_disponibles, key="select_fecha_hist")
+
+                # 📥 Consulta de datos históricos
+                historico_df = leer_historico_cache(mysql_password_hist, planta_sel, fecha_sel, version_tablas("historico"))
+
+                # 🧾 KPI resumen
+                st.markdown("### 📊 Resumen general")
+                tarjeta_kpi("Mediciones guardadas", len(historico_df))
+
+                # 📄 Tabla resumen dentro de expander
+                with st.expander("🧾 Ver tabla de mediciones guardadas"):
+                    st.markdown(
+                        historico_df.style
+                        .set_table_attributes("style='border-collapse:collapse; width:100%'")
+                        .set_properties(**{
+                            "text-align": "center",
+                            "border": "1px solid #ddd",
+                            "padding": "8px"
+                        })
+                        .hide(axis="index")
+                        .to_html(),
+                        unsafe_allow_html=True
                     )
-                    conn.commit()
 
-                    # Borrar archivos relacionados
-                    nombre_safe = re.sub(r'\W+', '_', nombre)
-                    planta_safe = re.sub(r'\W+', '_', planta_sel)
-                    fecha_str = fecha_sel.strftime("%Y%m%d")
-
-                    patrones = [
-                        f"{nombre_safe}_grafico_{planta_safe}_{fecha_str}.png",
-                        f"otros_{nombre_safe}_*.png",
-                    ]
-                    for patron in patrones:
-                        for archivo in Path(output_folder).glob(patron):
-                            archivo.unlink(missing_ok=True)
+                # 🗑️ Eliminación de mediciones
+                with st.expander("🗑️ Eliminar mediciones"):
+                    st.markdown("### Selecciona las mediciones que deseas eliminar:")
+                    seleccionados = []
+                    for nombre in historico_df["nombre_medicion"].unique():
+                        if st.checkbox(f"Eliminar: {nombre}"):
+                            seleccionados.append(nombre)
+
+                    if seleccionados and st.button("❌ Eliminar seleccionados"):
+                        # Borra solo en el contexto actual (planta + fecha)
+                        _con_conexion(mysql_password_hist, borrar_historico, planta_sel, fecha_sel, seleccionados)
+                        invalidar_tablas("historico")
+                        for nombre in seleccionados:
+                            # Borrar archivos relacionados
+                            nombre_safe = re.sub(r'\W+', '_', nombre)
+                            planta_safe = re.sub(r'\W+', '_', planta_sel)
+                            fecha_str = fecha_sel.strftime("%Y%m%d")
+
+                            patrones = [
+                                f"{nombre_safe}_grafico_{planta_safe}_{fecha_str}.png",
+                                f"otros_{nombre_safe}_*.png",
+                            ]
+                            for patron in patrones:
+                                for archivo in Path(output_folder).glob(patron):
+                                    archivo.unlink(missing_ok=True)
 
-                st.success("✅ Mediciones eliminadas del histórico y gráficos correspondientes removidos.")
-                st.experimental_rerun()
+                        st.success("✅ Mediciones eliminadas del histórico y gráficos correspondientes removidos.")
+                        st.experimental_rerun()
 
-        # 📊 Visualización de gráficos
+                # 📊 Visualización de gráficos
 
         
 
-        with st.expander("🖼️ Ver gráficos guardados"):
-            st.markdown("Selecciona los tipos de gráficos que deseas visualizar:")
-            # Leemos desde la BD (tabla graficos)
-            mysql_password_hist = st.session_state.get("mysql_password", None)
-
-            st.markdown("Selecciona los tipos de gráficos que deseas visualizar:")
-            ver_tiempo = st.checkbox("⏱️ Tiempo vs Diámetro", value=True)
-            ver_comparativos = st.checkbox("📈 Comparativos")
-            ver_otros = st.checkbox("📊 Otros")
-
-            if ver_tiempo:
-                st.markdown("#### ⏱️ Gráficos - Tiempo vs Diámetro")
-
-                for nombre in historico_df["nombre_medicion"].unique():
-                    rows = cargar_graficos_db(
-                        planta_sel, fecha_sel,
-                        tipo='tiempo_vs_diametro',
-                        nombre_medicion=nombre,           # ahora filtramos en SQL
-                        mysql_password=mysql_password_hist
-                    )
-
-                    if rows:
-                        with st.expander(f"🧪 {nombre}"):
-                            for nombre_archivo, formato, blob, _nombre_db, _tipo in rows:
-                                st.image(io.BytesIO(blob), caption=nombre_archivo, use_container_width=True)
+                with st.expander("🖼️ Ver gráficos guardados"):
+                    st.markdown("Selecciona los tipos de gráficos que deseas visualizar:")
+                    ver_tiempo = st.checkbox("⏱️ Tiempo vs Diámetro", value=True)
+                    ver_comparativos = st.checkbox("📈 Comparativos")
+                    ver_otros = st.checkbox("📊 Otros")
+
+                    # Metadatos de todos los gráficos de la planta+fecha en UNA consulta (sin BLOB);
+                    # luego, en otra, solo los BLOB que se van a mostrar
+                    graficos_meta = listar_graficos_cache(mysql_password_hist, planta_sel, fecha_sel,
+                                                          version_tablas("graficos"))
+                    tvd_por_medicion = {
+                        nombre: graficos_de_medicion(graficos_meta, nombre)
+                        for nombre in historico_df["nombre_medicion"].unique()
+                    } if ver_tiempo else {}
+                    vacio = graficos_meta.iloc[0:0]
+                    comparativos = graficos_meta[graficos_meta["tipo"] == "comparativo"] if ver_comparativos else vacio
+                    otros = graficos_meta[graficos_meta["tipo"] == "otros"] if ver_otros else vacio
+                    ids = {i for meta in (*tvd_por_medicion.values(), comparativos, otros) for i in meta["id"]}
+                    blobs = _con_conexion(mysql_password_hist, leer_blobs_graficos, ids)
+
+                    if ver_tiempo:
+                        st.markdown("#### ⏱️ Gráficos - Tiempo vs Diámetro")
+
+                        for nombre, meta in tvd_por_medicion.items():
+                            if not meta.empty:
+                                with st.expander(f"🧪 {nombre}"):
+                                    for id_graf, nombre_archivo in zip(meta["id"], meta["nombre_archivo"]):
+                                        st.image(io.BytesIO(blobs[id_graf]), caption=nombre_archivo, use_container_width=True)
+                            else:
+                                st.info(f"ℹ️ No encontré imagen de '{nombre}' para {planta_sel} - {fecha_sel}.")
+
+                    if ver_comparativos:
+                        st.markdown("#### 📈 Gráficos comparativos")
+                        for id_graf, nombre_archivo in zip(comparativos["id"], comparativos["nombre_archivo"]):
+                            with st.expander(f"📊 {nombre_archivo}"):
+                                img = Image.open(io.BytesIO(blobs[id_graf]))
+                                st.image(img, caption=nombre_archivo, use_column_width=True)
+
+                    if ver_otros:
+                        st.markdown("#### 📊 Otros gráficos")
+                        for id_graf, nombre_archivo in zip(otros["id"], otros["nombre_archivo"]):
+                            with st.expander(f"📌 {nombre_archivo}"):
+                                img = Image.open(io.BytesIO(blobs[id_graf]))
+                                st.image(img, caption=f"Otro gráfico - {nombre_archivo}", use_column_width=True)
+
+                # 📈 Análisis entre plantas y años (DuckDB sobre los espejos Parquet, sin consultar MySQL)
+                with st.expander("📈 Análisis entre plantas (T63 por dosis, mes y planta)"):
+                    if duckdb is None:
+                        st.info("ℹ️ Instala `duckdb` para habilitar el modo analítico.")
                     else:
-                        st.info(f"ℹ️ No encontré imagen de '{nombre}' para {planta_sel} - {fecha_sel}.")
-
-
-
-            if ver_comparativos:
-                st.markdown("#### 📈 Gráficos comparativos")
-                rows = cargar_graficos_db(
-                    planta_sel, fecha_sel,
-                    tipo='comparativo',
-                    mysql_password=mysql_password_hist
-                )
-                for nombre_archivo, formato, blob, _, _ in rows:
-                    with st.expander(f"📊 {nombre_archivo}"):
-                        img = Image.open(io.BytesIO(blob))
-                        st.image(img, caption=nombre_archivo, use_column_width=True)
-
-            if ver_otros:
-                st.markdown("#### 📊 Otros gráficos")
-                rows = cargar_graficos_db(
-                    planta_sel, fecha_sel,
-                    tipo='otros',
-                    mysql_password=mysql_password_hist
-                )
-                for nombre_archivo, formato, blob, nom_med, _ in rows:
-                    with st.expander(f"📌 {nombre_archivo}"):
-                        img = Image.open(io.BytesIO(blob))
-                        st.image(img, caption=f"Otro gráfico - {nombre_archivo}", use_column_width=True)
-
-
-        cursor.close()
-        conn.close()
+                        if st.button("🔄 Actualizar espejo analítico"):
+                            _con_conexion(mysql_password_hist, exportar_historico)
+                            st.success("✅ Espejo de `historico` actualizado.")
+                        try:
+                            solo_planta = st.checkbox(f"Solo {planta_sel}", key="analitica_solo_planta")
+                            filtro = planta_sel if solo_planta else None
+                            st.markdown("#### 🏭 Por planta")
+                            st.dataframe(t63_por_planta(), use_container_width=True, hide_index=True)
+                            st.markdown("#### 🧪 T63 por dosis")
+                            st.dataframe(t63_por_dosis(filtro), use_container_width=True, hide_index=True)
+                            st.markdown("#### 📅 T63 por mes")
+                            por_mes = t63_por_mes(filtro)
+                            if not por_mes.empty:
+                                st.line_chart(por_mes.pivot_table(index="mes", columns="planta", values="t63_media"))
+                        except Exception as e:
+                            st.info(f"ℹ️ Aún no hay espejo analítico: usa 'Actualizar espejo analítico' ({e}).")
     else:
         st.error("❌ No se pudo conectar a la base de datos. Verifica la configuración de conexión.")
     nav_buttons("💾 Guardar información", None)
@@ -1388,9 +1465,20 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
-# Cierre de conexión segura (por si algún cursor sigue activo)
-try:
-    if 'cursor' in locals(): cursor.close()
-    if 'conn' in locals(): conn.close()
-except:
-    pass
+# 🛠️ Consultas SQL de esta ejecución (instrumentacion_floccam), en el panel de la barra lateral
+if panel_consultas is not None:
+    registros = pd.DataFrame(ultimas_consultas(ETIQUETA_RERUN))
+    with panel_consultas.container():
+        with st.expander("🛠️ Consultas SQL (esta ejecución)", expanded=True):
+            if registros.empty:
+                st.caption("Sin consultas en esta ejecución.")
+            else:
+                st.caption(f"{len(registros)} consultas · {registros['ms'].sum():.0f} ms · "
+                           f"{registros['bytes'].sum() / 1024:.0f} KiB")
+                resumen_sql = (
+                    registros.groupby(["plantilla", "funcion"], as_index=False)
+                    .agg(n=("ms", "size"), ms_total=("ms", "sum"), ms_max=("ms", "max"),
+                         filas=("filas", "sum"), bytes=("bytes", "sum"))
+                    .sort_values("ms_total", ascending=False)
+                )
+                st.dataframe(resumen_sql, use_container_width=True, hide_index=True)
@@ -0,0 +1,264 @@
+"""
+Asesor de índices: EXPLAIN de cada consulta que emite la app contra una BD ya cargada.
+
+Uso:
+    py asesor_indices.py
+    py asesor_indices.py --password **** --analizar
+
+Las sentencias no se escriben a mano: se ejecutan las funciones de lectura y borrado del
+repositorio y de la ingesta sobre una conexión "en seco" que solo captura el SQL y sus
+parámetros (con valores de muestra tomados de la BD). Cada SELECT/DELETE capturado se
+pasa por EXPLAIN (MySQL; con --analizar, EXPLAIN ANALYZE para los SELECT) o EXPLAIN QUERY
+PLAN (SQLite). Se marcan los recorridos completos, los filesort y las tablas temporales,
+y se sugiere un índice (cubriente cuando se puede) si ninguno existente lo cubre.
+Las sugerencias son heurísticas: revisar antes de crearlas con una migración.
+"""
+import argparse
+import re
+
+from repositorio_floccam import (
+    conectar, listar_mediciones, leer_mediciones, cargar_arrays_medicion, listar_plantas, listar_fechas,
+    leer_historico, existe_historico, historico_por_dosis, borrar_historico, listar_graficos,
+    leer_blobs_graficos,
+)
+from ingesta_floccam import hashes_ingresados, borrar_mediciones, ids_ensayos
+
+# Columnas que no se pueden indexar completas (BLOB/TEXT): no se proponen como cubrientes
+COLUMNAS_NO_INDEXABLES = {"datos", "imagen_blob", "notas"}
+
+PALABRAS_SQL = {"and", "or", "not", "null", "is", "in", "like", "between"}
+
+
+class _CursorCaptura:
+    """Cursor que no ejecuta nada: guarda (sql, params) y devuelve resultados vacíos."""
+
+    description = ()
+    rowcount = 0
+
+    def __init__(self, capturas, funcion):
+        self._capturas = capturas
+        self._funcion = funcion
+
+    def execute(self, sql, params=()):
+        self._capturas.append((self._funcion, " ".join(sql.split()), tuple(params or ())))
+
+    def executemany(self, sql, filas):
+        pass  # inserciones: no hay nada que explicar
+
+    def fetchone(self):
+        return (0,)
+
+    def fetchmany(self, *_):
+        return []
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class _ConexionCaptura:
+    motor = "captura"
+
+    def __init__(self):
+        self.capturas = []
+        self.funcion = None
+
+    def cursor(self, *_, **__):
+        return _CursorCaptura(self.capturas, self.funcion)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def _muestras(conn):
+    """Valores reales para los parámetros (planta, fecha, medición); valores ficticios si faltan."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT planta, fecha FROM historico WHERE planta IS NOT NULL ORDER BY id DESC LIMIT 1")
+    fila = cursor.fetchone() or ("PLANTA", "2025-01-01")
+    cursor.execute("SELECT nombre_medicion FROM mediciones ORDER BY id DESC LIMIT 1")
+    medicion = (cursor.fetchone() or ("MEDICION_0_0",))[0]
+    cursor.close()
+    return {"planta": fila[0], "fecha": fila[1], "medicion": medicion, "sesion": "0" * 32}
+
+
+def capturar_consultas(muestras):
+    """[(funcion, sql, params)] de las consultas que emiten las lecturas y borrados de la app."""
+    m = muestras
+    llamadas = [
+        (listar_mediciones, (None,)),
+        (listar_mediciones, (m["sesion"], True)),
+        (leer_mediciones, (m["sesion"], True)),
+        (cargar_arrays_medicion, (m["medicion"], ("unix_time", "diameter"), m["sesion"], True)),
+        (listar_plantas, ()),
+        (listar_fechas, (m["planta"],)),
+        (leer_historico, (m["planta"], m["fecha"])),
+        (existe_historico, (m["planta"], m["fecha"])),
+        (historico_por_dosis, (m["planta"], 20.0, 0.03)),
+        (listar_graficos, (m["planta"], m["fecha"])),
+        (leer_blobs_graficos, ([1, 2, 3],)),
+        (hashes_ingresados, (["0" * 64], m["sesion"], True)),
+        (borrar_mediciones, ([m["medicion"]], m["sesion"], False)),
+        (borrar_historico, (m["planta"], m["fecha"], [m["medicion"]], True)),
+    ]
+    captura = _ConexionCaptura()
+    for funcion, args in llamadas:
+        captura.funcion = funcion.__name__
+        try:
+            funcion(captura, *args)
+        except Exception:
+            pass  # con resultados vacíos algunas funciones no terminan; su SQL ya quedó capturado
+    captura.funcion = "ids_ensayos"
+    ids_ensayos(captura.cursor(), [(m["medicion"], m["planta"], m["fecha"])])
+
+    vistas, unicas = set(), []
+    for funcion, sql, params in captura.capturas:
+        if sql.split()[0].upper() in ("SELECT", "DELETE") and (funcion, sql) not in vistas:
+            vistas.add((funcion, sql))
+            unicas.append((funcion, sql, params))
+    return unicas
+
+
+def indices_existentes(conn, tabla):
+    """[(columnas...)] de los índices de `tabla`, en orden."""
+    cursor = conn.cursor()
+    indices = {}
+    if getattr(conn, "motor", "mysql") == "sqlite":
+        cursor.execute(f"SELECT name FROM pragma_index_list('{tabla}')")
+        for (nombre,) in cursor.fetchall():
+            cursor.execute(f"SELECT name FROM pragma_index_info('{nombre}') ORDER BY seqno")
+            indices[nombre] = [fila[0] for fila in cursor.fetchall()]
+        cursor.execute(f"SELECT name FROM pragma_table_info('{tabla}') WHERE pk > 0 ORDER BY pk")
+        indices["PRIMARY"] = [fila[0] for fila in cursor.fetchall()]
+    else:
+        cursor.execute(f"SHOW INDEX FROM {tabla}")
+        columnas = [c[0] for c in cursor.description]
+        for fila in cursor.fetchall():
+            fila = dict(zip(columnas, fila))
+            indices.setdefault(fila["Key_name"], []).append(fila["Column_name"])
+    cursor.close()
+    return [tuple(c) for c in indices.values() if c]
+
+
+def explicar(conn, sql, params, analizar=False):
+    """
+    Plan de `sql`: (filas del plan como texto, problemas detectados).
+    Problemas: 'recorrido completo', 'recorrido de índice completo', 'filesort', 'tabla temporal'.
+    """
+    cursor = conn.cursor()
+    problemas, plan = [], []
+    if getattr(conn, "motor", "mysql") == "sqlite":
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        for fila in cursor.fetchall():
+            detalle = fila[-1]
+            plan.append(detalle)
+            if re.match(r"SCAN \w+$", detalle):
+                problemas.append(f"recorrido completo ({detalle})")
+            elif detalle.startswith("SCAN ") and "COVERING" not in detalle:
+                problemas.append(f"recorrido de índice completo ({detalle})")
+            if "TEMP B-TREE" in detalle:
+                problemas.append(f"filesort / tabla temporal ({detalle})")
+    else:
+        cursor.execute(f"EXPLAIN {sql}", params)
+        columnas = [c[0] for c in cursor.description]
+        for fila in cursor.fetchall():
+            fila = dict(zip(columnas, fila))
+            extra = fila.get("Extra") or ""
+            plan.append(f"{fila['table']}: type={fila['type']} key={fila['key']} rows={fila['rows']} {extra}".strip())
+            if fila["type"] == "ALL":
+                problemas.append(f"recorrido completo de {fila['table']} (~{fila['rows']} filas)")
+            elif fila["type"] == "index":
+                problemas.append(f"recorrido de índice completo de {fila['table']}")
+            if "filesort" in extra:
+                problemas.append(f"filesort en {fila['table']}")
+            if "temporary" in extra:
+                problemas.append(f"tabla temporal en {fila['table']}")
+        if analizar and sql.upper().startswith("SELECT"):
+            cursor.execute(f"EXPLAIN ANALYZE {sql}", params)
+            plan += [linea for (texto,) in cursor.fetchall() for linea in texto.splitlines()]
+    cursor.close()
+    return plan, problemas
+
+
+def sugerir_indice(sql):
+    """
+    (tabla, columnas) de un índice para una consulta de UNA tabla: igualdades del WHERE,
+    luego ORDER BY, luego rangos y, si caben, las columnas leídas (índice cubriente).
+    None si la consulta tiene JOIN o no filtra ni ordena.
+    """
+    if re.search(r"\bJOIN\b", sql, re.I):
+        return None
+    tabla = re.search(r"\bFROM\s+(\w+)", sql, re.I).group(1)
+    where = re.search(r"\bWHERE\s+(.*?)(?:\bORDER BY\b|\bGROUP BY\b|\bLIMIT\b|$)", sql, re.I)
+    igualdad, rango = [], []
+    for col, op in re.findall(r"(?:\w+\.)?(\w+)\s*(<=>|<=|>=|=|<|>|\bIN\b|\bIS\b|\bLIKE\b)", where.group(1) if where else "", re.I):
+        if col.lower() in PALABRAS_SQL:
+            continue
+        (igualdad if op.upper() in ("=", "<=>", "IN", "IS") else rango).append(col)
+    orden_sql = re.search(r"\bORDER BY\s+(.*?)(?:\bLIMIT\b|$)", sql, re.I)
+    orden = [re.sub(r"\s+(ASC|DESC)$", "", c.strip(), flags=re.I).split(".")[-1]
+             for c in orden_sql.group(1).split(",")] if orden_sql else []
+    seleccion = re.match(r"SELECT\s+(?:DISTINCT\s+)?(.*?)\s+FROM\b", sql, re.I)
+    leidas = [] if not seleccion or "*" in seleccion.group(1) or "(" in seleccion.group(1) else \
+        [c.strip().split(".")[-1] for c in seleccion.group(1).split(",")]
+
+    columnas = list(dict.fromkeys(igualdad + orden + rango))
+    if not columnas:
+        return None
+    if leidas and not COLUMNAS_NO_INDEXABLES & set(leidas) and "id" not in leidas:
+        columnas = list(dict.fromkeys(columnas + leidas))
+    return tabla, [c for c in columnas if c not in COLUMNAS_NO_INDEXABLES]
+
+
+def _cubierto(columnas, existentes):
+    """¿Algún índice existente empieza por las columnas de filtro/orden sugeridas?"""
+    return any(tuple(indice[:len(columnas)]) == tuple(columnas) for indice in existentes)
+
+
+def analizar_consultas(conn, analizar=False):
+    """Informe por consulta: [{funcion, sql, plan, problemas, sugerencia}]."""
+    informe = []
+    for funcion, sql, params in capturar_consultas(_muestras(conn)):
+        partes = re.split(r"\bUNION\b", sql, flags=re.I)
+        try:
+            plan, problemas = explicar(conn, sql, params, analizar)
+        except Exception as e:
+            plan, problemas = [f"EXPLAIN falló: {e}"], []
+        sugerencias = []
+        if problemas:
+            for parte in partes:
+                sugerida = sugerir_indice(parte.strip())
+                if sugerida and sugerida[1] and not _cubierto(sugerida[1], indices_existentes(conn, sugerida[0])):
+                    tabla, columnas = sugerida
+                    nombre = f"idx_{tabla}_{'_'.join(columnas)}"[:64]
+                    sugerencias.append(f"CREATE INDEX {nombre} ON {tabla} ({', '.join(columnas)})")
+        informe.append({"funcion": funcion, "sql": sql, "plan": plan, "problemas": problemas,
+                        "sugerencias": sugerencias})
+    return informe
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN de las consultas de la app y sugerencias de índices.")
+    parser.add_argument("--password", default=None, help="Contraseña MySQL local (o MYSQL_PASSWORD)")
+    parser.add_argument("--analizar", action="store_true", help="Además EXPLAIN ANALYZE de los SELECT (MySQL, los ejecuta)")
+    args = parser.parse_args()
+
+    conn = conectar(args.password)
+    informe = analizar_consultas(conn, args.analizar)
+    conn.close()
+
+    for item in informe:
+        estado = "⚠️" if item["problemas"] else "✅"
+        print(f"\n{estado} [{item['funcion']}] {item['sql']}")
+        for linea in item["plan"]:
+            print(f"     plan: {linea}")
+        for problema in item["problemas"]:
+            print(f"     ❗ {problema}")
+        for sugerencia in item["sugerencias"]:
+            print(f"     💡 {sugerencia};")
+    con_problemas = sum(1 for item in informe if item["problemas"])
+    print(f"\n{len(informe)} consultas analizadas, {con_problemas} con recorridos completos o filesort.")
@@ -0,0 +1,161 @@
+"""
+Cálculo de T₆₃ / ΔD de Floccam Analyzer, vectorizado sobre todas las mediciones a la vez.
+
+Las curvas se manejan como arrays planos (todas las muestras seguidas, ordenadas por
+medición y unix_time) más `offsets`: la medición i ocupa [offsets[i], offsets[i + 1]).
+Así Di, Df, ΔD, D(T), el objetivo del 63 % y T₆₃ de una campaña completa salen de unas
+pocas operaciones de numpy, sin groupby ni bucles por medición.
+
+    curvas = agrupar_curvas(df_total["nombre_medicion"], df_total["unix_time"], df_total["diameter"])
+    df_resumen = resumen_t63(curvas, df_final)
+"""
+import numpy as np
+import pandas as pd
+
+FRACCION_T63 = 0.63
+
+# Detección automática de Df (ver detectar_df): muestras por ventana de suavizado, cambio
+# admitido entre ventanas contiguas y nivel mínimo de la meseta (ambos como fracción de Df − Di)
+VENTANA_MESETA = 5
+TOLERANCIA_MESETA = 0.02
+NIVEL_MESETA = 0.95
+
+COLUMNAS_RESUMEN = ["nombre_medicion", "Di (mm)", "Df (mm)", "ΔD (mm)", "D(T) (mm)", "T_63 (s)"]
+
+
+def agrupar_curvas(nombres, unix_time, diameter):
+    """
+    Ordena las muestras por (medición, unix_time) y devuelve un dict con:
+        nombres   -> nombre de cada medición (orden alfabético)
+        offsets   -> inicio de cada medición en los arrays planos (+ el total al final)
+        tiempo    -> segundos desde la primera muestra de su medición
+        diameter  -> diámetro de cada muestra
+    """
+    unix_time = np.asarray(unix_time, dtype=float)
+    diameter = np.asarray(diameter, dtype=float)
+    grupo, claves = pd.factorize(np.asarray(nombres, dtype=object), sort=True)
+    orden = np.lexsort((unix_time, grupo))
+    grupo, unix_time, diameter = grupo[orden], unix_time[orden], diameter[orden]
+
+    offsets = np.zeros(len(claves) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(grupo, minlength=len(claves)), out=offsets[1:])
+    inicio = unix_time[offsets[:-1]] if len(unix_time) else unix_time
+    tiempo = unix_time - np.repeat(inicio, np.diff(offsets))
+    return {"nombres": claves.tolist(), "offsets": offsets, "tiempo": tiempo, "diameter": diameter}
+
+
+def curva(curvas, i):
+    """(tiempo, diámetro) de la medición i (vistas, sin copia)."""
+    a, b = curvas["offsets"][i], curvas["offsets"][i + 1]
+    return curvas["tiempo"][a:b], curvas["diameter"][a:b]
+
+
+def _primer_diametro(diam, offsets):
+    """Primer diámetro válido (no NaN) de cada medición; NaN si no tiene ninguno."""
+    k = np.where(np.isnan(diam), len(diam), np.arange(len(diam)))
+    primero = np.minimum.reduceat(k, offsets[:-1])
+    return np.where(primero < offsets[1:], diam[np.minimum(primero, len(diam) - 1)], np.nan)
+
+
+def calcular_t63(curvas, df_final, fraccion=FRACCION_T63):
+    """
+    Di, Df, ΔD, D(T) (diámetro máximo), objetivo (Di + fraccion·ΔD) y T₆₃ de todas las
+    mediciones en una pasada. `df_final` es un escalar o un valor por medición; con Df NaN,
+    el objetivo y T₆₃ quedan NaN. T₆₃ es el tiempo de la muestra más cercana al objetivo
+    (la primera si hay empate, como argmin). Devuelve un dict de arrays, uno por medición.
+    """
+    offsets, tiempo, diam = curvas["offsets"], curvas["tiempo"], curvas["diameter"]
+    inicios, largos = offsets[:-1], np.diff(offsets)
+    n = len(inicios)
+    df_final = np.broadcast_to(np.asarray(df_final, dtype=float), (n,))
+    if n == 0:
+        vacio = np.empty(0)
+        return {"di": vacio, "df": vacio, "delta_d": vacio, "dt": vacio, "objetivo": vacio,
+                "t63": vacio, "idx_t63": np.empty(0, dtype=np.int64)}
+
+    di = _primer_diametro(diam, offsets)
+    delta_d = df_final - di
+    objetivo = di + fraccion * delta_d
+    dt = np.fmax.reduceat(diam, inicios)  # muestras NaN: se ignoran
+
+    # argmin por medición: ordenar por (medición, distancia) y quedarse con el primero de cada una
+    grupo = np.repeat(np.arange(n), largos)
+    distancia = np.abs(diam - np.repeat(objetivo, largos))
+    idx_t63 = np.lexsort((distancia, grupo))[inicios]
+    t63 = np.where(np.isnan(objetivo), np.nan, tiempo[idx_t63])
+    return {"di": di, "df": df_final.copy(), "delta_d": delta_d, "dt": dt, "objetivo": objetivo,
+            "t63": t63, "idx_t63": idx_t63}
+
+
+def detectar_df(curvas, ventana=VENTANA_MESETA, tolerancia=TOLERANCIA_MESETA, nivel=NIVEL_MESETA):
+    """
+    Df automático de todas las mediciones en una pasada (sin bucles por curva).
+
+    La curva se suaviza con la media móvil de `ventana` muestras (sumas acumuladas; ventanas
+    más cortas si la curva tiene menos muestras) y Df es el máximo de la curva suavizada:
+    el nivel de la meseta, o el pico si después hay rotura de flóculos.
+    La meseta empieza en la primera ventana que ya alcanzó `nivel` de la amplitud (Df − Di)
+    y cuya media difiere de la de la ventana siguiente (derivada suavizada) en no más de
+    `tolerancia` de la amplitud. Si ninguna cumple, la curva no llegó a estabilizarse y Df
+    queda en el máximo alcanzado: `estable` lo marca para revisar (o corregir a mano).
+
+    Devuelve un dict de arrays, uno por medición:
+        df            -> Df detectado
+        inicio_meseta -> índice (en los arrays planos) de la primera muestra de la meseta
+                         (la de Df si no hay meseta)
+        estable       -> si se encontró meseta
+    """
+    offsets, diam = curvas["offsets"], curvas["diameter"]
+    inicios, largos = offsets[:-1], np.diff(offsets)
+    n = len(inicios)
+    if n == 0:
+        return {"df": np.empty(0), "inicio_meseta": np.empty(0, dtype=np.int64), "estable": np.empty(0, dtype=bool)}
+
+    grupo = np.repeat(np.arange(n), largos)
+    k = np.arange(len(diam))
+    w = np.minimum(ventana, largos)[grupo]
+    limite = np.repeat(offsets[1:], largos)
+    # sumas acumuladas que ignoran los NaN, más la cuenta de muestras válidas: un NaN solo
+    # saca su muestra de las ventanas que la contienen, sin afectar al resto de curvas
+    validos = ~np.isnan(diam)
+    suma = np.concatenate(([0.0], np.cumsum(np.where(validos, diam, 0.0))))
+    cuenta = np.concatenate(([0], np.cumsum(validos)))
+
+    def media_desde(desde):
+        """Media de la ventana [desde, desde + w) de cada muestra; NaN si se sale de su curva o no tiene datos."""
+        fin = desde + w
+        valida = fin <= limite
+        fin, desde = np.where(valida, fin, 1), np.where(valida, desde, 0)
+        muestras = cuenta[fin] - cuenta[desde]
+        valida &= muestras > 0
+        return np.where(valida, (suma[fin] - suma[desde]) / np.maximum(muestras, 1), np.nan)
+
+    media = media_desde(k)
+    siguiente = media_desde(k + w)  # ventana contigua: la diferencia es la derivada suavizada
+
+    df_auto = np.fmax.reduceat(media, inicios)  # NaN solo si la curva no tiene ningún dato
+    di = _primer_diametro(diam, offsets)
+    amplitud = np.repeat(df_auto - di, largos)
+    meseta = (media >= np.repeat(di, largos) + nivel * amplitud) & (np.abs(siguiente - media) <= tolerancia * amplitud)
+
+    # primera ventana de meseta por medición; si no hay, la del máximo
+    primera = np.minimum.reduceat(np.where(meseta, k, len(diam)), inicios)
+    estable = primera < offsets[1:]
+    pico = np.lexsort((-np.nan_to_num(media, nan=-np.inf), grupo))[inicios]
+    return {"df": df_auto, "inicio_meseta": np.where(estable, primera, pico), "estable": estable}
+
+
+def resumen_t63(curvas, df_final=None, fraccion=FRACCION_T63, calculo=None):
+    """
+    Tabla resumen (COLUMNAS_RESUMEN), una fila por medición, lista para mostrar o guardar.
+    Si ya se tiene el resultado de calcular_t63, pasarlo en `calculo` evita recalcular.
+    """
+    calculo = calculo if calculo is not None else calcular_t63(curvas, df_final, fraccion)
+    return pd.DataFrame({
+        "nombre_medicion": curvas["nombres"],
+        "Di (mm)": calculo["di"],
+        "Df (mm)": calculo["df"],
+        "ΔD (mm)": calculo["delta_d"],
+        "D(T) (mm)": calculo["dt"],
+        "T_63 (s)": calculo["t63"],
+    }, columns=COLUMNAS_RESUMEN)
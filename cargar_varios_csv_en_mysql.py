@@ -1,100 +1,50 @@
-import pandas as pd
-import mysql.connector
+import argparse
 import os
 
-# 🟡 Paso 1: Solicita datos al usuario
-password = input("🔐 Ingresa tu contraseña de MySQL:\n")
-rutas_input = input("📂 Ingresa las rutas completas de los archivos CSV que deseas cargar, separados por coma:\n")
+from ingesta_floccam import iterar_entradas, ingerir_entradas
+from migraciones_floccam import migrar
+from repositorio_floccam import conectar
 
-# Limpia las rutas y separa los archivos
-rutas_archivos = [ruta.strip().strip('"') for ruta in rutas_input.split(',')]
+parser = argparse.ArgumentParser(description="Carga CSV (o ZIP de CSV) del Floccam en la tabla mediciones.")
+parser.add_argument("rutas", nargs="*", help="Rutas de los archivos (si no se dan, se piden por consola)")
+parser.add_argument("--password", default=None, help="Contraseña MySQL local (o MYSQL_PASSWORD)")
+args = parser.parse_args()
 
-# 🟡 Paso 2: Conecta a la base de datos
+# 🟡 Paso 1: Solicita las rutas al usuario si no vinieron como argumentos
+if args.rutas:
+    rutas_archivos = args.rutas
+else:
+    rutas_input = input("📂 Ingresa las rutas completas de los archivos CSV que deseas cargar, separados por coma:\n")
+    # Limpia las rutas y separa los archivos
+    rutas_archivos = [ruta.strip().strip('"') for ruta in rutas_input.split(',')]
+
+# 🟡 Paso 2: Conecta a la base de datos (secrets.toml, SQLite o localhost, ver repositorio_floccam.conectar)
 try:
-    conn = mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password=password,
-        database="mediciones_db"
-    )
-    cursor = conn.cursor()
+    conn = conectar(args.password)
+    migrar(conn)
 except Exception as e:
-    print(f"❌ Error al conectar a MySQL: {e}")
+    print(f"❌ Error al conectar a la base de datos: {e}")
     exit()
 
-# ✅ Columnas esperadas para la tabla `medicion_temp`
-columnas_medicion_temp = [
-    'ascii_time', 'excel_time', 'unix_time', 'diameter', 'number',
-    'mass_fraction', 'skew1', 'skew2', 'skew3', 'fractal_dimension',
-    'sphericity', 'clarity', 'brightness', 'sizea', 'sizev',
-    'size01', 'size02', 'size03', 'dividersize',
-    'aveaspectv', 'avewidthv', 'avelengthv', 'largestfloc'
-]
-
-# ✅ Columnas para insertar en la tabla `mediciones` (12 + nombre_medicion)
-columnas_mediciones = [
-    'nombre_medicion', 'unix_time', 'diameter', 'number',
-    'mass_fraction', 'skew1', 'skew2', 'skew3', 'fractal_dimension',
-    'sphericity', 'clarity', 'largestfloc'
-]
-
-# 🟢 Paso 3: Procesa cada archivo CSV
-for ruta_csv in rutas_archivos:
+# 🟢 Paso 3: Procesa cada archivo CSV (los ZIP se recorren miembro a miembro, sin extraer)
+for ruta in rutas_archivos:
+    if not os.path.isfile(ruta):
+        print(f"❌ El archivo {ruta} no existe.")
+        continue
     try:
-        if not os.path.isfile(ruta_csv):
-            print(f"❌ El archivo {ruta_csv} no existe.")
-            continue
-
-        # 🟢 3.1. Carga el CSV con normalización de columnas
-        df = pd.read_csv(ruta_csv)
-        df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
-
-        # 🟢 3.2. Verifica que tenga todas las columnas requeridas para `medicion_temp`
-        if not all(col in df.columns for col in columnas_medicion_temp):
-            print(f"❌ El archivo {os.path.basename(ruta_csv)} no contiene todas las columnas requeridas.")
-            continue
-
-        # 🟢 3.3. Inserta los datos en la tabla `medicion_temp`
-        cursor.execute("DELETE FROM medicion_temp")
-        conn.commit()
-
-        columnas_str = ', '.join(columnas_medicion_temp)
-        placeholders = ', '.join(['%s'] * len(columnas_medicion_temp))
-
-        insert_temp_sql = f"INSERT INTO medicion_temp ({columnas_str}) VALUES ({placeholders})"
-        valores = df[columnas_medicion_temp].values.tolist()
-
-        cursor.executemany(insert_temp_sql, valores)
-        conn.commit()
-
-        # 🟢 3.4. Inserta desde `medicion_temp` a `mediciones`, usando el nombre del archivo como nombre_medicion
-        nombre_medicion = os.path.splitext(os.path.basename(ruta_csv))[0]
-
-        insert_mediciones_sql = f"""
-            INSERT INTO mediciones (
-                nombre_medicion, unix_time, diameter, number,
-                mass_fraction, skew1, skew2, skew3, fractal_dimension,
-                sphericity, clarity, largestfloc
-            )
-            SELECT
-                %s, unix_time, diameter, number,
-                mass_fraction, skew1, skew2, skew3, fractal_dimension,
-                sphericity, clarity, largestfloc
-            FROM medicion_temp
-        """
-        cursor.execute(insert_mediciones_sql, (nombre_medicion,))
-        conn.commit()
-
-        # 🟢 3.5. Limpia la tabla `medicion_temp`
-        cursor.execute("DELETE FROM medicion_temp")
-        conn.commit()
-
-        print(f"✅ Datos insertados exitosamente desde: {ruta_csv}")
-
+        # Manifiesto por hash (omite lo ya cargado), validación de columnas e inserción
+        # directa en `mediciones` (multi-fila, una transacción por archivo)
+        for nombre_archivo, estado, detalle in ingerir_entradas(conn, iterar_entradas([ruta])):
+            if estado == "cargado":
+                print(f"✅ Datos insertados exitosamente desde: {nombre_archivo} "
+                      f"({detalle['filas']} filas, {detalle['filas_cuarentena']} en cuarentena)")
+            elif estado == "omitido":
+                print(f"⏭️ {nombre_archivo} ya estaba cargado, se omite.")
+            else:
+                print(f"❌ {detalle}")
     except Exception as e:
-        print(f"❌ Error al insertar los datos desde {ruta_csv}: {e}")
+        print(f"❌ Error al insertar los datos desde {ruta}: {e}")
 
 # 🟢 Paso 4: Cierra la conexión
-cursor.close()
 conn.close()
 print("✅ Todos los archivos fueron procesados.")
@@ -1,21 +1,13 @@
 import pandas as pd
 import matplotlib.pyplot as plt
-import re
+
+from ingesta_floccam import columnas_dosis
 
 # Leer archivo de resumen
 df = pd.read_csv("resumen_mediciones.csv")
 
-# Función para extraer las dosis desde el nombre de la medición
-def extraer_dosis(nombre):
-    match = re.search(r"_(\d+)_([\d.]+)$", nombre)
-    if match:
-        return int(match.group(1)), float(match.group(2))
-    return None, None
-
-# Aplicar extracción de dosis
-df[['dosis_coagulante', 'dosis_floculante']] = df['nombre_medicion'].apply(
-    lambda x: pd.Series(extraer_dosis(x))
-)
+# Extracción de dosis desde el nombre de la medición (mismo criterio que la app)
+df[['dosis_coagulante', 'dosis_floculante']] = columnas_dosis(df['nombre_medicion'])
 
 # --- GRÁFICO 1: COAGULANTE VS T63 (cuando floculante = 0) ---
 df_coag = df[df['dosis_floculante'] == 0]
@@ -0,0 +1,1033 @@
+import contextlib
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (motor de lectura CSV más rápido, opcional)
+    MOTOR_CSV = "pyarrow"
+except ImportError:
+    MOTOR_CSV = "c"
+
+# ===== Ingesta de CSV Floccam hacia la tabla `mediciones` =====
+# Compartido por app_final2.py y cargar_varios_csv_en_mysql.py.
+# Cada archivo queda registrado por hash en `manifiesto_ingesta` para no cargarlo dos veces.
+
+# Columnas que exporta el Floccam (mismo orden que la tabla `medicion_temp`)
+columnas_medicion_temp = [
+    'ascii_time', 'excel_time', 'unix_time', 'diameter', 'number',
+    'mass_fraction', 'skew1', 'skew2', 'skew3', 'fractal_dimension',
+    'sphericity', 'clarity', 'brightness', 'sizea', 'sizev',
+    'size01', 'size02', 'size03', 'dividersize',
+    'aveaspectv', 'avewidthv', 'avelengthv', 'largestfloc'
+]
+
+# Columnas de la tabla `mediciones` (12 + nombre_medicion)
+columnas_mediciones = [
+    'nombre_medicion', 'unix_time', 'diameter', 'number',
+    'mass_fraction', 'skew1', 'skew2', 'skew3', 'fractal_dimension',
+    'sphericity', 'clarity', 'largestfloc'
+]
+
+# Tipos fijos para las columnas del Floccam: sin inferencia de pandas.
+# ascii_time / excel_time se leen como texto y luego se convierten a timestamps.
+COLUMNAS_TIEMPO = ('ascii_time', 'excel_time')
+DTYPES_FLOCCAM = {col: "float64" for col in columnas_medicion_temp if col not in COLUMNAS_TIEMPO}
+DTYPES_FLOCCAM.update({col: str for col in COLUMNAS_TIEMPO})
+
+# Origen de las fechas seriales de Excel (sistema 1900)
+ORIGEN_EXCEL = "1899-12-30"
+
+# Manifiesto de ingesta: un registro por CSV cargado, identificado por el hash de su contenido.
+# sesion_id NULL = carga compartida (scripts / datos previos); si no, la sesión de la app que lo cargó.
+DDL_MANIFIESTO = """
+CREATE TABLE IF NOT EXISTS manifiesto_ingesta (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  hash_contenido CHAR(64) NOT NULL,
+  sesion_id VARCHAR(32) DEFAULT NULL,
+  nombre_medicion VARCHAR(255) NOT NULL,
+  filas INT NOT NULL,
+  filas_cuarentena INT DEFAULT 0,
+  ratio_nan DOUBLE DEFAULT NULL,
+  intervalo_s DOUBLE DEFAULT NULL,
+  duracion_s DOUBLE DEFAULT NULL,
+  ingresado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_manifiesto_hash (hash_contenido, sesion_id),
+  INDEX idx_manifiesto_nombre (nombre_medicion)
+);
+"""
+
+# Estadísticas de calidad por archivo en el manifiesto (se agregan si la tabla ya existía)
+COLUMNAS_CALIDAD_MANIFIESTO = {
+    "filas_cuarentena": "INT DEFAULT 0",
+    "ratio_nan": "DOUBLE DEFAULT NULL",
+    "intervalo_s": "DOUBLE DEFAULT NULL",
+    "duracion_s": "DOUBLE DEFAULT NULL",
+}
+
+# Cuarentena: filas descartadas por la validación de ingesta, con el motivo y la fila original (JSON)
+DDL_CUARENTENA = """
+CREATE TABLE IF NOT EXISTS cuarentena_mediciones (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  nombre_medicion VARCHAR(255) NOT NULL,
+  sesion_id VARCHAR(32) DEFAULT NULL,
+  hash_contenido CHAR(64) DEFAULT NULL,
+  fila INT NOT NULL,
+  motivo VARCHAR(20) NOT NULL,
+  datos TEXT,
+  creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_cuarentena_sesion (sesion_id, nombre_medicion)
+);
+"""
+
+# Variables de tamaño/conteo que no pueden ser negativas
+COLUMNAS_NO_NEGATIVAS = [
+    'diameter', 'number', 'mass_fraction', 'largestfloc', 'sizea', 'sizev',
+    'size01', 'size02', 'size03', 'dividersize', 'aveaspectv', 'avewidthv', 'avelengthv',
+]
+
+# Checkpoint de archivos grandes: se confirma por bloque, en la misma transacción que sus
+# filas, para retomar desde el último bloque confirmado tras un corte. sesion_id '' = compartido.
+DDL_CHECKPOINT = """
+CREATE TABLE IF NOT EXISTS checkpoint_ingesta (
+  hash_contenido CHAR(64) NOT NULL,
+  sesion_id VARCHAR(32) NOT NULL DEFAULT '',
+  nombre_medicion VARCHAR(255) NOT NULL,
+  offset_bytes BIGINT NOT NULL,
+  bloques INT NOT NULL,
+  filas INT NOT NULL,
+  filas_cuarentena INT NOT NULL,
+  celdas BIGINT NOT NULL,
+  celdas_nan BIGINT NOT NULL,
+  unix_inicio DOUBLE DEFAULT NULL,
+  unix_ultimo DOUBLE DEFAULT NULL,
+  actualizado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (hash_contenido, sesion_id)
+);
+"""
+
+# Almacén compacto: una fila por medición con las 23 columnas del Floccam empaquetadas
+# como arreglos numpy (.npz comprimido). Alternativa a una fila por muestra en `mediciones`.
+DDL_MEDICIONES_COMPACTAS = """
+CREATE TABLE IF NOT EXISTS mediciones_compactas (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  nombre_medicion VARCHAR(255) NOT NULL,
+  sesion_id VARCHAR(32) DEFAULT NULL,
+  filas INT NOT NULL,
+  datos LONGBLOB NOT NULL,
+  creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_compactas_sesion (sesion_id, nombre_medicion)
+);
+"""
+
+# Formato de escritura de la ingesta: "filas" (tabla `mediciones`) o "compacto" (`mediciones_compactas`)
+FORMATO_ALMACEN = os.environ.get("FLOCCAM_ALMACEN", "filas")
+
+# Filas por sentencia INSERT multi-fila (mantiene cada paquete muy por debajo de max_allowed_packet)
+TAMANO_LOTE = 1000
+
+# Archivos de más de UMBRAL_ARCHIVO_GRANDE bytes se cargan por bloques de FILAS_POR_BLOQUE filas
+UMBRAL_ARCHIVO_GRANDE = 32 * 1024 * 1024
+FILAS_POR_BLOQUE = 50_000
+# Un checkpoint de OTRA sesión sin avances en este tiempo se considera abandonado (navegador
+# cerrado o recargado a mitad de carga) y la sesión que vuelve a subir el archivo lo adopta
+CHECKPOINT_ABANDONADO_S = 120
+
+
+def normalizar_nombre(col):
+    """Normaliza un nombre de columna: minúsculas y separadores como '_'."""
+    return re.sub(r'\W+', '_', col.strip().lower())
+
+
+def normalizar_columnas(df):
+    """Normaliza todos los nombres de columnas del DataFrame."""
+    df.columns = [normalizar_nombre(col) for col in df.columns]
+    return df
+
+
+def _convertir_tiempos(df):
+    """Convierte ascii_time y excel_time a datetime64 de forma vectorizada."""
+    if 'ascii_time' in df.columns:
+        df['ascii_time'] = pd.to_datetime(df['ascii_time'], errors="coerce")
+    if 'excel_time' in df.columns:
+        serial = pd.to_numeric(df['excel_time'], errors="coerce")
+        if serial.notna().any():
+            df['excel_time'] = pd.to_datetime(serial, unit="D", origin=ORIGEN_EXCEL)
+        else:
+            df['excel_time'] = pd.to_datetime(df['excel_time'], errors="coerce")
+    return df
+
+
+def leer_csv_floccam(contenido):
+    """
+    Lee un CSV Floccam directamente desde sus bytes (sin decodificar el archivo a str).
+    - Solo se decodifica la línea de encabezado, para mapear nombres crudos -> normalizados.
+    - Aplica DTYPES_FLOCCAM (sin inferencia) y usa pyarrow si está instalado.
+    Devuelve el DataFrame con columnas ya normalizadas.
+    """
+    fin_encabezado = contenido.find(b"\n")
+    encabezado = contenido if fin_encabezado < 0 else contenido[:fin_encabezado]
+    crudas = next(csv.reader([encabezado.decode("utf-8-sig").strip()]), [])
+    dtypes = {
+        cruda: DTYPES_FLOCCAM[normalizar_nombre(cruda)]
+        for cruda in crudas if normalizar_nombre(cruda) in DTYPES_FLOCCAM
+    }
+
+    df = pd.read_csv(io.BytesIO(contenido), dtype=dtypes, engine=MOTOR_CSV, encoding="utf-8-sig")
+    normalizar_columnas(df)
+    if 'number' in df.columns:
+        df['number'] = df['number'].round().astype("Int64")
+    return _convertir_tiempos(df)
+
+
+def leer_incremento_csv(ruta, estado):
+    """
+    Lee solo lo que se agregó a un CSV en crecimiento desde la llamada anterior.
+    `estado` es un dict (p. ej. en st.session_state) con el 'offset' en bytes y el
+    'encabezado'; se actualiza en el lugar. Solo se consumen líneas completas, así que
+    una fila a medio escribir se lee en la siguiente llamada.
+    Devuelve un DataFrame con las filas nuevas (vacío si no hay).
+    """
+    with open(ruta, "rb") as f:
+        tamano = f.seek(0, os.SEEK_END)
+        if tamano < estado.get("offset", 0):
+            # Archivo truncado o reemplazado: se empieza de nuevo
+            estado.clear()
+        offset = estado.get("offset", 0)
+        f.seek(offset)
+        bloque = f.read(tamano - offset)
+
+    fin = bloque.rfind(b"\n")
+    if fin < 0:
+        return pd.DataFrame()
+    bloque = bloque[:fin + 1]
+    estado["offset"] = offset + len(bloque)
+
+    if "encabezado" not in estado:
+        fin_encabezado = bloque.find(b"\n")
+        estado["encabezado"] = bloque[:fin_encabezado + 1]
+        bloque = bloque[fin_encabezado + 1:]
+    if not bloque.strip():
+        return pd.DataFrame()
+    return leer_csv_floccam(estado["encabezado"] + bloque)
+
+
+def columnas_faltantes(df):
+    """Devuelve las columnas de `medicion_temp` que no están en el DataFrame."""
+    return [col for col in columnas_medicion_temp if col not in df.columns]
+
+
+def hash_contenido(contenido):
+    """SHA-256 (hex) de los bytes de un CSV; identifica el archivo en `manifiesto_ingesta`."""
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def hash_flujo(f, tamano_bloque=1 << 20):
+    """Igual que hash_contenido, pero leyendo el archivo de a `tamano_bloque` bytes."""
+    h = hashlib.sha256()
+    for bloque in iter(lambda: f.read(tamano_bloque), b""):
+        h.update(bloque)
+    return h.hexdigest()
+
+
+def extraer_dosis(nombre_medicion):
+    """
+    (dosis_coagulante, dosis_floculante) desde el nombre de la medición, que termina en
+    "_<coagulante>_<floculante>" (p. ej. "2025-03-01_jarra_20_0.5"); (None, None) si no.
+    """
+    partes = (nombre_medicion or "").strip().split("_")
+    try:
+        return float(partes[-2]), float(partes[-1])
+    except (IndexError, ValueError):
+        return None, None
+
+
+def columnas_dosis(nombres):
+    """extraer_dosis vectorizado: DataFrame con dosis_coagulante y dosis_floculante (NaN si no aplica)."""
+    nombres = pd.Series(nombres, dtype=object).fillna("").str.strip()
+    partes = nombres.str.extract(r"(?:^|_)([^_]*)_([^_]*)$")
+    dosis = partes.apply(pd.to_numeric, errors="coerce")
+    dosis.columns = ["dosis_coagulante", "dosis_floculante"]
+    dosis[dosis.isna().any(axis=1)] = np.nan
+    return dosis
+
+
+def clave_ensayo(nombre_medicion, planta=None, fecha=None):
+    """Clave (nombre_medicion, planta, fecha) de `ensayo` normalizada como en ids_ensayos."""
+    fecha = None if fecha is None or fecha == "" else pd.Timestamp(fecha).date()
+    return nombre_medicion, planta or None, fecha
+
+
+def ids_ensayos(cursor, claves, notas=None):
+    """
+    Id de `ensayo` para cada clave (nombre_medicion, planta, fecha); crea los que falten,
+    con las dosis de extraer_dosis. No hace commit: va en la transacción de quien llama.
+    - Una medición cargada sin planta ni fecha (scripts, vigilante) que luego se guarda con
+      ellas completa su misma fila, así mediciones e historico apuntan al mismo ensayo.
+    - INSERT IGNORE sobre la clave única uq_ensayo_clave: dos sesiones (o la app y el
+      vigilante) que crean el mismo ensayo a la vez terminan con una sola fila.
+    Devuelve {clave_ensayo(...): id}.
+    """
+    claves = {clave_ensayo(*clave) for clave in claves if clave[0]}
+    if not claves:
+        return {}
+    nombres = sorted({n for n, _, _ in claves})
+    placeholders = ",".join(["%s"] * len(nombres))
+
+    def _buscar():
+        cursor.execute(
+            f"SELECT id, nombre_medicion, planta, fecha FROM ensayo WHERE nombre_medicion IN ({placeholders})",
+            nombres,
+        )
+        return cursor.fetchall()
+
+    filas = _buscar()
+    ids = {(n, p, f): i for i, n, p, f in filas if (n, p, f) in claves}
+    faltantes = claves - ids.keys()
+    if faltantes:
+        sin_ubicar = {n: i for i, n, p, f in filas if p is None and f is None}
+        completadas = {
+            (n, p, f): sin_ubicar.pop(n)
+            for n, p, f in sorted(faltantes, key=str)
+            if (p is not None or f is not None) and n in sin_ubicar
+        }
+        if completadas:
+            cursor.executemany(
+                "UPDATE ensayo SET planta = %s, fecha = %s WHERE id = %s AND planta IS NULL AND fecha IS NULL",
+                [(p, f, i) for (_, p, f), i in completadas.items()],
+            )
+        nuevas = faltantes - completadas.keys()
+        if nuevas:
+            cursor.executemany(
+                """
+                INSERT IGNORE INTO ensayo (nombre_medicion, planta, fecha, dosis_coagulante, dosis_floculante, notas)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                """,
+                [(n, p, f, *extraer_dosis(n), notas) for n, p, f in nuevas],
+            )
+        ids = {(n, p, f): i for i, n, p, f in _buscar() if (n, p, f) in claves}
+    return ids
+
+
+def _id_ensayo(cursor, nombre_medicion, ensayo):
+    """Id de `ensayo` de una medición; `ensayo` es un dict opcional con planta, fecha y notas."""
+    ensayo = ensayo or {}
+    clave = clave_ensayo(nombre_medicion, ensayo.get("planta"), ensayo.get("fecha"))
+    return ids_ensayos(cursor, [clave], ensayo.get("notas")).get(clave)
+
+
+def _columnas_existentes(cursor, tabla):
+    cursor.execute(
+        """
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+          AND table_name = %s
+        """, (tabla,))
+    return {row[0].lower() for row in cursor.fetchall()}
+
+
+def asegurar_esquema_ingesta(conn):
+    """
+    Deja la BD lista para la ingesta (idempotente):
+    - crea `manifiesto_ingesta`, `mediciones_compactas`, `cuarentena_mediciones` y
+      `checkpoint_ingesta` si no existen;
+    - agrega a `mediciones` la columna `sesion_id` (+ índice) si falta;
+    - agrega al manifiesto las columnas de calidad que falten.
+    """
+    cursor = conn.cursor()
+    cursor.execute(DDL_MANIFIESTO)
+    cursor.execute(DDL_MEDICIONES_COMPACTAS)
+    cursor.execute(DDL_CUARENTENA)
+    cursor.execute(DDL_CHECKPOINT)
+    if "sesion_id" not in _columnas_existentes(cursor, "mediciones"):
+        cursor.execute(
+            "ALTER TABLE mediciones ADD COLUMN sesion_id VARCHAR(32) DEFAULT NULL, "
+            "ADD INDEX idx_med_sesion (sesion_id, nombre_medicion)"
+        )
+    existentes = _columnas_existentes(cursor, "manifiesto_ingesta")
+    faltantes = [f"ADD COLUMN {col} {tipo}" for col, tipo in COLUMNAS_CALIDAD_MANIFIESTO.items() if col not in existentes]
+    if faltantes:
+        cursor.execute(f"ALTER TABLE manifiesto_ingesta {', '.join(faltantes)}")
+    conn.commit()
+    cursor.close()
+
+
+def filtro_sesion(sesion_id, incluir_compartidas=True):
+    """
+    Fragmento WHERE (y sus parámetros) que limita `mediciones` / `manifiesto_ingesta`
+    a lo que ve una sesión: sus propias cargas y, si `incluir_compartidas`, las filas
+    con sesion_id NULL. Con sesion_id None se refiere solo a las compartidas.
+    """
+    if sesion_id is None:
+        return "sesion_id IS NULL", ()
+    if incluir_compartidas:
+        return "(sesion_id = %s OR sesion_id IS NULL)", (sesion_id,)
+    return "sesion_id = %s", (sesion_id,)
+
+
+def hashes_ingresados(conn, hashes, sesion_id=None, incluir_compartidas=True):
+    """Devuelve el subconjunto de `hashes` ya registrado en `manifiesto_ingesta` y visible para la sesión."""
+    hashes = list(set(hashes))
+    if not hashes:
+        return set()
+    where_sesion, params_sesion = filtro_sesion(sesion_id, incluir_compartidas)
+    placeholders = ", ".join(["%s"] * len(hashes))
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT hash_contenido FROM manifiesto_ingesta WHERE hash_contenido IN ({placeholders}) AND {where_sesion}",
+        (*hashes, *params_sesion),
+    )
+    encontrados = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    return encontrados
+
+
+def clave_en_vivo(nombre_medicion):
+    """
+    Clave fija en `manifiesto_ingesta` de una medición cargada en vivo (el hash del CSV
+    cambia con cada fila nueva, así que no sirve para identificarla).
+    """
+    return hash_contenido(f"en-vivo:{nombre_medicion}".encode("utf-8"))
+
+
+def ultimos_en_vivo(conn, nombres, sesion_id=None, incluir_compartidas=True):
+    """
+    {nombre_medicion: último unix_time ya en `mediciones`} de las mediciones de `nombres`
+    que se cargaron en vivo (visibles para la sesión). Al subir después el CSV terminado
+    solo se ingieren las filas posteriores, sin duplicar las que entraron en vivo.
+    """
+    claves = {clave_en_vivo(n): n for n in set(nombres)}
+    if not claves:
+        return {}
+    en_vivo = [claves[h] for h in hashes_ingresados(conn, claves, sesion_id, incluir_compartidas)]
+    if not en_vivo:
+        return {}
+    where_sesion, params_sesion = filtro_sesion(sesion_id, incluir_compartidas)
+    placeholders = ", ".join(["%s"] * len(en_vivo))
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT nombre_medicion, MAX(unix_time) FROM mediciones
+        WHERE nombre_medicion IN ({placeholders}) AND {where_sesion}
+        GROUP BY nombre_medicion
+        """,
+        (*en_vivo, *params_sesion),
+    )
+    ultimos = {nombre: float(ultimo) for nombre, ultimo in cursor.fetchall() if ultimo is not None}
+    cursor.close()
+    return ultimos
+
+
+def _sin_filas_en_vivo(df, ultimo):
+    """Quita las filas hasta `ultimo` (ya cargadas en vivo); las de unix_time NaN siguen a validación."""
+    if ultimo is None:
+        return df
+    return df[~(df["unix_time"] <= ultimo)]
+
+
+def borrar_mediciones(conn, nombres=None, sesion_id=None, incluir_compartidas=True):
+    """
+    Borra muestras de `mediciones` / `mediciones_compactas`, su cuarentena y sus entradas
+    en `manifiesto_ingesta` / `checkpoint_ingesta` (misma transacción),
+    para que esos CSV puedan volver a cargarse. Solo toca lo visible para la sesión
+    (ver `filtro_sesion`); sin `nombres`, borra todo lo visible.
+    """
+    where_sesion, params_sesion = filtro_sesion(sesion_id, incluir_compartidas)
+    if nombres is not None:
+        nombres = tuple(nombres)
+        if not nombres:
+            return
+        placeholders = ",".join(["%s"] * len(nombres))
+        where_sesion += f" AND nombre_medicion IN ({placeholders})"
+        params_sesion = (*params_sesion, *nombres)
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DELETE FROM mediciones WHERE {where_sesion}", params_sesion)
+        cursor.execute(f"DELETE FROM mediciones_compactas WHERE {where_sesion}", params_sesion)
+        cursor.execute(f"DELETE FROM cuarentena_mediciones WHERE {where_sesion}", params_sesion)
+        cursor.execute(f"DELETE FROM manifiesto_ingesta WHERE {where_sesion}", params_sesion)
+        # En checkpoint_ingesta lo compartido se guarda como sesion_id '' (es parte de la PK)
+        where_checkpoint = where_sesion.replace("sesion_id IS NULL", "sesion_id = ''")
+        cursor.execute(f"DELETE FROM checkpoint_ingesta WHERE {where_checkpoint}", params_sesion)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def validar_medicion(df, unix_previo=None):
+    """
+    Validación vectorizada, en una sola pasada, de un CSV ya parseado. Marca como malas
+    las filas con diámetro o unix_time NaN, tamaños negativos, unix_time duplicado o
+    unix_time que retrocede respecto a las filas anteriores.
+    Devuelve (validas, cuarentena, calidad):
+    - validas: filas que pasan;
+    - cuarentena: filas descartadas, con su índice original en 'fila' y el 'motivo';
+    - calidad: dict con filas, filas_cuarentena, ratio_nan, intervalo_s y duracion_s.
+    `unix_previo` es el último unix_time válido de los bloques anteriores (carga por bloques).
+    """
+    unix = df["unix_time"]
+    nan = df["diameter"].isna() | unix.isna()
+    negativo = (df[[col for col in COLUMNAS_NO_NEGATIVAS if col in df.columns]] < 0).any(axis=1)
+    duplicado = unix.duplicated() & unix.notna()
+    maximo_previo = unix.cummax().shift(1)
+    if unix_previo is not None:
+        duplicado |= unix == unix_previo
+        maximo_previo = maximo_previo.fillna(unix_previo).clip(lower=unix_previo)
+    retrocede = unix < maximo_previo
+
+    motivo = np.select(
+        [nan.to_numpy(), negativo.to_numpy(), duplicado.to_numpy(), retrocede.to_numpy()],
+        ["nan", "negativo", "duplicado", "no_monotono"],
+        default="",
+    )
+    mala = motivo != ""
+    validas = df[~mala]
+    cuarentena = df[mala].assign(fila=np.flatnonzero(mala), motivo=motivo[mala])
+
+    numericas = [col for col in columnas_medicion_temp if col in df.columns and col not in COLUMNAS_TIEMPO]
+    tiempos = validas["unix_time"].to_numpy()
+    calidad = {
+        "filas": len(validas),
+        "filas_cuarentena": int(mala.sum()),
+        "ratio_nan": float(df[numericas].isna().to_numpy().mean()) if len(df) else None,
+        "intervalo_s": float(np.median(np.diff(tiempos))) if len(tiempos) > 1 else None,
+        "duracion_s": float(tiempos[-1] - tiempos[0]) if len(tiempos) > 1 else None,
+    }
+    return validas, cuarentena, calidad
+
+
+def parsear_csv(nombre_archivo, contenido):
+    """
+    Lee, normaliza y valida un CSV Floccam a partir de sus bytes.
+    Devuelve (nombre_medicion, df, error); si hay error, df es None.
+    """
+    nombre_medicion = Path(nombre_archivo).stem
+    try:
+        df = leer_csv_floccam(contenido)
+    except Exception as e:
+        return nombre_medicion, None, f"No se pudo leer el archivo `{nombre_archivo}`: {e}"
+    if df.empty or df.shape[1] == 0:
+        return nombre_medicion, None, f"El archivo `{nombre_archivo}` no contiene datos válidos."
+
+    faltantes = columnas_faltantes(df)
+    if faltantes:
+        return nombre_medicion, None, f"El archivo `{nombre_archivo}` no contiene las columnas: {', '.join(faltantes)}"
+    return nombre_medicion, df, None
+
+
+def parsear_csvs_en_paralelo(archivos, max_workers=None):
+    """
+    Parsea varios CSV en un pool de hilos (los parsers C y pyarrow liberan el GIL).
+    `archivos` es una lista de (nombre_archivo, bytes).
+    Genera (indice, nombre_medicion, df, error) a medida que cada archivo termina, donde
+    `indice` es la posición en `archivos`, para que el llamador escriba en BD de forma serial.
+    """
+    if not archivos:
+        return
+    max_workers = max_workers or min(len(archivos), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futuros = {pool.submit(parsear_csv, nombre, contenido): i for i, (nombre, contenido) in enumerate(archivos)}
+        for futuro in as_completed(futuros):
+            yield (futuros[futuro], *futuro.result())
+
+
+def _es_ruta(fuente):
+    return isinstance(fuente, (str, os.PathLike))
+
+
+def _nombre_fuente(fuente):
+    return os.fspath(fuente) if _es_ruta(fuente) else fuente.name
+
+
+def _es_zip(fuente):
+    return _nombre_fuente(fuente).lower().endswith(".zip")
+
+
+def _abrir_subido(fuente):
+    fuente.seek(0)
+    return contextlib.nullcontext(fuente)  # el archivo subido lo cierra Streamlit
+
+
+def iterar_entradas(fuentes, umbral_grande=UMBRAL_ARCHIVO_GRANDE):
+    """
+    Genera (nombre_archivo, contenido) de cada CSV, de a UN archivo por vez.
+    `fuentes` mezcla rutas y archivos subidos (st.file_uploader), CSV o ZIP.
+    Los ZIP se recorren miembro a miembro sin extraer a disco; el nombre de cada
+    miembro queda como "archivo.zip/ruta/interna.csv".
+    `contenido` son los bytes del CSV, salvo para archivos de más de `umbral_grande`
+    bytes: ahí es una función sin argumentos que abre el archivo (modo binario) para
+    leerlo por bloques; solo es válida hasta pedir la siguiente entrada.
+    """
+    for fuente in fuentes:
+        nombre = _nombre_fuente(fuente)
+        if _es_zip(fuente):
+            with zipfile.ZipFile(fuente) as zf:
+                for info in zf.infolist():
+                    if info.is_dir() or not info.filename.lower().endswith(".csv") or "__MACOSX" in info.filename:
+                        continue
+                    if info.file_size > umbral_grande:
+                        yield f"{nombre}/{info.filename}", lambda info=info: zf.open(info)
+                        continue
+                    with zf.open(info) as f:
+                        yield f"{nombre}/{info.filename}", f.read()
+        elif _es_ruta(fuente):
+            if os.path.getsize(fuente) > umbral_grande:
+                yield nombre, lambda fuente=fuente: open(fuente, "rb")
+                continue
+            with open(fuente, "rb") as f:
+                yield nombre, f.read()
+        elif fuente.size > umbral_grande:
+            yield nombre, lambda fuente=fuente: _abrir_subido(fuente)
+        else:
+            fuente.seek(0)
+            yield nombre, fuente.read()
+
+
+def contar_entradas(fuentes):
+    """Cuenta los CSV de `fuentes` (en los ZIP solo se lee el índice central)."""
+    total = 0
+    for fuente in fuentes:
+        if _es_zip(fuente):
+            with zipfile.ZipFile(fuente) as zf:
+                total += sum(
+                    1 for info in zf.infolist()
+                    if not info.is_dir() and info.filename.lower().endswith(".csv") and "__MACOSX" not in info.filename
+                )
+        else:
+            total += 1
+    return total
+
+
+def ingerir_entradas(conn, entradas, sesion_id=None, incluir_compartidas=True, ventana=None, formato=None,
+                     ensayo=None):
+    """
+    Carga en `mediciones` los CSV de `entradas` (iterable de (nombre_archivo, bytes)).
+    Se procesan por ventanas de `ventana` archivos (por defecto, uno por núcleo): en cada
+    una se consulta el manifiesto, se parsea en paralelo y se inserta en serie. Así la
+    memoria queda acotada a una ventana aunque `entradas` venga de un ZIP enorme.
+    Cada CSV pasa por validar_medicion: las filas malas van a `cuarentena_mediciones` y
+    las estadísticas de calidad al manifiesto, en la misma transacción que los datos.
+    Genera (nombre_archivo, estado, detalle) por archivo, con estado:
+      "cargado" (detalle = dict de calidad), "omitido" (ya estaba cargado) o "error" (detalle = mensaje).
+    Los archivos grandes (ver iterar_entradas) no entran en ventanas: se cargan uno a uno
+    con ingerir_por_bloques, que confirma y guarda un checkpoint por bloque.
+    `formato` elige el almacén de destino (por defecto FORMATO_ALMACEN).
+    `ensayo` (dict opcional con planta, fecha y notas) identifica el `ensayo` de cada medición.
+    """
+    formato = formato or FORMATO_ALMACEN
+    ventana = ventana or os.cpu_count() or 1
+    vistos = set()
+    lote = []
+    for nombre, contenido in entradas:
+        if callable(contenido):
+            yield from _ingerir_ventana(conn, lote, vistos, sesion_id, incluir_compartidas, formato, ensayo)
+            lote = []
+            yield nombre, *ingerir_por_bloques(conn, nombre, contenido, vistos, sesion_id, incluir_compartidas,
+                                               formato, ensayo=ensayo)
+            continue
+        lote.append((nombre, contenido))
+        if len(lote) >= ventana:
+            yield from _ingerir_ventana(conn, lote, vistos, sesion_id, incluir_compartidas, formato, ensayo)
+            lote = []
+    yield from _ingerir_ventana(conn, lote, vistos, sesion_id, incluir_compartidas, formato, ensayo)
+
+
+def _ingerir_ventana(conn, lote, vistos, sesion_id, incluir_compartidas, formato, ensayo):
+    """Una ventana de ingerir_entradas: manifiesto, parseo en paralelo e inserción en serie."""
+    if not lote:
+        return
+    insertar = insertar_medicion_compacta if formato == "compacto" else insertar_medicion_bulk
+    hashes = [hash_contenido(contenido) for _, contenido in lote]
+    ya_cargados = hashes_ingresados(conn, hashes, sesion_id, incluir_compartidas)
+    pendientes = []
+    for (nombre, contenido), h in zip(lote, hashes):
+        if h in ya_cargados or h in vistos:
+            yield nombre, "omitido", None
+            continue
+        vistos.add(h)
+        pendientes.append((nombre, contenido, h))
+    del lote
+
+    ultimos = ultimos_en_vivo(conn, [Path(n).stem for n, _, _ in pendientes], sesion_id, incluir_compartidas)
+    for i, nombre_medicion, df, error in parsear_csvs_en_paralelo([(n, c) for n, c, _ in pendientes]):
+        nombre, _, h = pendientes[i]
+        if error:
+            yield nombre, "error", error
+            continue
+        ultimo = ultimos.get(nombre_medicion)
+        validas, cuarentena, calidad = validar_medicion(_sin_filas_en_vivo(df, ultimo), ultimo)
+        try:
+            insertar(conn, nombre_medicion, validas, hash_csv=h, sesion_id=sesion_id,
+                     cuarentena=cuarentena, calidad=calidad, ensayo=ensayo)
+        except Exception as e:
+            yield nombre, "error", f"No se pudo insertar `{nombre}` en la BD: {e}"
+            continue
+        yield nombre, "cargado", calidad
+
+
+def ingerir_por_bloques(conn, nombre_archivo, abrir, vistos=None, sesion_id=None, incluir_compartidas=True,
+                        formato=None, filas_por_bloque=FILAS_POR_BLOQUE, ensayo=None,
+                        abandonado_s=CHECKPOINT_ABANDONADO_S):
+    """
+    Carga un CSV grande de a `filas_por_bloque` filas, con memoria acotada a un bloque.
+    `abrir()` devuelve el archivo en modo binario (ver iterar_entradas).
+    - Cada bloque (filas válidas + cuarentena + checkpoint) es una transacción propia.
+    - Si el archivo quedó a medias (corte, reinicio, otra pasada del vigilante), se retoma
+      desde el último bloque confirmado según `checkpoint_ingesta`, por hash y sesión. Si la
+      sesión es nueva (p. ej. el navegador se desconectó), adopta la carga a medias del mismo
+      archivo que otra sesión dejó sin avanzar `abandonado_s` segundos (ver _adoptar_checkpoint).
+    - Al terminar se registra en el manifiesto con la calidad acumulada y se borra el checkpoint.
+    Devuelve (estado, detalle) como los eventos de ingerir_entradas.
+    """
+    nombre_medicion = Path(nombre_archivo).stem
+    escribir = _escribir_compacta if (formato or FORMATO_ALMACEN) == "compacto" else _escribir_filas
+    vistos = set() if vistos is None else vistos
+    try:
+        with abrir() as f:
+            h = hash_flujo(f)
+    except Exception as e:
+        return "error", f"No se pudo leer el archivo `{nombre_archivo}`: {e}"
+    if h in vistos or hashes_ingresados(conn, [h], sesion_id, incluir_compartidas):
+        return "omitido", None
+    vistos.add(h)
+
+    avance = _leer_checkpoint(conn, h, sesion_id)
+    if avance is None and sesion_id is not None:
+        avance = _adoptar_checkpoint(conn, h, sesion_id, abandonado_s)
+    ultimo_en_vivo = ultimos_en_vivo(conn, [nombre_medicion], sesion_id, incluir_compartidas).get(nombre_medicion)
+    numericas = [col for col in DTYPES_FLOCCAM]
+    with abrir() as f:
+        encabezado = f.readline()
+        if avance is None:
+            avance = {"offset_bytes": len(encabezado), "bloques": 0, "filas": 0, "filas_cuarentena": 0,
+                      "celdas": 0, "celdas_nan": 0, "unix_inicio": None, "unix_ultimo": None}
+        f.seek(avance["offset_bytes"])
+        while True:
+            bloque = b"".join(islice(f, filas_por_bloque))
+            if not bloque.strip():
+                break
+            try:
+                df = leer_csv_floccam(encabezado + bloque)
+            except Exception as e:
+                return "error", f"No se pudo leer el archivo `{nombre_archivo}`: {e}"
+            faltantes = columnas_faltantes(df)
+            if faltantes:
+                return "error", f"El archivo `{nombre_archivo}` no contiene las columnas: {', '.join(faltantes)}"
+
+            df = _sin_filas_en_vivo(df, ultimo_en_vivo)
+            unix_previo = avance["unix_ultimo"] if avance["unix_ultimo"] is not None else ultimo_en_vivo
+            validas, cuarentena, _ = validar_medicion(df, unix_previo)
+            cuarentena["fila"] += avance["filas"] + avance["filas_cuarentena"]
+            tiempos = validas["unix_time"].to_numpy()
+            avance["offset_bytes"] += len(bloque)
+            avance["bloques"] += 1
+            avance["filas"] += len(validas)
+            avance["filas_cuarentena"] += len(cuarentena)
+            avance["celdas"] += len(df) * len(numericas)
+            avance["celdas_nan"] += int(df[numericas].isna().to_numpy().sum())
+            if len(tiempos):
+                avance["unix_inicio"] = avance["unix_inicio"] if avance["unix_inicio"] is not None else float(tiempos[0])
+                avance["unix_ultimo"] = float(tiempos[-1])
+
+            cursor = conn.cursor()
+            try:
+                escribir(cursor, nombre_medicion, validas, sesion_id, _id_ensayo(cursor, nombre_medicion, ensayo))
+                _guardar_cuarentena(cursor, cuarentena, nombre_medicion, sesion_id, h)
+                _guardar_checkpoint(cursor, h, sesion_id, nombre_medicion, avance)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                return "error", f"No se pudo insertar `{nombre_archivo}` en la BD (bloque {avance['bloques']}): {e}"
+            finally:
+                cursor.close()
+
+    if avance["bloques"] == 0:
+        return "error", f"El archivo `{nombre_archivo}` no contiene datos válidos."
+
+    duracion = None
+    if avance["unix_inicio"] is not None and avance["filas"] > 1:
+        duracion = avance["unix_ultimo"] - avance["unix_inicio"]
+    calidad = {
+        "filas": avance["filas"],
+        "filas_cuarentena": avance["filas_cuarentena"],
+        "ratio_nan": avance["celdas_nan"] / avance["celdas"] if avance["celdas"] else None,
+        # Sin todas las diferencias en memoria, el intervalo es el promedio (no la mediana)
+        "intervalo_s": duracion / (avance["filas"] - 1) if duracion is not None else None,
+        "duracion_s": duracion,
+    }
+    cursor = conn.cursor()
+    try:
+        _registrar_en_manifiesto(cursor, h, sesion_id, nombre_medicion, avance["filas"], calidad)
+        cursor.execute(
+            "DELETE FROM checkpoint_ingesta WHERE hash_contenido = %s AND sesion_id = %s",
+            (h, sesion_id or ""),
+        )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        return "error", f"No se pudo registrar `{nombre_archivo}` en el manifiesto: {e}"
+    finally:
+        cursor.close()
+    return "cargado", calidad
+
+
+def _leer_checkpoint(conn, hash_csv, sesion_id):
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(
+        """
+        SELECT offset_bytes, bloques, filas, filas_cuarentena, celdas, celdas_nan, unix_inicio, unix_ultimo
+        FROM checkpoint_ingesta
+        WHERE hash_contenido = %s AND sesion_id = %s
+        """,
+        (hash_csv, sesion_id or ""),
+    )
+    fila = cursor.fetchone()
+    cursor.close()
+    return fila
+
+
+def _adoptar_checkpoint(conn, hash_csv, sesion_id, abandonado_s):
+    """
+    Pasa a `sesion_id` la carga a medias de `hash_csv` que dejó otra sesión de la app (checkpoint
+    sin avances en `abandonado_s` segundos): el checkpoint y las filas ya escritas (mediciones,
+    compactas, cuarentena) cambian de sesión en una transacción. Devuelve el avance adoptado o None.
+    Las cargas compartidas (scripts, vigilante; sesion_id '') no se adoptan: las retoma su proceso.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT sesion_id, nombre_medicion, actualizado_en, CURRENT_TIMESTAMP FROM checkpoint_ingesta
+        WHERE hash_contenido = %s AND sesion_id <> '' AND sesion_id <> %s
+        ORDER BY actualizado_en DESC
+        """,
+        (hash_csv, sesion_id),
+    )
+    candidatos = cursor.fetchall()
+    cursor.close()
+    for sesion_previa, nombre_medicion, actualizado_en, ahora in candidatos:
+        if (pd.Timestamp(ahora) - pd.Timestamp(actualizado_en)).total_seconds() < abandonado_s:
+            continue  # otra sesión la está cargando ahora mismo
+        cursor = conn.cursor()
+        try:
+            for tabla in ("mediciones", "mediciones_compactas"):
+                cursor.execute(
+                    f"UPDATE {tabla} SET sesion_id = %s WHERE sesion_id = %s AND nombre_medicion = %s",
+                    (sesion_id, sesion_previa, nombre_medicion),
+                )
+            cursor.execute(
+                "UPDATE cuarentena_mediciones SET sesion_id = %s WHERE sesion_id = %s AND hash_contenido = %s",
+                (sesion_id, sesion_previa, hash_csv),
+            )
+            cursor.execute(
+                "UPDATE checkpoint_ingesta SET sesion_id = %s WHERE hash_contenido = %s AND sesion_id = %s",
+                (sesion_id, hash_csv, sesion_previa),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        return _leer_checkpoint(conn, hash_csv, sesion_id)
+    return None
+
+
+def _guardar_checkpoint(cursor, hash_csv, sesion_id, nombre_medicion, avance):
+    # DELETE + INSERT en la transacción del bloque (sin ON DUPLICATE KEY: vale también en SQLite)
+    cursor.execute(
+        "DELETE FROM checkpoint_ingesta WHERE hash_contenido = %s AND sesion_id = %s",
+        (hash_csv, sesion_id or ""),
+    )
+    cursor.execute(
+        """
+        INSERT INTO checkpoint_ingesta
+          (hash_contenido, sesion_id, nombre_medicion, offset_bytes, bloques, filas, filas_cuarentena,
+           celdas, celdas_nan, unix_inicio, unix_ultimo)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """,
+        (hash_csv, sesion_id or "", nombre_medicion, avance["offset_bytes"], avance["bloques"], avance["filas"],
+         avance["filas_cuarentena"], avance["celdas"], avance["celdas_nan"], avance["unix_inicio"], avance["unix_ultimo"]),
+    )
+
+
+def _filas_para_mediciones(df):
+    """Convierte las columnas de `mediciones` en tuplas nativas de Python (NaN -> NULL)."""
+    datos = df[columnas_mediciones[1:]]
+    datos = datos.astype(object).where(datos.notna(), None)
+    return list(datos.itertuples(index=False, name=None))
+
+
+def insertar_medicion_bulk(conn, nombre_medicion, df, tamano_lote=TAMANO_LOTE, hash_csv=None, sesion_id=None,
+                           cuarentena=None, calidad=None, ensayo=None):
+    """
+    Inserta un CSV ya parseado directamente en `mediciones`, sin pasar por `medicion_temp`.
+    - Usa INSERT multi-fila por lotes de `tamano_lote` filas.
+    - Las filas quedan marcadas con `sesion_id` (None = compartidas) y con el id de su
+      `ensayo` (se crea si no existe; `ensayo` = dict opcional con planta, fecha y notas).
+    - `cuarentena` / `calidad` (de validar_medicion) se guardan junto con los datos.
+    - Si se da `hash_csv`, registra el archivo en `manifiesto_ingesta`.
+    - Todo el archivo va en UNA transacción: o entra completo o no entra nada.
+    Devuelve el número de filas insertadas.
+    """
+    cursor = conn.cursor()
+    try:
+        _escribir_filas(cursor, nombre_medicion, df, sesion_id, _id_ensayo(cursor, nombre_medicion, ensayo), tamano_lote)
+        _guardar_cuarentena(cursor, cuarentena, nombre_medicion, sesion_id, hash_csv)
+        if hash_csv:
+            _registrar_en_manifiesto(cursor, hash_csv, sesion_id, nombre_medicion, len(df), calidad)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return len(df)
+
+
+def insertar_incremento_en_vivo(conn, nombre_medicion, df, sesion_id=None, cuarentena=None, ensayo=None):
+    """
+    Inserta en `mediciones` las filas nuevas de una medición en vivo y suma las filas a su
+    entrada del manifiesto (clave_en_vivo), en una transacción. Las filas que ya estaban
+    (p. ej. el panel se reabrió y releyó el archivo desde el principio) no se repiten.
+    Devuelve el número de filas insertadas.
+    """
+    ultimo = ultimos_en_vivo(conn, [nombre_medicion], sesion_id, incluir_compartidas=False).get(nombre_medicion)
+    df = _sin_filas_en_vivo(df, ultimo)
+    if cuarentena is not None:
+        cuarentena = _sin_filas_en_vivo(cuarentena, ultimo)
+    clave = clave_en_vivo(nombre_medicion)
+    where_sesion, params_sesion = filtro_sesion(sesion_id, incluir_compartidas=False)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"SELECT COALESCE(SUM(filas), 0) FROM manifiesto_ingesta WHERE hash_contenido = %s AND {where_sesion}",
+            (clave, *params_sesion),
+        )
+        filas_previas = int(cursor.fetchone()[0])
+        _escribir_filas(cursor, nombre_medicion, df, sesion_id, _id_ensayo(cursor, nombre_medicion, ensayo))
+        _guardar_cuarentena(cursor, cuarentena, nombre_medicion, sesion_id, clave)
+        cursor.execute(
+            f"DELETE FROM manifiesto_ingesta WHERE hash_contenido = %s AND {where_sesion}",
+            (clave, *params_sesion),
+        )
+        _registrar_en_manifiesto(cursor, clave, sesion_id, nombre_medicion, filas_previas + len(df))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return len(df)
+
+
+def _escribir_filas(cursor, nombre_medicion, df, sesion_id, ensayo_id=None, tamano_lote=TAMANO_LOTE):
+    """INSERT multi-fila en `mediciones` por lotes de `tamano_lote` (sin commit)."""
+    filas = _filas_para_mediciones(df)
+    columnas_str = ', '.join(columnas_mediciones + ['sesion_id', 'ensayo_id'])
+    fila_ph = '(' + ', '.join(['%s'] * (len(columnas_mediciones) + 2)) + ')'
+    for inicio in range(0, len(filas), tamano_lote):
+        lote = filas[inicio:inicio + tamano_lote]
+        sql = f"INSERT INTO mediciones ({columnas_str}) VALUES {', '.join([fila_ph] * len(lote))}"
+        params = [v for fila in lote for v in (nombre_medicion, *fila, sesion_id, ensayo_id)]
+        cursor.execute(sql, params)
+
+
+def _registrar_en_manifiesto(cursor, hash_csv, sesion_id, nombre_medicion, filas, calidad=None):
+    calidad = calidad or {}
+    cursor.execute(
+        """
+        INSERT INTO manifiesto_ingesta
+          (hash_contenido, sesion_id, nombre_medicion, filas, filas_cuarentena, ratio_nan, intervalo_s, duracion_s)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """,
+        (hash_csv, sesion_id, nombre_medicion, filas, calidad.get("filas_cuarentena", 0),
+         calidad.get("ratio_nan"), calidad.get("intervalo_s"), calidad.get("duracion_s")),
+    )
+
+
+def _guardar_cuarentena(cursor, cuarentena, nombre_medicion, sesion_id, hash_csv):
+    """Inserta las filas descartadas por validar_medicion, cada una como JSON."""
+    if cuarentena is None or cuarentena.empty:
+        return
+    datos = cuarentena.drop(columns=["fila", "motivo"])
+    datos = datos.astype(object).where(datos.notna(), None)
+    filas = [
+        (nombre_medicion, sesion_id, hash_csv, int(fila), motivo, json.dumps(registro, default=str))
+        for fila, motivo, registro in zip(cuarentena["fila"], cuarentena["motivo"], datos.to_dict("records"))
+    ]
+    cursor.executemany(
+        """
+        INSERT INTO cuarentena_mediciones (nombre_medicion, sesion_id, hash_contenido, fila, motivo, datos)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        """,
+        filas,
+    )
+
+
+def empaquetar_medicion(df):
+    """
+    Serializa las 23 columnas del Floccam como arreglos numpy en un .npz comprimido:
+    float64 para las variables (NaN = faltante) y datetime64[ns] para ascii_time/excel_time.
+    """
+    arreglos = {}
+    for col in columnas_medicion_temp:
+        if col in COLUMNAS_TIEMPO:
+            arreglos[col] = pd.to_datetime(df[col], errors="coerce").to_numpy(dtype="datetime64[ns]")
+        else:
+            arreglos[col] = df[col].to_numpy(dtype="float64", na_value=np.nan)
+    buf = io.BytesIO()
+    np.savez_compressed(buf, **arreglos)
+    return buf.getvalue()
+
+
+def desempaquetar_medicion(blob):
+    """Inverso de empaquetar_medicion: devuelve un DataFrame con las 23 columnas."""
+    with np.load(io.BytesIO(blob)) as npz:
+        return pd.DataFrame({col: npz[col] for col in npz.files})
+
+
+def insertar_medicion_compacta(conn, nombre_medicion, df, hash_csv=None, sesion_id=None,
+                               cuarentena=None, calidad=None, ensayo=None):
+    """
+    Guarda un CSV ya parseado como UNA fila de `mediciones_compactas` (todas las columnas,
+    incluidas las que `mediciones` descarta). Misma transacción que el manifiesto.
+    (Los archivos cargados por bloques quedan como una fila por bloque.)
+    Devuelve el número de muestras guardadas.
+    """
+    cursor = conn.cursor()
+    try:
+        _escribir_compacta(cursor, nombre_medicion, df, sesion_id, _id_ensayo(cursor, nombre_medicion, ensayo))
+        _guardar_cuarentena(cursor, cuarentena, nombre_medicion, sesion_id, hash_csv)
+        if hash_csv:
+            _registrar_en_manifiesto(cursor, hash_csv, sesion_id, nombre_medicion, len(df), calidad)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return len(df)
+
+
+def _escribir_compacta(cursor, nombre_medicion, df, sesion_id, ensayo_id=None):
+    """Una fila de `mediciones_compactas` con el bloque empaquetado (sin commit)."""
+    cursor.execute(
+        "INSERT INTO mediciones_compactas (nombre_medicion, sesion_id, ensayo_id, filas, datos) VALUES (%s, %s, %s, %s, %s)",
+        (nombre_medicion, sesion_id, ensayo_id, len(df), empaquetar_medicion(df)),
+    )
+
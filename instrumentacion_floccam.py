@@ -0,0 +1,166 @@
+"""
+Instrumentación de consultas SQL de Floccam Analyzer.
+
+`instrumentar(conn)` envuelve una conexión (MySQL o SQLite) sin cambiar su interfaz: cada
+execute/executemany queda registrado con su plantilla (sin parámetros), la función que lo
+lanzó, la latencia (ejecución + lectura), filas (leídas o afectadas) y bytes leídos
+(estimados a partir de los valores recibidos).
+
+Los registros van a:
+    - un buffer en memoria del proceso (ultimas_consultas), que la app muestra en el panel
+      de desarrollador de la barra lateral (abrir la app con ?dev=1);
+    - un log JSON por línea (FLOCCAM_LOG_CONSULTAS, por defecto logs/consultas.jsonl; vacío
+      para desactivarlo), rotado cada 5 MB.
+"""
+import collections
+import json
+import logging
+import logging.handlers
+import os
+import re
+import sys
+import threading
+import time
+
+RUTA_LOG_CONSULTAS = os.environ.get("FLOCCAM_LOG_CONSULTAS", os.path.join("logs", "consultas.jsonl"))
+MAX_CONSULTAS_EN_MEMORIA = 2000
+
+_consultas = collections.deque(maxlen=MAX_CONSULTAS_EN_MEMORIA)
+_contexto = threading.local()  # etiqueta de la ejecución en curso (p. ej. sesión + rerun)
+
+log = logging.getLogger("floccam.consultas")
+log.propagate = False
+_log_configurado = threading.Lock()
+
+
+def _log_consultas():
+    """
+    Logger del JSON por línea. El handler (y la carpeta logs/) se crea con el primer
+    registro, no al importar: importar el módulo no deja archivos en el directorio actual.
+    """
+    if RUTA_LOG_CONSULTAS and not log.handlers:
+        with _log_configurado:
+            if not log.handlers:
+                os.makedirs(os.path.dirname(RUTA_LOG_CONSULTAS) or ".", exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(
+                    RUTA_LOG_CONSULTAS, maxBytes=5 * 1024 * 1024, backupCount=3, encoding="utf-8"
+                )
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                log.addHandler(handler)
+                log.setLevel(logging.INFO)
+    return log
+
+
+def plantilla_sql(sql):
+    """SQL normalizado para agrupar: espacios colapsados, listas IN (...) y VALUES multi-fila reducidas."""
+    sql = " ".join(sql.split())
+    sql = re.sub(r"IN \((?:%s|\?)(?:, ?(?:%s|\?))*\)", "IN (...)", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"(VALUES \([^)]*\))(?:, ?\([^)]*\))+", r"\1, ...", sql, flags=re.IGNORECASE)
+    return sql
+
+
+def etiquetar(etiqueta):
+    """Marca las consultas siguientes de este hilo (p. ej. id de sesión + número de rerun)."""
+    _contexto.etiqueta = etiqueta
+
+
+def ultimas_consultas(etiqueta=None):
+    """Registros en memoria (los más recientes al final), opcionalmente de una sola etiqueta."""
+    registros = list(_consultas)
+    if etiqueta is not None:
+        registros = [r for r in registros if r["etiqueta"] == etiqueta]
+    return registros
+
+
+def _bytes_filas(filas):
+    return sum(
+        len(v) if isinstance(v, (bytes, bytearray, str)) else 8
+        for fila in filas for v in (fila.values() if isinstance(fila, dict) else fila)
+    )
+
+
+class CursorInstrumentado:
+    """Cursor que mide cada sentencia; el resto de atributos pasan al cursor real."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._registro = None
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+    def _cerrar_registro(self):
+        if self._registro is None:
+            return
+        registro, self._registro = self._registro, None
+        registro["ms"] = round(registro.pop("_segundos") * 1000, 3)
+        _consultas.append(registro)
+        if RUTA_LOG_CONSULTAS:
+            _log_consultas().info(json.dumps(registro, ensure_ascii=False, default=str))
+
+    def _medir(self, metodo, sql, *args):
+        self._cerrar_registro()
+        inicio = time.perf_counter()
+        try:
+            return metodo(sql, *args)
+        finally:
+            self._registro = {
+                "ts": time.time(),
+                "etiqueta": getattr(_contexto, "etiqueta", None),
+                "funcion": sys._getframe(2).f_code.co_name,
+                "plantilla": plantilla_sql(sql),
+                "_segundos": time.perf_counter() - inicio,
+                "filas": 0,
+                "bytes": 0,
+            }
+            if self._cursor.description is None:  # INSERT/UPDATE/DELETE: filas afectadas
+                self._registro["filas"] = max(self._cursor.rowcount or 0, 0)
+
+    def execute(self, sql, *args, **kwargs):
+        return self._medir(lambda s, *a: self._cursor.execute(s, *a, **kwargs), sql, *args)
+
+    def executemany(self, sql, filas):
+        return self._medir(self._cursor.executemany, sql, filas)
+
+    def _leer(self, metodo, *args):
+        inicio = time.perf_counter()
+        resultado = metodo(*args)
+        if self._registro is not None:
+            filas = [] if resultado is None else ([resultado] if metodo.__name__ == "fetchone" else resultado)
+            self._registro["_segundos"] += time.perf_counter() - inicio
+            self._registro["filas"] += len(filas)
+            self._registro["bytes"] += _bytes_filas(filas)
+        return resultado
+
+    def fetchone(self):
+        return self._leer(self._cursor.fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._leer(lambda *a: self._cursor.fetchmany(*a, **kwargs), *args)
+
+    def fetchall(self):
+        return self._leer(self._cursor.fetchall)
+
+    def close(self):
+        self._cerrar_registro()
+        return self._cursor.close()
+
+
+class ConexionInstrumentada:
+    """Conexión cuyo cursor() devuelve CursorInstrumentado; todo lo demás pasa a la real."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+    def cursor(self, *args, **kwargs):
+        return CursorInstrumentado(self._conn.cursor(*args, **kwargs))
+
+
+def instrumentar(conn):
+    """Envuelve `conn` (idempotente; None pasa tal cual)."""
+    if conn is None or isinstance(conn, ConexionInstrumentada):
+        return conn
+    return ConexionInstrumentada(conn)
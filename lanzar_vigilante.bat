@@ -0,0 +1,8 @@
+@echo off
+echo ================================
+echo 👀 Lanzando vigilante de carpeta Floccam...
+echo ================================
+
+py vigilar_carpeta.py "%USERPROFILE%\Floccam\exportes"
+
+pause
\ No newline at end of file
@@ -0,0 +1,305 @@
+"""
+Migraciones versionadas del esquema MySQL de Floccam Analyzer.
+
+Uso (al desplegar; la app también las aplica una vez por proceso si faltan):
+    py migraciones_floccam.py
+    py migraciones_floccam.py --password ****
+
+`esquema_version` guarda qué migraciones ya se aplicaron; `migrar()` solo ejecuta las
+pendientes, en orden. En MySQL el DDL no es transaccional, así que cada migración es
+idempotente: si un corte la deja a medias, volver a correrla la termina.
+"""
+import argparse
+
+from mysql.connector import Error, errorcode
+
+from ingesta_floccam import asegurar_esquema_ingesta, ids_ensayos
+from repositorio_floccam import conectar
+from sqlite_floccam import crear_esquema_sqlite
+
+DDL_ESQUEMA_VERSION = """
+CREATE TABLE IF NOT EXISTS esquema_version (
+  version INT PRIMARY KEY,
+  descripcion VARCHAR(255) NOT NULL,
+  aplicada_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+DDL_GRAFICOS = """
+CREATE TABLE IF NOT EXISTS graficos (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  planta VARCHAR(100) NOT NULL,
+  fecha DATE NOT NULL,
+  nombre_medicion VARCHAR(255) NOT NULL,
+  tipo VARCHAR(80) DEFAULT NULL,
+  nombre_archivo VARCHAR(255) NOT NULL,
+  formato VARCHAR(10) DEFAULT 'PNG',
+  imagen_blob LONGBLOB NOT NULL,
+  ancho INT DEFAULT NULL,
+  alto INT DEFAULT NULL,
+  creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# Dimensión de ensayos: dosis ya parseadas y claves enteras para mediciones/historico/graficos
+DDL_ENSAYO = """
+CREATE TABLE IF NOT EXISTS ensayo (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  nombre_medicion VARCHAR(255) NOT NULL,
+  planta VARCHAR(100) DEFAULT NULL,
+  fecha DATE DEFAULT NULL,
+  dosis_coagulante DOUBLE DEFAULT NULL,
+  dosis_floculante DOUBLE DEFAULT NULL,
+  notas TEXT,
+  creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_ensayo_clave (nombre_medicion, planta, fecha),
+  INDEX idx_ensayo_dosis (dosis_coagulante, dosis_floculante),
+  INDEX idx_ensayo_planta_fecha (planta, fecha)
+);
+"""
+
+# Tablas que referencian `ensayo` por FK (columna ensayo_id)
+TABLAS_CON_ENSAYO = ("mediciones", "mediciones_compactas", "historico", "graficos")
+
+# Nombre del lock de MySQL que evita que dos procesos migren a la vez
+LOCK_MIGRACIONES = "floccam_migraciones"
+
+
+def _crear_indice(cursor, tabla, nombre, columnas):
+    """CREATE INDEX tolerante a que ya exista (BD creadas con los bootstrap anteriores)."""
+    try:
+        cursor.execute(f"CREATE INDEX {nombre} ON {tabla} ({columnas})")
+    except Error as e:
+        if e.errno != errorcode.ER_DUP_KEYNAME:
+            raise
+
+
+def _m001_tabla_graficos(conn):
+    cursor = conn.cursor()
+    cursor.execute(DDL_GRAFICOS)
+    cursor.close()
+
+
+def _m002_indices_graficos(conn):
+    cursor = conn.cursor()
+    _crear_indice(cursor, "graficos", "idx_graficos_pftm", "planta, fecha, tipo, nombre_medicion")
+    _crear_indice(cursor, "graficos", "idx_graficos_pfta", "planta, fecha, tipo, nombre_archivo")
+    cursor.close()
+
+
+def _m003_indices_historico(conn):
+    cursor = conn.cursor()
+    # Para SELECT DISTINCT planta / fecha y filtros por planta+fecha
+    _crear_indice(cursor, "historico", "idx_hist_pf", "planta, fecha")
+    # Para filtros + agrupaciones por nombre_medicion en esa misma combinación
+    _crear_indice(cursor, "historico", "idx_hist_pf_nom", "planta, fecha, nombre_medicion")
+    cursor.close()
+
+
+def _m004_esquema_ingesta(conn):
+    asegurar_esquema_ingesta(conn)
+
+
+def _m005_ensayo(conn):
+    """Crea `ensayo`, agrega ensayo_id (+ FK) a las tablas y completa los datos existentes."""
+    cursor = conn.cursor()
+    cursor.execute(DDL_ENSAYO)
+    for tabla in TABLAS_CON_ENSAYO:
+        try:
+            cursor.execute(
+                f"ALTER TABLE {tabla} ADD COLUMN ensayo_id INT DEFAULT NULL, "
+                f"ADD CONSTRAINT fk_{tabla}_ensayo FOREIGN KEY (ensayo_id) REFERENCES ensayo (id) ON DELETE SET NULL"
+            )
+        except Error as e:
+            if e.errno != errorcode.ER_DUP_FIELDNAME:
+                raise
+
+    # Backfill: un ensayo por (nombre_medicion, planta, fecha) ya guardado; `mediciones` y
+    # `mediciones_compactas` no tienen planta ni fecha
+    claves = set()
+    for tabla in ("historico", "graficos"):
+        cursor.execute(f"SELECT DISTINCT nombre_medicion, planta, fecha FROM {tabla} WHERE nombre_medicion <> ''")
+        claves.update(cursor.fetchall())
+    for tabla in ("mediciones", "mediciones_compactas"):
+        cursor.execute(f"SELECT DISTINCT nombre_medicion, NULL, NULL FROM {tabla}")
+        claves.update(cursor.fetchall())
+    ids_ensayos(cursor, claves)
+    conn.commit()
+
+    for tabla in ("historico", "graficos"):
+        cursor.execute(
+            f"""
+            UPDATE {tabla} t JOIN ensayo e
+              ON e.nombre_medicion = t.nombre_medicion AND e.planta <=> t.planta AND e.fecha <=> t.fecha
+            SET t.ensayo_id = e.id
+            WHERE t.ensayo_id IS NULL
+            """)
+    for tabla in ("mediciones", "mediciones_compactas"):
+        cursor.execute(
+            f"""
+            UPDATE {tabla} t JOIN ensayo e
+              ON e.nombre_medicion = t.nombre_medicion AND e.planta IS NULL AND e.fecha IS NULL
+            SET t.ensayo_id = e.id
+            WHERE t.ensayo_id IS NULL
+            """)
+    cursor.close()
+
+
+def _m006_indice_mediciones_nombre(conn):
+    cursor = conn.cursor()
+    # Lista de mediciones (DISTINCT) y lectura de una sola medición ya ordenada por tiempo
+    _crear_indice(cursor, "mediciones", "idx_med_nombre_tiempo", "nombre_medicion, unix_time")
+    cursor.close()
+
+
+def _fusionar_ensayos(cursor):
+    """
+    Deja un solo `ensayo` por clave antes de crear uq_ensayo_clave (SQL válido en MySQL y SQLite):
+    - duplicados de la misma (nombre_medicion, planta, fecha) -> el de menor id;
+    - fila sin planta ni fecha (medición cargada por scripts o el vigilante) con un único
+      ensayo ubicado del mismo nombre -> ese ensayo, para que mediciones e historico coincidan.
+    Las tablas de TABLAS_CON_ENSAYO se reapuntan antes de borrar las filas sobrantes.
+    """
+    cursor.execute(
+        """
+        SELECT e.id, k.id_min
+        FROM ensayo e JOIN (
+            SELECT nombre_medicion, COALESCE(planta, '') AS planta_k, COALESCE(fecha, '1000-01-01') AS fecha_k,
+                   MIN(id) AS id_min
+            FROM ensayo
+            GROUP BY nombre_medicion, COALESCE(planta, ''), COALESCE(fecha, '1000-01-01')
+        ) k ON k.nombre_medicion = e.nombre_medicion
+           AND k.planta_k = COALESCE(e.planta, '') AND k.fecha_k = COALESCE(e.fecha, '1000-01-01')
+        WHERE e.id <> k.id_min
+        """)
+    reemplazos = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT u.id, MIN(c.id)
+        FROM ensayo u JOIN ensayo c
+          ON c.nombre_medicion = u.nombre_medicion AND (c.planta IS NOT NULL OR c.fecha IS NOT NULL)
+        WHERE u.planta IS NULL AND u.fecha IS NULL
+        GROUP BY u.id
+        HAVING COUNT(DISTINCT c.id) = 1
+        """)
+    # un duplicado ya reemplazado no puede ser destino (ni origen) de la segunda regla
+    sobrantes = {viejo for viejo, _ in reemplazos}
+    reemplazos += [(u, c) for u, c in cursor.fetchall() if u not in sobrantes and c not in sobrantes]
+    if not reemplazos:
+        return 0
+    for tabla in TABLAS_CON_ENSAYO:
+        cursor.executemany(
+            f"UPDATE {tabla} SET ensayo_id = %s WHERE ensayo_id = %s",
+            [(nuevo, viejo) for viejo, nuevo in reemplazos],
+        )
+    cursor.executemany("DELETE FROM ensayo WHERE id = %s", [(viejo,) for viejo, _ in reemplazos])
+    return len(reemplazos)
+
+
+def _m007_ensayo_clave_unica(conn):
+    """Clave única de `ensayo` (NULL cuenta como valor), para que INSERT IGNORE no duplique."""
+    cursor = conn.cursor()
+    _fusionar_ensayos(cursor)
+    conn.commit()
+    try:
+        cursor.execute(
+            "ALTER TABLE ensayo ADD UNIQUE INDEX uq_ensayo_clave "
+            "(nombre_medicion, (IFNULL(planta, '')), (IFNULL(fecha, '1000-01-01')))"
+        )
+    except Error as e:
+        if e.errno != errorcode.ER_DUP_KEYNAME:
+            raise
+    cursor.close()
+
+
+# (version, descripción, función(conn)). Solo se agregan al final; nunca se renumeran.
+MIGRACIONES = [
+    (1, "Tabla graficos", _m001_tabla_graficos),
+    (2, "Índices de graficos (planta, fecha, tipo, ...)", _m002_indices_graficos),
+    (3, "Índices de historico (planta, fecha, nombre_medicion)", _m003_indices_historico),
+    (4, "Esquema de ingesta: manifiesto, compactas, cuarentena, checkpoint, mediciones.sesion_id", _m004_esquema_ingesta),
+    (5, "Tabla ensayo (dosis parseadas) y ensayo_id en mediciones, compactas, historico y graficos", _m005_ensayo),
+    (6, "Índice de mediciones (nombre_medicion, unix_time)", _m006_indice_mediciones_nombre),
+    (7, "Clave única de ensayo (nombre_medicion, planta, fecha), sin duplicados", _m007_ensayo_clave_unica),
+]
+
+
+def version_actual(conn):
+    """Última versión aplicada (0 si la BD nunca se migró)."""
+    cursor = conn.cursor()
+    cursor.execute(DDL_ESQUEMA_VERSION)
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM esquema_version")
+    version = cursor.fetchone()[0]
+    cursor.close()
+    return int(version)
+
+
+def _migrar_sqlite(conn):
+    """
+    SQLite se crea directo con el esquema final (sqlite_floccam.ESQUEMA_SQLITE, idempotente);
+    solo se registran como aplicadas las versiones que falten. Antes se fusionan los
+    ensayos duplicados de BD anteriores a uq_ensayo_clave, que si no impedirían crearla.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ensayo'")
+    if cursor.fetchone():
+        _fusionar_ensayos(cursor)
+        conn.commit()
+    cursor.close()
+    crear_esquema_sqlite(conn)
+    actual = version_actual(conn)
+    cursor = conn.cursor()
+    cursor.executemany(
+        "INSERT INTO esquema_version (version, descripcion) VALUES (%s, %s)",
+        [(version, descripcion) for version, descripcion, _ in MIGRACIONES if version > actual],
+    )
+    conn.commit()
+    cursor.close()
+    return [version for version, _, _ in MIGRACIONES if version > actual]
+
+
+def migrar(conn, hasta=None):
+    """
+    Aplica, en orden, las migraciones pendientes (hasta la versión `hasta`, o todas).
+    Devuelve la lista de versiones aplicadas (vacía si el esquema ya estaba al día).
+    En SQLite el esquema siempre queda en la última versión (se ignora `hasta`).
+    """
+    if getattr(conn, "motor", "mysql") == "sqlite":
+        return _migrar_sqlite(conn)
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, 60)", (LOCK_MIGRACIONES,))
+    cursor.fetchone()
+    aplicadas = []
+    try:
+        actual = version_actual(conn)
+        for version, descripcion, funcion in MIGRACIONES:
+            if version <= actual or (hasta is not None and version > hasta):
+                continue
+            funcion(conn)
+            cursor.execute(
+                "INSERT INTO esquema_version (version, descripcion) VALUES (%s, %s)",
+                (version, descripcion),
+            )
+            conn.commit()
+            aplicadas.append(version)
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_MIGRACIONES,))
+        cursor.fetchone()
+        cursor.close()
+    return aplicadas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aplica las migraciones pendientes del esquema Floccam.")
+    parser.add_argument("--password", default=None, help="Contraseña MySQL local (o MYSQL_PASSWORD)")
+    parser.add_argument("--hasta", type=int, default=None, help="Migrar solo hasta esta versión")
+    args = parser.parse_args()
+
+    conn = conectar(args.password)
+    antes = version_actual(conn)
+    aplicadas = migrar(conn, args.hasta)
+    if aplicadas:
+        print(f"✅ Esquema migrado de la versión {antes} a la {aplicadas[-1]}: {aplicadas}")
+    else:
+        print(f"✔️ Esquema al día (versión {antes}).")
+    conn.close()
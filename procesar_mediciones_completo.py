@@ -1,42 +1,36 @@
-import pandas as pd
+import argparse
 import matplotlib.pyplot as plt
 import numpy as np
-import mysql.connector
 import re
 import os
 
+from ingesta_floccam import columnas_dosis
+from repositorio_floccam import conectar, leer_mediciones
+from calculo_floccam import agrupar_curvas, curva, calcular_t63, detectar_df, resumen_t63
+
 # Configuración de carpeta
 output_folder = "graficos_mediciones"
 os.makedirs(output_folder, exist_ok=True)
 
-# Conexión MySQL
-conexion = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="Emanuel10*",  # Cambia si es necesario
-    database="mediciones_db"
-)
-cursor = conexion.cursor(dictionary=True)
-cursor.execute("SELECT * FROM mediciones")
-registros = cursor.fetchall()
-df = pd.DataFrame(registros)
-
-# Agrupar por nombre_medicion
-resumen = []
-
-for nombre, grupo in df.groupby("nombre_medicion"):
-    grupo = grupo.sort_values("unix_time")
-    unix = grupo["unix_time"].to_numpy()
-    diam = grupo["diameter"].to_numpy()
-
-    if len(diam) == 0:
-        continue
+parser = argparse.ArgumentParser(description="Procesa las mediciones cargadas con Df manual o automático.")
+parser.add_argument("--password", default=None, help="Contraseña MySQL local (o MYSQL_PASSWORD)")
+args = parser.parse_args()
+
+# Conexión a la base de datos (secrets.toml, SQLite o localhost, ver repositorio_floccam.conectar)
+conexion = conectar(args.password)
+df = leer_mediciones(conexion)
+
+# Todas las curvas como arrays planos + offsets (tiempo relativo al inicio de cada medición)
+curvas = agrupar_curvas(df["nombre_medicion"], df["unix_time"], df["diameter"])
+deteccion = detectar_df(curvas)  # Df automático; se puede corregir a mano
+df_final = np.full(len(curvas["nombres"]), np.nan)
 
-    di = diam[0]
+for i, nombre in enumerate(curvas["nombres"]):
+    tiempo, diam = curva(curvas, i)
 
     # Mostrar gráfico para entrada manual
     plt.figure(figsize=(8, 5))
-    plt.plot(unix, diam, marker="o")
+    plt.plot(tiempo, diam, marker="o")
     plt.title(f"[{nombre}] Diámetro vs Tiempo")
     plt.xlabel("Tiempo (s)")
     plt.ylabel("Diámetro (mm)")
@@ -44,35 +38,26 @@ for nombre, grupo in df.groupby("nombre_medicion"):
     plt.tight_layout()
     plt.show()
 
+    aviso = "" if deteccion["estable"][i] else " ⚠️ sin meseta"
+    entrada = input(f"Ingrese el valor de Df para '{nombre}' [Enter = {deteccion['df'][i]:.3f}{aviso}]: ")
     try:
-        df_manual = float(input(f"Ingrese el valor de Df para '{nombre}': "))
+        df_final[i] = float(entrada) if entrada.strip() else deteccion["df"][i]
     except ValueError:
         print("❌ Entrada inválida. Se omite esta medición.")
-        continue
-
-    delta_d = df_manual - di
-    d_t = diam.max()
 
-    # Calcular T_63 basado en Df manual
-    objetivo = di + 0.63 * (df_manual - di)
-    dif_abs = np.abs(diam - objetivo)
-    idx_t63 = dif_abs.argmin()
-    t_63 = unix[idx_t63] if len(unix) > idx_t63 else np.nan
+# Di, Df, ΔD, D(T) y T_63 de todas las mediciones en una sola pasada
+calculo = calcular_t63(curvas, df_final)
 
-    resumen.append({
-        "nombre_medicion": nombre,
-        "Di (mm)": di,
-        "Df (mm)": df_manual,
-        "ΔD (mm)": delta_d,
-        "D(T) (mm)": d_t,
-        "T_63 (s)": t_63
-    })
+for i, nombre in enumerate(curvas["nombres"]):
+    if np.isnan(df_final[i]):
+        continue
+    tiempo, diam = curva(curvas, i)
 
     # Guardar gráfico con líneas
     plt.figure(figsize=(8, 5))
-    plt.plot(unix, diam, marker="o")
-    plt.axhline(objetivo, color="red", linestyle="--", label="63% ΔD")
-    plt.axvline(t_63, color="green", linestyle="--", label="T_63")
+    plt.plot(tiempo, diam, marker="o")
+    plt.axhline(calculo["objetivo"][i], color="red", linestyle="--", label="63% ΔD")
+    plt.axvline(calculo["t63"][i], color="green", linestyle="--", label="T_63")
     plt.title(f"Diámetro vs Tiempo\n{nombre}")
     plt.xlabel("Tiempo (s)")
     plt.ylabel("Diámetro (mm)")
@@ -82,8 +67,9 @@ for nombre, grupo in df.groupby("nombre_medicion"):
     plt.savefig(f"{output_folder}/{nombre}_grafico.png")
     plt.close()
 
-# Guardar CSV resumen
-df_resumen = pd.DataFrame(resumen)
+# Guardar CSV resumen (sin las mediciones omitidas)
+df_resumen = resumen_t63(curvas, calculo=calculo)
+df_resumen = df_resumen[~np.isnan(df_final)].reset_index(drop=True)
 df_resumen.to_csv("resumen_mediciones.csv", index=False)
 
 # ========================================================
@@ -91,18 +77,7 @@ df_resumen.to_csv("resumen_mediciones.csv", index=False)
 # ========================================================
 
 # Extraer dosis desde nombre_medicion (patrón: AAAA-MM-DD_nombre_XX_YY)
-def extraer_dosis(nombre):
-    partes = nombre.strip().split("_")
-    try:
-        coagulante = float(partes[-2])
-        floculante = float(partes[-1])
-        return coagulante, floculante
-    except (IndexError, ValueError):
-        return None, None
-
-df_resumen[['dosis_coagulante', 'dosis_floculante']] = df_resumen['nombre_medicion'].apply(
-    lambda x: pd.Series(extraer_dosis(x))
-)
+df_resumen[['dosis_coagulante', 'dosis_floculante']] = columnas_dosis(df_resumen['nombre_medicion'])
 
 # Eliminar filas con dosis faltantes
 df_resumen = df_resumen.dropna(subset=['dosis_coagulante', 'dosis_floculante', 'T_63 (s)'])
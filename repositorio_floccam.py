@@ -0,0 +1,422 @@
+"""
+Acceso a datos de Floccam Analyzer (lecturas y guardado de proyecto).
+
+Todas las consultas a `mediciones`, `historico` y `graficos` de las apps y los scripts
+pasan por aquí, así que caché, lotes o un cambio de motor se resuelven en un solo lugar.
+La escritura de CSV (manifiesto, cuarentena, bloques) sigue en ingesta_floccam.py.
+Salvo `conectar`, todas las funciones reciben una conexión abierta y no la cierran.
+"""
+import os
+import re
+import tomllib
+
+import mysql.connector
+import numpy as np
+import pandas as pd
+
+from ingesta_floccam import (
+    filtro_sesion, desempaquetar_medicion, ids_ensayos, clave_ensayo, columnas_mediciones,
+)
+from sqlite_floccam import conectar_sqlite, ruta_sqlite
+from instrumentacion_floccam import instrumentar
+
+
+def conectar(password=None):
+    """
+    Conexión a la BD para procesos sin Streamlit.
+    Con SQLite configurado (FLOCCAM_SQLITE o [sqlite] en .streamlit/secrets.toml) abre ese archivo.
+    Si no, usa .streamlit/secrets.toml [mysql] si existe (igual que st.secrets);
+    y si tampoco, localhost con `password` o la variable de entorno MYSQL_PASSWORD.
+    """
+    ruta_secrets = os.path.join(".streamlit", "secrets.toml")
+    secrets = {}
+    if os.path.exists(ruta_secrets):
+        with open(ruta_secrets, "rb") as f:
+            secrets = tomllib.load(f)
+    ruta = ruta_sqlite(secrets.get("sqlite"))
+    if ruta:
+        return instrumentar(conectar_sqlite(ruta))
+    cfg = secrets.get("mysql", {})
+    if cfg:
+        return instrumentar(mysql.connector.connect(
+            host=cfg.get("host"), user=cfg.get("user"), password=cfg.get("password"),
+            database=cfg.get("database"), port=int(cfg.get("port") or 3306),
+        ))
+    return instrumentar(mysql.connector.connect(
+        host="localhost",
+        user="root",
+        password=password or os.environ.get("MYSQL_PASSWORD", ""),
+        database="mediciones_db",
+        port=3306,
+    ))
+
+
+# Filas por fetchmany al leer `mediciones` sin buffer
+FILAS_POR_FETCH = 20_000
+
+# Columnas de texto de `mediciones`; el resto se lee como float64 (NULL -> NaN)
+COLUMNAS_TEXTO_MEDICIONES = {"nombre_medicion", "sesion_id"}
+
+
+def _a_dataframe(cursor):
+    return pd.DataFrame(cursor.fetchall(), columns=[c[0] for c in cursor.description])
+
+
+def _leer_en_arrays(conn, sql_desde, params, columnas, orden=""):
+    """
+    Lee `SELECT columnas {sql_desde} {orden}` directo a arrays numpy: cursor sin buffer +
+    fetchmany, un bloque de arrays por lote que se concatenan al final. Una sola consulta
+    (sin COUNT previo) y sin pasar por la lista completa de tuplas ni por columnas object
+    de pandas. Devuelve {columna: np.ndarray}.
+    """
+    bloques = {col: [] for col in columnas}
+    cursor = conn.cursor(buffered=False)
+    cursor.execute(f"SELECT {', '.join(columnas)} {sql_desde} {orden}", params)
+    while True:
+        filas = cursor.fetchmany(FILAS_POR_FETCH)
+        if not filas:
+            break
+        for col, valores in zip(columnas, zip(*filas)):
+            if col in COLUMNAS_TEXTO_MEDICIONES:
+                bloques[col].append(np.array(valores, dtype=object))
+            else:
+                bloques[col].append(np.fromiter(valores, dtype="float64", count=len(filas)))  # NULL -> NaN
+    cursor.close()
+    return {
+        col: np.concatenate(partes) if partes
+        else np.empty(0, dtype=object if col in COLUMNAS_TEXTO_MEDICIONES else "float64")
+        for col, partes in bloques.items()
+    }
+
+
+# ===== Mediciones =====
+
+def listar_mediciones(conn, sesion_id=None, incluir_compartidas=True):
+    """Nombres de las mediciones visibles para la sesión (ambos almacenes), ordenados."""
+    where_sesion, params_sesion = filtro_sesion(sesion_id, incluir_compartidas)
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT nombre_medicion FROM mediciones WHERE {where_sesion}
+        UNION
+        SELECT nombre_medicion FROM mediciones_compactas WHERE {where_sesion}
+        ORDER BY nombre_medicion
+        """,
+        (*params_sesion, *params_sesion),
+    )
+    nombres = [fila[0] for fila in cursor.fetchall()]
+    cursor.close()
+    return nombres
+
+
+def leer_mediciones(conn, sesion_id=None, incluir_compartidas=True):
+    """
+    Devuelve en un solo DataFrame (una fila por muestra) las mediciones visibles para la
+    sesión, tanto de `mediciones` como de `mediciones_compactas` (desempaquetadas).
+    """
+    where_sesion, params_sesion = filtro_sesion(sesion_id, incluir_compartidas)
+    columnas = [*columnas_mediciones, "sesion_id"]
+    partes = [pd.DataFrame(
+        _leer_en_arrays(conn, f"FROM mediciones WHERE {where_sesion}", params_sesion, columnas)
+    )]
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT nombre_medicion, sesion_id, datos FROM mediciones_compactas WHERE {where_sesion}", params_sesion)
+    for nombre_medicion, sesion, blob in cursor.fetchall():
+        parte = desempaquetar_medicion(blob)
+        parte.insert(0, "nombre_medicion", nombre_medicion)
+        parte["sesion_id"] = sesion
+        partes.append(parte)
+    cursor.close()
+
+    no_vacias = [p for p in partes if not p.empty]
+    if not no_vacias:
+        return partes[0]
+    return pd.concat(no_vacias, ignore_index=True)
+
+
+def cargar_arrays_medicion(conn, nombre_medicion, columnas=("unix_time", "diameter"),
+                           sesion_id=None, incluir_compartidas=True):
+    """
+    Una medición como {columna: np.ndarray float64}, ordenada por unix_time.
+    Solo trae `columnas` (+ unix_time para ordenar), de cualquiera de los dos almacenes.
+    """
+    columnas = list(dict.fromkeys(["unix_time", *columnas]))
+    desconocidas = set(columnas) - set(columnas_mediciones[1:])
+    if desconocidas:
+        raise ValueError(f"Columnas no válidas para `mediciones`: {sorted(desconocidas)}")
+    where_sesion, params_sesion = filtro_sesion(sesion_id, incluir_compartidas)
+    arrays = _leer_en_arrays(
+        conn,
+        f"FROM mediciones WHERE nombre_medicion = %s AND {where_sesion}",
+        (nombre_medicion, *params_sesion),
+        columnas,
+        orden="ORDER BY unix_time",
+    )
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT datos FROM mediciones_compactas WHERE nombre_medicion = %s AND {where_sesion}",
+        (nombre_medicion, *params_sesion),
+    )
+    compactas = [desempaquetar_medicion(blob) for (blob,) in cursor.fetchall()]
+    cursor.close()
+    if not compactas:
+        return arrays  # ya viene ordenada por el índice (nombre_medicion, unix_time)
+
+    arrays = {
+        col: np.concatenate([arrays[col], *(p[col].to_numpy("float64") for p in compactas)])
+        for col in columnas
+    }
+    orden = np.argsort(arrays["unix_time"], kind="stable")
+    return {col: arr[orden] for col, arr in arrays.items()}
+
+
+# ===== Histórico =====
+
+def ensayo_de_medicion(conn, nombre_medicion, sesion_id=None, incluir_compartidas=True):
+    """
+    (id, planta, fecha) del `ensayo` de una medición visible (cualquiera de los dos
+    almacenes), prefiriendo el ya ubicado con planta/fecha; None si no tiene ensayo.
+    """
+    where_sesion, params_sesion = filtro_sesion(sesion_id, incluir_compartidas)
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT id, planta, fecha FROM ensayo
+        WHERE id IN (
+            SELECT ensayo_id FROM mediciones WHERE nombre_medicion = %s AND {where_sesion}
+            UNION
+            SELECT ensayo_id FROM mediciones_compactas WHERE nombre_medicion = %s AND {where_sesion}
+        )
+        ORDER BY planta IS NULL, id
+        LIMIT 1
+        """,
+        (nombre_medicion, *params_sesion, nombre_medicion, *params_sesion),
+    )
+    fila = cursor.fetchone()
+    cursor.close()
+    return fila
+
+
+def listar_plantas(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT planta FROM historico ORDER BY planta")
+    plantas = [fila[0] for fila in cursor.fetchall()]
+    cursor.close()
+    return plantas
+
+
+def listar_fechas(conn, planta):
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT fecha FROM historico WHERE planta = %s ORDER BY fecha DESC", (planta,))
+    fechas = [fila[0] for fila in cursor.fetchall()]
+    cursor.close()
+    return fechas
+
+
+def leer_historico(conn, planta, fecha):
+    """Filas de `historico` de una planta y fecha, como DataFrame."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM historico WHERE fecha = %s AND planta = %s", (fecha, planta))
+    df = _a_dataframe(cursor)
+    cursor.close()
+    return df
+
+
+def existe_historico(conn, planta, fecha):
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM historico WHERE planta = %s AND fecha = %s", (planta, fecha))
+    existe = cursor.fetchone()[0] > 0
+    cursor.close()
+    return existe
+
+
+def _enlazar_mediciones(cursor, ids):
+    """
+    Apunta al ensayo ya ubicado (con planta/fecha) las mediciones del mismo nombre que no
+    tenían ensayo o tenían uno sin ubicar, para que mediciones e historico coincidan.
+    """
+    for tabla in ("mediciones", "mediciones_compactas"):
+        cursor.executemany(
+            f"""
+            UPDATE {tabla} SET ensayo_id = %s
+            WHERE nombre_medicion = %s
+              AND (ensayo_id IS NULL OR ensayo_id IN (SELECT id FROM ensayo WHERE planta IS NULL AND fecha IS NULL))
+            """,
+            [(i, nombre) for (nombre, _, _), i in ids.items()],
+        )
+
+
+def guardar_historico(conn, planta, fecha, df_resumen):
+    """
+    Inserta el resumen (columnas nombre_medicion, di, df, delta_d, dt, t63) en `historico`
+    con un solo executemany y un commit. Cada fila queda enlazada a su `ensayo`, el mismo
+    que el de sus mediciones.
+    """
+    resumen = df_resumen[["nombre_medicion", "di", "df", "delta_d", "dt", "t63"]]
+    if resumen.empty:
+        return 0
+    cursor = conn.cursor()
+    try:
+        ids = ids_ensayos(cursor, [(n, planta, fecha) for n in resumen["nombre_medicion"].unique()])
+        filas = [
+            (fila.nombre_medicion, fecha, planta, fila.di, fila.df, fila.delta_d, fila.dt, fila.t63,
+             ids.get(clave_ensayo(fila.nombre_medicion, planta, fecha)))
+            for fila in resumen.itertuples(index=False)
+        ]
+        cursor.executemany(
+            """
+            INSERT INTO historico (nombre_medicion, fecha, planta, di, df, delta_d, dt, t63, ensayo_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            filas,
+        )
+        _enlazar_mediciones(cursor, ids)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return len(filas)
+
+
+def historico_por_dosis(conn, planta=None, dosis_coagulante=None, dosis_floculante=None):
+    """
+    `historico` con las dosis de su `ensayo` (búsqueda numérica por índice, sin parsear
+    nombres), opcionalmente filtrado por planta y/o dosis exactas.
+    """
+    condiciones, params = [], []
+    for columna, valor in (("h.planta", planta), ("e.dosis_coagulante", dosis_coagulante),
+                           ("e.dosis_floculante", dosis_floculante)):
+        if valor is not None:
+            condiciones.append(f"{columna} = %s"); params.append(valor)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT h.*, e.dosis_coagulante, e.dosis_floculante
+        FROM historico h LEFT JOIN ensayo e ON e.id = h.ensayo_id
+        {where}
+        ORDER BY e.dosis_floculante, e.dosis_coagulante
+        """,
+        params,
+    )
+    df = _a_dataframe(cursor)
+    cursor.close()
+    return df
+
+
+def borrar_historico(conn, planta=None, fecha=None, nombres=None, con_graficos=False):
+    """
+    Borra filas de `historico` (y, con `con_graficos`, las imágenes de esa planta+fecha),
+    filtrando por lo que se indique. Una sola transacción.
+    """
+    condiciones, params = [], []
+    if planta is not None:
+        condiciones.append("planta = %s"); params.append(planta)
+    if fecha is not None:
+        condiciones.append("fecha = %s"); params.append(fecha)
+    if nombres is not None:
+        nombres = tuple(nombres)
+        if not nombres:
+            return
+        condiciones.append(f"nombre_medicion IN ({','.join(['%s'] * len(nombres))})"); params += nombres
+    if not condiciones:
+        raise ValueError("borrar_historico necesita al menos un filtro")
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DELETE FROM historico WHERE {' AND '.join(condiciones)}", params)
+        if con_graficos:
+            cursor.execute("DELETE FROM graficos WHERE planta = %s AND fecha = %s", (planta, fecha))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+# ===== Gráficos =====
+
+def guardar_graficos(conn, planta, fecha, graficos):
+    """
+    Inserta imágenes en `graficos` con un solo executemany y un commit.
+    `graficos`: iterable de (nombre_medicion, tipo, nombre_archivo, formato, blob); las de
+    una medición quedan enlazadas a su `ensayo` (las comparativas, nombre '', no).
+    """
+    graficos = list(graficos)
+    if not graficos:
+        return 0
+    cursor = conn.cursor()
+    try:
+        ids = ids_ensayos(cursor, [(g[0], planta, fecha) for g in graficos])
+        filas = [(planta, fecha, *g, ids.get(clave_ensayo(g[0], planta, fecha))) for g in graficos]
+        cursor.executemany(
+            """
+            INSERT INTO graficos(planta, fecha, nombre_medicion, tipo, nombre_archivo, formato, imagen_blob, ensayo_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            filas,
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return len(filas)
+
+
+def listar_graficos(conn, planta, fecha, tipo=None):
+    """
+    Metadatos (sin BLOB) de las imágenes de una planta y fecha, en orden de guardado:
+    DataFrame con id, nombre_archivo, formato, nombre_medicion, tipo.
+    """
+    q = """
+        SELECT id, nombre_archivo, formato, nombre_medicion, tipo
+        FROM graficos
+        WHERE planta = %s AND fecha = %s
+    """
+    params = [planta, fecha]
+    if tipo:
+        q += " AND tipo = %s"
+        params.append(tipo)
+    cursor = conn.cursor()
+    cursor.execute(q + " ORDER BY id", tuple(params))
+    df = _a_dataframe(cursor)
+    cursor.close()
+    return df
+
+
+def leer_blobs_graficos(conn, ids):
+    """{id: imagen_blob} de los gráficos pedidos, en UNA consulta."""
+    ids = [int(i) for i in ids]
+    if not ids:
+        return {}
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT id, imagen_blob FROM graficos WHERE id IN ({','.join(['%s'] * len(ids))})", ids)
+    blobs = dict(cursor.fetchall())
+    cursor.close()
+    return blobs
+
+
+def _nombre_seguro(s):
+    return re.sub(r"\W+", "_", (s or "").lower()).strip("_")
+
+
+def graficos_de_medicion(metadatos, nombre_medicion):
+    """
+    Filtra (en memoria) los metadatos de listar_graficos que son el Tiempo vs Diámetro de
+    `nombre_medicion`: por tipo + nombre, o por el patrón de archivo "{nombre}_grafico_..."
+    (tolera guardados viejos con tipo mal derivado).
+    """
+    if metadatos.empty:
+        return metadatos
+    base = (nombre_medicion or "").lower()
+    archivo = metadatos["nombre_archivo"].fillna("").str.lower()
+    por_archivo = archivo.str.startswith(f"{_nombre_seguro(base)}_grafico_")
+    por_nombre = (metadatos["tipo"] == "tiempo_vs_diametro") & (
+        metadatos["nombre_medicion"].fillna("").str.lower() == base
+    )
+    return metadatos[por_nombre | (por_archivo & ~archivo.str.startswith("grafico_"))]
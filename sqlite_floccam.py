@@ -0,0 +1,293 @@
+"""
+Motor SQLite embebido para Floccam Analyzer (instalaciones de un solo laboratorio y CI).
+
+Se activa por configuración, sin tocar el código que consulta:
+    - variable de entorno FLOCCAM_SQLITE=floccam.db, o
+    - en .streamlit/secrets.toml:
+          [sqlite]
+          ruta = "floccam.db"
+
+`conectar_sqlite()` devuelve una conexión con la misma interfaz que usan la app, el
+repositorio y la ingesta de mysql.connector (cursor(dictionary=...), parámetros %s,
+commit/rollback, is_connected/reconnect). El esquema es el mismo de MySQL en su última
+versión (ver migraciones_floccam.py), con WAL, claves foráneas e índices equivalentes.
+"""
+import datetime
+import os
+import re
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+# Espera máxima (s) por el lock de escritura de otro proceso antes de fallar
+TIMEOUT_BLOQUEO_S = 30
+
+# Esquema completo equivalente al de MySQL tras todas las migraciones
+ESQUEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS ensayo (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  nombre_medicion TEXT NOT NULL,
+  planta TEXT DEFAULT NULL,
+  fecha DATE DEFAULT NULL,
+  dosis_coagulante REAL DEFAULT NULL,
+  dosis_floculante REAL DEFAULT NULL,
+  notas TEXT,
+  creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_ensayo_clave ON ensayo (nombre_medicion, planta, fecha);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_ensayo_clave ON ensayo (nombre_medicion, IFNULL(planta, ''), IFNULL(fecha, ''));
+CREATE INDEX IF NOT EXISTS idx_ensayo_dosis ON ensayo (dosis_coagulante, dosis_floculante);
+CREATE INDEX IF NOT EXISTS idx_ensayo_planta_fecha ON ensayo (planta, fecha);
+
+CREATE TABLE IF NOT EXISTS mediciones (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  nombre_medicion TEXT DEFAULT NULL,
+  unix_time REAL DEFAULT NULL,
+  diameter REAL DEFAULT NULL,
+  number INTEGER DEFAULT NULL,
+  mass_fraction REAL DEFAULT NULL,
+  skew1 REAL DEFAULT NULL,
+  skew2 REAL DEFAULT NULL,
+  skew3 REAL DEFAULT NULL,
+  fractal_dimension REAL DEFAULT NULL,
+  sphericity REAL DEFAULT NULL,
+  clarity REAL DEFAULT NULL,
+  largestfloc REAL DEFAULT NULL,
+  sesion_id TEXT DEFAULT NULL,
+  ensayo_id INTEGER DEFAULT NULL REFERENCES ensayo (id) ON DELETE SET NULL
+);
+CREATE INDEX IF NOT EXISTS idx_med_sesion ON mediciones (sesion_id, nombre_medicion);
+CREATE INDEX IF NOT EXISTS idx_med_nombre_tiempo ON mediciones (nombre_medicion, unix_time);
+
+CREATE TABLE IF NOT EXISTS mediciones_compactas (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  nombre_medicion TEXT NOT NULL,
+  sesion_id TEXT DEFAULT NULL,
+  filas INTEGER NOT NULL,
+  datos BLOB NOT NULL,
+  creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  ensayo_id INTEGER DEFAULT NULL REFERENCES ensayo (id) ON DELETE SET NULL
+);
+CREATE INDEX IF NOT EXISTS idx_compactas_sesion ON mediciones_compactas (sesion_id, nombre_medicion);
+
+CREATE TABLE IF NOT EXISTS historico (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  fecha DATE DEFAULT NULL,
+  planta TEXT DEFAULT NULL,
+  nombre_medicion TEXT DEFAULT NULL,
+  di REAL DEFAULT NULL,
+  df REAL DEFAULT NULL,
+  delta_d REAL DEFAULT NULL,
+  dt REAL DEFAULT NULL,
+  t63 REAL DEFAULT NULL,
+  ensayo_id INTEGER DEFAULT NULL REFERENCES ensayo (id) ON DELETE SET NULL
+);
+CREATE INDEX IF NOT EXISTS idx_hist_pf ON historico (planta, fecha);
+CREATE INDEX IF NOT EXISTS idx_hist_pf_nom ON historico (planta, fecha, nombre_medicion);
+
+CREATE TABLE IF NOT EXISTS graficos (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  planta TEXT NOT NULL,
+  fecha DATE NOT NULL,
+  nombre_medicion TEXT NOT NULL,
+  tipo TEXT DEFAULT NULL,
+  nombre_archivo TEXT NOT NULL,
+  formato TEXT DEFAULT 'PNG',
+  imagen_blob BLOB NOT NULL,
+  ancho INTEGER DEFAULT NULL,
+  alto INTEGER DEFAULT NULL,
+  creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  ensayo_id INTEGER DEFAULT NULL REFERENCES ensayo (id) ON DELETE SET NULL
+);
+CREATE INDEX IF NOT EXISTS idx_graficos_pftm ON graficos (planta, fecha, tipo, nombre_medicion);
+CREATE INDEX IF NOT EXISTS idx_graficos_pfta ON graficos (planta, fecha, tipo, nombre_archivo);
+
+CREATE TABLE IF NOT EXISTS manifiesto_ingesta (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  hash_contenido TEXT NOT NULL,
+  sesion_id TEXT DEFAULT NULL,
+  nombre_medicion TEXT NOT NULL,
+  filas INTEGER NOT NULL,
+  filas_cuarentena INTEGER DEFAULT 0,
+  ratio_nan REAL DEFAULT NULL,
+  intervalo_s REAL DEFAULT NULL,
+  duracion_s REAL DEFAULT NULL,
+  ingresado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_manifiesto_hash ON manifiesto_ingesta (hash_contenido, sesion_id);
+CREATE INDEX IF NOT EXISTS idx_manifiesto_nombre ON manifiesto_ingesta (nombre_medicion);
+
+CREATE TABLE IF NOT EXISTS cuarentena_mediciones (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  nombre_medicion TEXT NOT NULL,
+  sesion_id TEXT DEFAULT NULL,
+  hash_contenido TEXT DEFAULT NULL,
+  fila INTEGER NOT NULL,
+  motivo TEXT NOT NULL,
+  datos TEXT,
+  creado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_cuarentena_sesion ON cuarentena_mediciones (sesion_id, nombre_medicion);
+
+CREATE TABLE IF NOT EXISTS checkpoint_ingesta (
+  hash_contenido TEXT NOT NULL,
+  sesion_id TEXT NOT NULL DEFAULT '',
+  nombre_medicion TEXT NOT NULL,
+  offset_bytes INTEGER NOT NULL,
+  bloques INTEGER NOT NULL,
+  filas INTEGER NOT NULL,
+  filas_cuarentena INTEGER NOT NULL,
+  celdas INTEGER NOT NULL,
+  celdas_nan INTEGER NOT NULL,
+  unix_inicio REAL DEFAULT NULL,
+  unix_ultimo REAL DEFAULT NULL,
+  actualizado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (hash_contenido, sesion_id)
+);
+"""
+
+# Tablas del floccam.db original (otro esquema: tiempo, diametro, T63...). Si aparecen sin
+# `nombre_medicion` se renombran a <tabla>_legado y se crean las del esquema actual.
+TABLAS_LEGADO = ("mediciones", "historico")
+
+
+# Tipos que llegan desde pandas/numpy y fechas como texto ISO (igual que DATE/TIMESTAMP de MySQL)
+sqlite3.register_adapter(np.int64, int)
+sqlite3.register_adapter(np.int32, int)
+sqlite3.register_adapter(np.float32, float)
+sqlite3.register_adapter(np.bool_, int)
+sqlite3.register_adapter(datetime.date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda d: d.isoformat(" "))
+sqlite3.register_adapter(pd.Timestamp, lambda d: d.isoformat(" "))
+sqlite3.register_converter("DATE", lambda b: datetime.date.fromisoformat(b.decode()[:10]))
+sqlite3.register_converter("TIMESTAMP", lambda b: datetime.datetime.fromisoformat(b.decode()))
+
+
+def ruta_sqlite(cfg=None):
+    """Ruta de la BD SQLite configurada (FLOCCAM_SQLITE o cfg['ruta'] de [sqlite]); None = usar MySQL."""
+    return os.environ.get("FLOCCAM_SQLITE") or (cfg or {}).get("ruta") or None
+
+
+def _a_qmark(sql):
+    """Parámetros %s (mysql.connector) -> ? (sqlite3); INSERT IGNORE -> INSERT OR IGNORE."""
+    sql = re.sub(r"^(\s*)INSERT IGNORE\b", r"\1INSERT OR IGNORE", sql, flags=re.IGNORECASE)
+    return sql.replace("%s", "?").replace("%%", "%")
+
+
+class CursorSqlite:
+    """Cursor sqlite3 con la interfaz que se usa de mysql.connector (incluido dictionary=True)."""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(_a_qmark(sql), tuple(params or ()))
+
+    def executemany(self, sql, filas):
+        self._cursor.executemany(_a_qmark(sql), filas)
+
+    def _filas(self, filas):
+        if not self._dictionary:
+            return filas
+        columnas = [c[0] for c in self._cursor.description]
+        return [dict(zip(columnas, fila)) for fila in filas]
+
+    def fetchone(self):
+        fila = self._cursor.fetchone()
+        return None if fila is None else self._filas([fila])[0]
+
+    def fetchmany(self, size=1):
+        return self._filas(self._cursor.fetchmany(size))
+
+    def fetchall(self):
+        return self._filas(self._cursor.fetchall())
+
+    def close(self):
+        self._cursor.close()
+
+
+class ConexionSqlite:
+    """Conexión SQLite compatible con el uso que hace la app de una conexión mysql.connector."""
+
+    motor = "sqlite"
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._conn = None
+        self.reconnect()
+
+    def reconnect(self, attempts=1, delay=0):
+        for intento in range(max(attempts, 1)):
+            try:
+                conn = sqlite3.connect(
+                    self.ruta, timeout=TIMEOUT_BLOQUEO_S,
+                    detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False,
+                )
+                break
+            except sqlite3.Error:
+                if intento + 1 >= attempts:
+                    raise
+                time.sleep(delay)
+        # WAL: lectores y un escritor a la vez (varias sesiones de Streamlit + vigilante)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        self._conn = conn
+
+    def is_connected(self):
+        return self._conn is not None
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        if self._conn is None and reconnect:
+            self.reconnect(attempts, delay)
+
+    def cursor(self, dictionary=False, **_):
+        # buffered / raw de mysql.connector no aplican: sqlite3 ya lee fila a fila
+        return CursorSqlite(self._conn.cursor(), dictionary)
+
+    def executescript(self, sql):
+        self._conn.executescript(sql)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def conectar_sqlite(ruta):
+    """Abre (o crea) la BD SQLite en `ruta`. El esquema lo crea migraciones_floccam.migrar()."""
+    return ConexionSqlite(ruta)
+
+
+def crear_esquema_sqlite(conn):
+    """Crea (idempotente) el esquema completo; renombra las tablas de floccam.db con el esquema antiguo."""
+    cursor = conn.cursor()
+    for tabla in TABLAS_LEGADO:
+        cursor.execute(f"SELECT name FROM pragma_table_info('{tabla}')")
+        columnas = {fila[0] for fila in cursor.fetchall()}
+        if columnas and "nombre_medicion" not in columnas:
+            cursor.execute(f"ALTER TABLE {tabla} RENAME TO {tabla}_legado")
+    conn.commit()
+    conn.executescript(ESQUEMA_SQLITE)
+    cursor.close()
@@ -0,0 +1,35 @@
+import glob
+
+import pandas as pd
+
+from analitica_floccam import archivar_curvas, consultar, duckdb
+from ingesta_floccam import ingerir_entradas
+from migraciones_floccam import migrar
+from repositorio_floccam import guardar_historico, listar_mediciones
+from sqlite_floccam import conectar_sqlite
+from test_ingesta_floccam import _csv
+
+
+def test_exportar_y_guardar_archiva_cada_curva_una_vez(tmp_path):
+    conn = conectar_sqlite(str(tmp_path / "floccam.db"))
+    migrar(conn)
+    carpeta = str(tmp_path / "analitica")
+    list(ingerir_entradas(conn, [("C10 F05.csv", _csv(30)), ("C20 F05.csv", _csv(40))]))
+
+    # `--exportar` (sin planta ni fecha) y luego el guardado del proyecto desde la app
+    assert archivar_curvas(conn, listar_mediciones(conn), carpeta=carpeta) == 2
+    resumen = pd.DataFrame({"nombre_medicion": ["C10 F05", "C20 F05"], "di": [0.1, 0.1], "df": [0.9, 0.8],
+                            "delta_d": [0.8, 0.7], "dt": [0.9, 0.8], "t63": [120.0, 150.0]})
+    guardar_historico(conn, "Planta A", "2024-05-02", resumen)
+    assert archivar_curvas(conn, ["C10 F05", "C20 F05"], "Planta A", "2024-05-02", carpeta=carpeta) == 2
+    conn.close()
+
+    archivos = sorted(glob.glob(f"{carpeta}/curvas/*.parquet"))
+    curvas = pd.concat([pd.read_parquet(a) for a in archivos])
+    assert len(archivos) == 2
+    assert curvas.groupby("nombre_medicion").size().to_dict() == {"C10 F05": 30, "C20 F05": 40}
+    assert set(curvas["planta"]) == {"Planta A"}
+
+    if duckdb is not None:
+        vista = consultar("SELECT nombre_medicion, COUNT(*) AS n FROM curvas GROUP BY 1 ORDER BY 1", carpeta=carpeta)
+        assert vista.values.tolist() == [["C10 F05", 30], ["C20 F05", 40]]
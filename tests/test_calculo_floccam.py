@@ -0,0 +1,35 @@
+import numpy as np
+
+from calculo_floccam import agrupar_curvas, calcular_t63, detectar_df
+
+
+def _curvas(*diametros):
+    nombres, unix, diam = [], [], []
+    for i, d in enumerate(diametros):
+        nombres += [f"M{i}"] * len(d)
+        unix += list(range(len(d)))
+        diam += list(d)
+    return agrupar_curvas(nombres, unix, diam)
+
+
+def test_nan_en_una_curva_no_afecta_a_las_demas():
+    a = [0.1, 0.2, 0.3, 0.4, 0.4, 0.4, 0.4, 0.4]
+    b = [0.1, 0.5, 0.9, 1.0, 1.0, 1.0, 1.0, 1.0]
+    c = [0.2, 0.3, 0.6, 0.6, 0.6, 0.6, 0.6, 0.6]
+    limpio = detectar_df(_curvas(a, b, c))
+    a_nan = list(a)
+    a_nan[2] = np.nan
+    con_nan = detectar_df(_curvas(a_nan, b, c))
+
+    assert np.isfinite(con_nan["df"]).all()
+    np.testing.assert_allclose(con_nan["df"][1:], limpio["df"][1:])
+    np.testing.assert_array_equal(con_nan["estable"][1:], limpio["estable"][1:])
+    t63 = calcular_t63(_curvas(a_nan, b, c), con_nan["df"])["t63"]
+    np.testing.assert_allclose(t63[1:], calcular_t63(_curvas(a, b, c), limpio["df"])["t63"][1:])
+    assert np.isfinite(t63).all()
+
+
+def test_di_ignora_nan_inicial():
+    calculo = calcular_t63(_curvas([np.nan, 0.2, 0.5, 0.8]), 0.8)
+    assert calculo["di"][0] == 0.2
+    assert calculo["dt"][0] == 0.8
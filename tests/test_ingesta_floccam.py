@@ -0,0 +1,162 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+import ingesta_floccam
+from ingesta_floccam import clave_ensayo, ids_ensayos, ingerir_por_bloques
+from migraciones_floccam import migrar
+from repositorio_floccam import guardar_historico
+from sqlite_floccam import conectar_sqlite
+
+COLUMNAS_CSV = [
+    "Ascii Time", "Excel Time", "Unix Time", "Diameter", "Number", "Mass Fraction", "Skew1", "Skew2", "Skew3",
+    "Fractal Dimension", "Sphericity", "Clarity", "Brightness", "SizeA", "SizeV", "Size01", "Size02", "Size03",
+    "DividerSize", "AveAspectV", "AveWidthV", "AveLengthV", "LargestFloc",
+]
+
+
+def _csv(n):
+    datos = {c: np.random.default_rng(0).random(n) for c in COLUMNAS_CSV}
+    datos["Ascii Time"] = [f"2023-10-08 15:{i // 60 % 60:02d}:{i % 60:02d}" for i in range(n)]
+    datos["Excel Time"] = 45207.6 + np.arange(n) / 86400 * 40
+    datos["Unix Time"] = 1696778058.0 + np.arange(n) * 40.0
+    datos["Number"] = np.arange(n)
+    return pd.DataFrame(datos).to_csv(index=False).encode()
+
+
+def _contar(conn, sql, params=()):
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    valor = cursor.fetchone()[0]
+    cursor.close()
+    return valor
+
+
+def test_retoma_carga_a_medias_con_otra_sesion(tmp_path, monkeypatch):
+    conn = conectar_sqlite(str(tmp_path / "floccam.db"))
+    migrar(conn)
+    contenido = _csv(100)
+    abrir = lambda: io.BytesIO(contenido)
+    sesion_vieja, sesion_nueva = "a" * 32, "b" * 32
+
+    # Primera sesión: se corta en el tercer bloque (p. ej. el navegador se desconecta)
+    escribir = ingesta_floccam._escribir_filas
+    llamadas = []
+
+    def escribir_y_cortar(*args):
+        llamadas.append(1)
+        if len(llamadas) == 3:
+            raise ConnectionError("corte")
+        return escribir(*args)
+
+    monkeypatch.setattr(ingesta_floccam, "_escribir_filas", escribir_y_cortar)
+    estado, _ = ingerir_por_bloques(conn, "ensayo.csv", abrir, sesion_id=sesion_vieja, filas_por_bloque=20)
+    assert estado == "error"
+    assert _contar(conn, "SELECT COUNT(*) FROM mediciones WHERE sesion_id = %s", (sesion_vieja,)) == 40
+    monkeypatch.setattr(ingesta_floccam, "_escribir_filas", escribir)
+
+    # Tras reconectar, la sesión nueva retoma desde el checkpoint: nada duplicado ni huérfano
+    estado, calidad = ingerir_por_bloques(conn, "ensayo.csv", abrir, sesion_id=sesion_nueva,
+                                          filas_por_bloque=20, abandonado_s=0)
+    assert estado == "cargado"
+    assert calidad["filas"] == 100
+    assert _contar(conn, "SELECT COUNT(*) FROM mediciones WHERE sesion_id = %s", (sesion_nueva,)) == 100
+    assert _contar(conn, "SELECT COUNT(DISTINCT unix_time) FROM mediciones") == 100
+    assert _contar(conn, "SELECT COUNT(*) FROM mediciones WHERE sesion_id = %s", (sesion_vieja,)) == 0
+    assert _contar(conn, "SELECT COUNT(*) FROM checkpoint_ingesta") == 0
+    conn.close()
+
+
+def test_no_adopta_carga_en_curso(tmp_path, monkeypatch):
+    conn = conectar_sqlite(str(tmp_path / "floccam.db"))
+    migrar(conn)
+    contenido = _csv(60)
+    abrir = lambda: io.BytesIO(contenido)
+
+    escribir = ingesta_floccam._escribir_filas
+    llamadas = []
+
+    def escribir_y_cortar(*args):
+        llamadas.append(1)
+        if len(llamadas) == 2:
+            raise ConnectionError("corte")
+        return escribir(*args)
+
+    monkeypatch.setattr(ingesta_floccam, "_escribir_filas", escribir_y_cortar)
+    ingerir_por_bloques(conn, "ensayo.csv", abrir, sesion_id="a" * 32, filas_por_bloque=20)
+    monkeypatch.setattr(ingesta_floccam, "_escribir_filas", escribir)
+
+    # El checkpoint de la otra sesión es reciente: se carga desde cero sin tocar sus filas
+    estado, _ = ingerir_por_bloques(conn, "ensayo.csv", abrir, sesion_id="b" * 32, filas_por_bloque=20)
+    assert estado == "cargado"
+    assert _contar(conn, "SELECT COUNT(*) FROM mediciones WHERE sesion_id = %s", ("a" * 32,)) == 20
+    assert _contar(conn, "SELECT COUNT(*) FROM mediciones WHERE sesion_id = %s", ("b" * 32,)) == 60
+    conn.close()
+
+
+def test_historico_reusa_el_ensayo_de_la_medicion(tmp_path):
+    conn = conectar_sqlite(str(tmp_path / "floccam.db"))
+    migrar(conn)
+    contenido = _csv(30)
+
+    # Cargada sin planta ni fecha (scripts, vigilante) y guardada después en historico
+    estado, _ = ingerir_por_bloques(conn, "C10 F05.csv", lambda: io.BytesIO(contenido))
+    assert estado == "cargado"
+    resumen = pd.DataFrame({"nombre_medicion": ["C10 F05"], "di": [0.1], "df": [0.9], "delta_d": [0.8],
+                            "dt": [0.9], "t63": [120.0]})
+    guardar_historico(conn, "Planta A", "2024-05-02", resumen)
+
+    assert _contar(conn, "SELECT COUNT(*) FROM ensayo") == 1
+    id_historico = _contar(conn, "SELECT ensayo_id FROM historico")
+    assert _contar(conn, "SELECT COUNT(DISTINCT ensayo_id) FROM mediciones") == 1
+    assert _contar(conn, "SELECT MIN(ensayo_id) FROM mediciones") == id_historico
+
+    # Repetir la clave (otra sesión, el vigilante) no crea otra fila
+    cursor = conn.cursor()
+    clave = clave_ensayo("C10 F05", "Planta A", "2024-05-02")
+    assert ids_ensayos(cursor, [clave])[clave] == id_historico
+    cursor.close()
+    assert _contar(conn, "SELECT COUNT(*) FROM ensayo") == 1
+    conn.close()
+
+
+def test_csv_subido_despues_de_en_vivo_no_duplica(tmp_path):
+    conn = conectar_sqlite(str(tmp_path / "floccam.db"))
+    migrar(conn)
+    contenido = _csv(100)
+    ruta = tmp_path / "C10 F05.csv"
+    sesion = "a" * 32
+
+    # Panel en vivo: dos incrementos y luego un panel reabierto que relee el archivo desde el principio
+    lineas = contenido.splitlines(keepends=True)
+    estado = {}
+    for hasta, reabierto in ((41, False), (71, False), (71, True)):
+        ruta.write_bytes(b"".join(lineas[:hasta]))
+        if reabierto:
+            estado = {}
+        nuevas = ingesta_floccam.leer_incremento_csv(str(ruta), estado)
+        validas, cuarentena, _ = ingesta_floccam.validar_medicion(nuevas)
+        ingesta_floccam.insertar_incremento_en_vivo(conn, "C10 F05", validas, sesion_id=sesion, cuarentena=cuarentena)
+    assert _contar(conn, "SELECT COUNT(*) FROM mediciones") == 70
+    assert _contar(conn, "SELECT filas FROM manifiesto_ingesta WHERE hash_contenido = %s",
+                   (ingesta_floccam.clave_en_vivo("C10 F05"),)) == 70
+
+    # CSV terminado subido después: solo entran las 30 filas que faltaban
+    eventos = list(ingesta_floccam.ingerir_entradas(conn, [("C10 F05.csv", contenido)], sesion))
+    assert eventos[0][1] == "cargado"
+    assert eventos[0][2]["filas"] == 30
+    assert _contar(conn, "SELECT COUNT(*) FROM mediciones") == 100
+    assert _contar(conn, "SELECT COUNT(DISTINCT unix_time) FROM mediciones") == 100
+    assert _contar(conn, "SELECT COUNT(*) FROM cuarentena_mediciones") == 0
+
+    # El mismo archivo grande, por bloques, tampoco duplica
+    ingesta_floccam.borrar_mediciones(conn, ["C10 F05"], sesion)
+    ingesta_floccam.insertar_incremento_en_vivo(conn, "C10 F05", ingesta_floccam.leer_csv_floccam(contenido)[:50],
+                                                sesion_id=sesion)
+    estado, calidad = ingerir_por_bloques(conn, "C10 F05.csv", lambda: io.BytesIO(contenido), sesion_id=sesion,
+                                          filas_por_bloque=20)
+    assert (estado, calidad["filas"]) == ("cargado", 50)
+    assert _contar(conn, "SELECT COUNT(DISTINCT unix_time) FROM mediciones") == 100
+    assert _contar(conn, "SELECT COUNT(*) FROM mediciones") == 100
+    conn.close()
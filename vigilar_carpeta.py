@@ -0,0 +1,110 @@
+"""
+Vigilante de carpeta: ingesta automática de CSV Floccam (sin interfaz).
+
+Uso:
+    py vigilar_carpeta.py C:\\Floccam\\exportes
+    py vigilar_carpeta.py C:\\Floccam\\exportes --intervalo 30 --una-vez
+
+Se recorre la carpeta (y sus subcarpetas, p. ej. una por planta como en
+imagenes_plantas/) cada `--intervalo` segundos. Un CSV (o ZIP de CSV) se carga
+cuando su tamaño no cambió entre dos pasadas (ya se terminó de escribir). La validación,
+el manifiesto por hash y la inserción son los mismos de la app (ingesta_floccam.py),
+así que un archivo ya cargado nunca se vuelve a insertar.
+"""
+import argparse
+import logging
+import os
+import time
+
+from ingesta_floccam import iterar_entradas, ingerir_entradas
+from migraciones_floccam import migrar
+from repositorio_floccam import conectar
+
+log = logging.getLogger("vigilar_carpeta")
+
+
+def buscar_csv(carpeta):
+    """Devuelve {ruta: tamaño} de todos los .csv y .zip bajo `carpeta` (recursivo)."""
+    encontrados = {}
+    for raiz, _, archivos in os.walk(carpeta):
+        for nombre in archivos:
+            if nombre.lower().endswith((".csv", ".zip")):
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    encontrados[ruta] = os.path.getsize(ruta)
+                except OSError:
+                    continue  # borrado o movido entre el walk y el stat
+    return encontrados
+
+
+def ingerir_lote(conn, rutas, carpeta):
+    """
+    Carga un lote de archivos estables con el mismo camino de la app (ver ingerir_entradas).
+    La primera subcarpeta es la planta del ensayo; los archivos sueltos en la raíz quedan sin planta.
+    """
+    por_planta = {}
+    for ruta in rutas:
+        partes = os.path.relpath(ruta, carpeta).split(os.sep)
+        por_planta.setdefault(partes[0] if len(partes) > 1 else None, []).append(ruta)
+
+    cargados = 0
+    for planta, rutas_planta in por_planta.items():
+        ensayo = {"planta": planta} if planta else None
+        for nombre, estado, detalle in ingerir_entradas(conn, iterar_entradas(rutas_planta), ensayo=ensayo):
+            if estado == "cargado":
+                cargados += 1
+                log.info("✅ [%s] %s: %d filas, %d en cuarentena", planta or "-", nombre,
+                         detalle["filas"], detalle["filas_cuarentena"])
+            elif estado == "error":
+                log.error("❌ [%s] %s", planta or "-", detalle)
+    return cargados
+
+
+def vigilar(carpeta, intervalo, tamano_lote, password=None, una_vez=False):
+    """Bucle principal: detecta CSV nuevos y estables, y los ingiere por lotes."""
+    conn = conectar(password)
+    migrar(conn)
+    log.info("👀 Vigilando %s cada %ss", carpeta, intervalo)
+
+    vistos = {}      # ruta -> tamaño en la pasada anterior
+    procesados = {}  # ruta -> tamaño ya ingerido (evita re-hashear en cada pasada)
+    while True:
+        actuales = buscar_csv(carpeta)
+        estables = [
+            ruta for ruta, tam in actuales.items()
+            if tam > 0 and (una_vez or vistos.get(ruta) == tam) and procesados.get(ruta) != tam
+        ]
+        vistos = actuales
+
+        for inicio in range(0, len(estables), tamano_lote):
+            lote = estables[inicio:inicio + tamano_lote]
+            try:
+                if not conn.is_connected():
+                    conn.reconnect(attempts=3, delay=5)
+                ingerir_lote(conn, lote, carpeta)
+            except Exception as e:
+                log.error("❌ Lote fallido, se reintenta en la próxima pasada: %s", e)
+                continue
+            for ruta in lote:
+                procesados[ruta] = actuales[ruta]
+
+        if una_vez:
+            break
+        time.sleep(intervalo)
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingesta automática de CSV Floccam desde una carpeta.")
+    parser.add_argument("carpeta", help="Carpeta a vigilar (se recorren sus subcarpetas)")
+    parser.add_argument("--intervalo", type=float, default=15, help="Segundos entre pasadas (por defecto 15)")
+    parser.add_argument("--lote", type=int, default=20, help="Archivos por lote de ingesta (por defecto 20)")
+    parser.add_argument("--password", default=None, help="Contraseña MySQL local (o MYSQL_PASSWORD)")
+    parser.add_argument("--una-vez", action="store_true", help="Hacer una sola pasada y salir")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        vigilar(args.carpeta, args.intervalo, args.lote, args.password, args.una_vez)
+    except KeyboardInterrupt:
+        log.info("👋 Vigilante detenido.")